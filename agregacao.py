@@ -0,0 +1,178 @@
+"""
+Agregados parciais combináveis (momentos) por grupo
+Permite calcular médias e desvios por partes (blocos, processos, arquivos)
+e juntar os resultados sem manter os dados brutos em memória
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class TabelaMomentos:
+    """
+    Momentos por grupo: participantes, contagem, soma, soma dos quadrados,
+    mínimo e máximo de cada coluna de nota
+    """
+
+    def __init__(self, chaves, participantes, n, soma, soma_q, minimo, maximo):
+        self.chaves = tuple(chaves)
+        self.participantes = participantes
+        self.n = n
+        self.soma = soma
+        self.soma_q = soma_q
+        self.minimo = minimo
+        self.maximo = maximo
+
+    @classmethod
+    def calcular(cls, dados, chaves, colunas, dropna=True):
+        """
+        Calcula os momentos de um DataFrame agrupado pelas chaves
+        chaves: colunas de agrupamento (vazio = total geral)
+        colunas: colunas numéricas a resumir
+        dropna: descartar grupos com chave nula
+        """
+        chaves = tuple(chaves)
+        valores = dados[list(colunas)].astype('float64')
+
+        if chaves:
+            agrupadores = [dados[chave] for chave in chaves]
+        else:
+            agrupadores = np.zeros(len(dados), dtype=np.int8)
+
+        grupos = valores.groupby(agrupadores, observed=True, dropna=dropna, sort=True)
+        soma_q = (valores ** 2).groupby(agrupadores, observed=True, dropna=dropna, sort=True).sum()
+
+        return cls(
+            chaves,
+            participantes=grupos.size(),
+            n=grupos.count(),
+            soma=grupos.sum(),
+            soma_q=soma_q,
+            minimo=grupos.min(),
+            maximo=grupos.max()
+        )
+
+    @classmethod
+    def combinar(cls, tabelas):
+        """
+        Junta tabelas parciais com as mesmas chaves em uma única tabela
+        """
+        tabelas = list(tabelas)
+        if len(tabelas) == 1:
+            return tabelas[0]
+
+        chaves = tabelas[0].chaves
+
+        def juntar(atributo, funcao):
+            partes = pd.concat([getattr(tabela, atributo) for tabela in tabelas])
+            niveis = list(range(partes.index.nlevels))
+            return getattr(partes.groupby(level=niveis, observed=True, dropna=False, sort=True), funcao)()
+
+        return cls(
+            chaves,
+            participantes=juntar('participantes', 'sum'),
+            n=juntar('n', 'sum'),
+            soma=juntar('soma', 'sum'),
+            soma_q=juntar('soma_q', 'sum'),
+            minimo=juntar('minimo', 'min'),
+            maximo=juntar('maximo', 'max')
+        )
+
+    def subtrair(self, outra):
+        """
+        Remove a contribuição de outra tabela com as mesmas chaves (linhas
+        que saíram ou foram corrigidas); grupos que ficam sem participantes
+        são descartados
+        Mínimo e máximo não podem ser desfeitos: os dos grupos restantes
+        ficam como estão e devem ser recalculados por quem subtrai
+        """
+        def menos(atual, removido):
+            return atual.sub(removido.reindex(atual.index).fillna(0))
+
+        participantes = menos(self.participantes, outra.participantes)
+        mantidos = participantes > 0
+
+        return TabelaMomentos(
+            self.chaves,
+            participantes=participantes[mantidos].astype(np.int64),
+            n=menos(self.n, outra.n)[mantidos].astype(np.int64),
+            soma=menos(self.soma, outra.soma)[mantidos],
+            soma_q=menos(self.soma_q, outra.soma_q)[mantidos],
+            minimo=self.minimo[mantidos],
+            maximo=self.maximo[mantidos]
+        )
+
+    def agrupar(self, chaves):
+        """
+        Consolida a tabela em um subconjunto das chaves (rollup)
+        Grupos com chave nula nas novas chaves são descartados
+        """
+        chaves = tuple(chaves)
+        faltando = [chave for chave in chaves if chave not in self.chaves]
+        if faltando:
+            raise KeyError(f"Chaves ausentes na tabela: {faltando}")
+
+        def consolidar(tabela, funcao):
+            if chaves:
+                grupos = tabela.groupby(level=list(chaves), observed=True, dropna=True, sort=True)
+            else:
+                grupos = tabela.groupby(np.zeros(len(tabela), dtype=np.int8))
+            return getattr(grupos, funcao)()
+
+        return TabelaMomentos(
+            chaves,
+            participantes=consolidar(self.participantes, 'sum'),
+            n=consolidar(self.n, 'sum'),
+            soma=consolidar(self.soma, 'sum'),
+            soma_q=consolidar(self.soma_q, 'sum'),
+            minimo=consolidar(self.minimo, 'min'),
+            maximo=consolidar(self.maximo, 'max')
+        )
+
+    def media(self):
+        """
+        Média de cada coluna por grupo
+        """
+        return self.soma / self.n.where(self.n > 0)
+
+    def desvio(self):
+        """
+        Desvio padrão amostral (ddof=1) de cada coluna por grupo
+        """
+        n = self.n.where(self.n > 1)
+        variancia = (self.soma_q - self.soma ** 2 / n) / (n - 1)
+        return np.sqrt(variancia.clip(lower=0))
+
+    def __len__(self):
+        return len(self.participantes)
+
+
+class PlanoAgregacao:
+    """
+    Junta os agrupamentos pedidos pelas análises em um único agrupamento
+    fino (união das chaves), calculado em uma só passagem pelos dados
+    Cada pedido é respondido consolidando a tabela fina
+    """
+
+    def __init__(self, agrupamentos):
+        self.agrupamentos = list(dict.fromkeys(tuple(chaves) for chaves in agrupamentos))
+        self.chaves = tuple(dict.fromkeys(chave for chaves in self.agrupamentos for chave in chaves))
+
+    def calcular(self, dados, colunas):
+        """
+        Calcula a tabela fina de um bloco de dados
+        Chaves nulas são mantidas; cada consolidação descarta as suas
+        """
+        chaves = [chave for chave in self.chaves if chave in dados.columns]
+        return TabelaMomentos.calcular(dados, chaves, colunas, dropna=False)
+
+    def resolver(self, fina):
+        """
+        Responde cada agrupamento do plano a partir da tabela fina
+        Agrupamentos com chaves ausentes nos dados são omitidos
+        """
+        return {
+            chaves: fina.agrupar(chaves)
+            for chaves in self.agrupamentos
+            if all(chave in fina.chaves for chave in chaves)
+        }
@@ -0,0 +1,136 @@
+"""
+Amostragem em uma única passagem pelos dados em blocos
+Cada linha recebe uma chave aleatória uniforme e são mantidas as linhas
+de menores chaves (amostra de reservatório por chaves aleatórias): o
+resultado é uma amostra uniforme sem reposição, independente da ordem do
+arquivo, com memória limitada ao tamanho da amostra mais um bloco
+"""
+
+import numpy as np
+import pandas as pd
+
+ESTRATEGIAS_AMOSTRAGEM = ('inicio', 'aleatoria', 'estratificada')
+
+_CHAVE = '__chave_amostra'
+_ORDEM = '__ordem_amostra'
+_ESTRATO = '__estrato_amostra'
+
+
+class AmostraReservatorio:
+    """
+    Amostra aleatória simples de tamanho fixo
+    """
+
+    def __init__(self, tamanho, semente=None):
+        self.tamanho = tamanho
+        self.rng = np.random.default_rng(semente)
+        self.atuais = None
+        self.categoricas = None
+        self.vistos = 0
+
+    def _chavear(self, bloco):
+        if self.categoricas is None:
+            self.categoricas = [col for col in bloco.columns if isinstance(bloco[col].dtype, pd.CategoricalDtype)]
+        bloco = bloco.reset_index(drop=True)
+        bloco[_CHAVE] = self.rng.random(len(bloco))
+        bloco[_ORDEM] = self.vistos + np.arange(len(bloco))
+        self.vistos += len(bloco)
+        return bloco
+
+    def _finalizar(self, amostra):
+        # Blocos com categorias diferentes viram object ao concatenar
+        amostra = amostra.sort_values(_ORDEM).drop(columns=[_CHAVE, _ORDEM, _ESTRATO], errors='ignore')
+        for col in self.categoricas:
+            if not isinstance(amostra[col].dtype, pd.CategoricalDtype):
+                amostra[col] = amostra[col].astype('category')
+        return amostra.reset_index(drop=True)
+
+    def _manter(self, candidatos):
+        return candidatos.nsmallest(self.tamanho, _CHAVE)
+
+    def adicionar(self, bloco):
+        """
+        Considera as linhas de um bloco
+        """
+        candidatos = self._chavear(bloco)
+        if self.atuais is not None:
+            candidatos = pd.concat([self.atuais, candidatos], ignore_index=True)
+        self.atuais = self._manter(candidatos).reset_index(drop=True)
+        return self
+
+    def resultado(self):
+        """
+        DataFrame com a amostra, na ordem original de leitura
+        """
+        if self.atuais is None:
+            return None
+        return self._finalizar(self.atuais)
+
+
+class AmostraEstratificada(AmostraReservatorio):
+    """
+    Amostra estratificada com alocação proporcional ao tamanho de cada
+    estrato (valores nulos formam um estrato próprio)
+    Guarda até `tamanho` linhas por estrato durante a leitura, pois a
+    proporção de cada estrato só é conhecida no fim (o arquivo pode estar
+    ordenado pela coluna de estrato)
+    """
+
+    def __init__(self, tamanho, coluna='SG_UF_ESC', semente=None):
+        super().__init__(tamanho, semente)
+        self.coluna = coluna
+        self.contagens = {}
+
+    def _chavear(self, bloco):
+        bloco = super()._chavear(bloco)
+        estrato = bloco[self.coluna].astype('object').where(bloco[self.coluna].notna(), None)
+        bloco[_ESTRATO] = estrato
+        for valor, quantidade in estrato.value_counts(dropna=False).items():
+            valor = None if pd.isna(valor) else valor
+            self.contagens[valor] = self.contagens.get(valor, 0) + int(quantidade)
+        return bloco
+
+    def _manter(self, candidatos):
+        ordenados = candidatos.sort_values(_CHAVE, kind='stable')
+        return ordenados.groupby(_ESTRATO, dropna=False, sort=False).head(self.tamanho)
+
+    def alocacao(self):
+        """
+        Linhas por estrato: proporcional ao total visto, arredondada pelo
+        método dos maiores restos para somar exatamente `tamanho`
+        """
+        total = sum(self.contagens.values())
+        if total == 0:
+            return {}
+
+        alvo = min(self.tamanho, total)
+        cotas = {estrato: alvo * quantidade / total for estrato, quantidade in self.contagens.items()}
+        alocacao = {estrato: int(np.floor(cota)) for estrato, cota in cotas.items()}
+        restantes = alvo - sum(alocacao.values())
+        for estrato in sorted(cotas, key=lambda e: cotas[e] - alocacao[e], reverse=True)[:restantes]:
+            alocacao[estrato] += 1
+
+        return alocacao
+
+    def resultado(self):
+        if self.atuais is None:
+            return None
+
+        alocacao = self.alocacao()
+        estratos = self.atuais[_ESTRATO].where(self.atuais[_ESTRATO].notna(), None)
+        limite = estratos.map(lambda estrato: alocacao.get(estrato, 0)).to_numpy()
+        # Posição de cada linha dentro do estrato, em ordem de chave
+        posicao = self.atuais.groupby(_ESTRATO, dropna=False)[_CHAVE].rank(method='first').to_numpy()
+
+        return self._finalizar(self.atuais[posicao <= limite])
+
+
+def criar_amostrador(estrategia, tamanho, semente=None, coluna_estrato='SG_UF_ESC'):
+    """
+    Cria o amostrador de uma estratégia ('aleatoria' ou 'estratificada')
+    """
+    if estrategia == 'aleatoria':
+        return AmostraReservatorio(tamanho, semente)
+    if estrategia == 'estratificada':
+        return AmostraEstratificada(tamanho, coluna_estrato, semente)
+    raise ValueError(f"Estratégia de amostragem desconhecida: {estrategia}")
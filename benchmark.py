@@ -0,0 +1,305 @@
+"""
+Benchmark do ENEMAnalyzer
+Gera (ou reaproveita) microdados sintéticos de vários tamanhos e mede
+tempo, CPU e pico de memória de cada etapa: carregar_dados,
+processar_dados, cada análise e salvar_graficos_html. O resultado é
+gravado em JSON e pode ser comparado com uma execução anterior.
+Mede também a inicialização (um processo novo que importa o main), com
+uma meta de tempo e a verificação de que o plotly não é carregado.
+
+Uso:
+    python benchmark.py --linhas 10000 100000 1000000 --saida benchmark.json
+    python benchmark.py --linhas 100000 --base benchmark.json   # falha se houver regressão
+    python benchmark.py --apenas-inicializacao                   # falha acima da meta
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import instrumentacao
+from esquema import ANALISES
+from gerador_sintetico import gerar_microdados
+from main import ENEMAnalyzer
+from saida_graficos import FORMATOS_GRAFICOS
+
+# Etapas abaixo deste tempo não entram na comparação (ruído de medição)
+TEMPO_MINIMO_COMPARACAO = 0.05
+
+# Meta do tempo total de um processo que só importa o main (segundos)
+META_INICIALIZACAO_S = 0.8
+
+# Pacotes de visualização que o import do main não deve carregar
+PACOTES_GRAFICOS = ('plotly', 'kaleido')
+
+_CODIGO_INICIALIZACAO = """
+import json, sys, time
+inicio = time.perf_counter()
+import {modulo}
+importacao = time.perf_counter() - inicio
+print(json.dumps({{'importacao_s': importacao, 'pacotes': sorted({{m.split('.')[0] for m in sys.modules}})}}))
+"""
+
+
+def medir(nome, funcao, *args, rastrear_alocacoes=False, **kwargs):
+    """
+    Executa funcao(*args, **kwargs) e mede
+    tempo de parede, tempo de CPU, memória e bytes lidos
+    rastrear_alocacoes: usa tracemalloc para o pico de alocações Python
+    (bem mais lento; os tempos dessa execução não são representativos)
+    Retorna (resultado, medição)
+    """
+    if rastrear_alocacoes:
+        tracemalloc.start()
+
+    with instrumentacao.medir(nome) as medicao:
+        resultado = funcao(*args, **kwargs)
+        medicao['sucesso'] = resultado is not False
+
+    if rastrear_alocacoes:
+        medicao['pico_alocacoes_mb'] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+        tracemalloc.stop()
+
+    return resultado, medicao
+
+
+def executar_rodada(arquivo, pasta_graficos, amostra=None, n_processos=1, rastrear_alocacoes=False,
+                    formato_graficos='compartilhado'):
+    """
+    Mede uma execução completa (carga, processamento, análises e gráficos)
+    em um analisador novo
+    Retorna a lista de medições, uma por etapa
+    """
+    analisador = ENEMAnalyzer(arquivo, n_processos=n_processos, verbose=False)
+    medicoes = []
+
+    def etapa(nome, funcao, *args):
+        resultado, medicao = medir(nome, funcao, *args, rastrear_alocacoes=rastrear_alocacoes)
+        medicoes.append(medicao)
+        return resultado
+
+    etapa('carregar_dados', analisador.carregar_dados, amostra)
+    medicoes[-1]['linhas_saida'] = analisador.linhas_lidas
+
+    etapa('processar_dados', analisador.processar_dados)
+    medicoes[-1]['linhas_entrada'] = analisador.linhas_lidas
+    medicoes[-1]['linhas_saida'] = analisador.total_registros
+
+    # estatisticas_gerais não gera gráfico; as demais seguem a ordem dos
+    # nomes de arquivo do salvar_graficos_html
+    etapa('estatisticas_gerais', analisador.estatisticas_gerais)
+    graficos = [etapa(analise, getattr(analisador, analise)) for analise in ANALISES[1:]]
+    etapa('salvar_graficos_html', analisador.salvar_graficos_html, graficos, pasta_graficos, formato_graficos)
+
+    return medicoes
+
+
+def medir_inicializacao(repeticoes=5, modulo='main'):
+    """
+    Mede processos Python novos que apenas importam o módulo
+    Retorna a mediana do tempo total do processo e do tempo de importação,
+    e os pacotes de visualização carregados pelo import (deve ser vazio)
+    """
+    codigo = _CODIGO_INICIALIZACAO.format(modulo=modulo)
+    pasta = os.path.dirname(os.path.abspath(__file__))
+    processos, importacoes, graficos = [], [], set()
+
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        saida = subprocess.run([sys.executable, '-c', codigo], cwd=pasta, capture_output=True,
+                               text=True, check=True).stdout
+        processos.append(time.perf_counter() - inicio)
+        dados = json.loads(saida.splitlines()[-1])
+        importacoes.append(dados['importacao_s'])
+        graficos.update(pacote for pacote in dados['pacotes'] if pacote in PACOTES_GRAFICOS)
+
+    return {
+        'modulo': modulo,
+        'processo_s': round(statistics.median(processos), 4),
+        'importacao_s': round(statistics.median(importacoes), 4),
+        'tempos_s': [round(tempo, 4) for tempo in processos],
+        'pacotes_graficos': sorted(graficos),
+    }
+
+
+def consolidar(rodadas):
+    """
+    Combina as repetições de cada etapa: mediana dos tempos e maior pico
+    """
+    consolidadas = []
+    for medicoes in zip(*rodadas):
+        base = dict(medicoes[-1])
+        base['tempo_s'] = round(statistics.median(m['tempo_s'] for m in medicoes), 4)
+        base['cpu_s'] = round(statistics.median(m['cpu_s'] for m in medicoes), 4)
+        base['pico_rss_mb'] = max(m['pico_rss_mb'] for m in medicoes)
+        base['tempos_s'] = [m['tempo_s'] for m in medicoes]
+        base['sucesso'] = all(m['sucesso'] for m in medicoes)
+        consolidadas.append(base)
+    return consolidadas
+
+
+def comparar(atual, base, tolerancia):
+    """
+    Lista as etapas que ficaram mais lentas ou usaram mais memória que a
+    base além da tolerância (fração, ex.: 0.25 = 25%)
+    """
+    regressoes = []
+    anteriores = {
+        (cenario['linhas'], medicao['etapa']): medicao
+        for cenario in base['cenarios'] for medicao in cenario['etapas']
+    }
+
+    for cenario in atual['cenarios']:
+        for medicao in cenario['etapas']:
+            anterior = anteriores.get((cenario['linhas'], medicao['etapa']))
+            if anterior is None:
+                continue
+
+            for campo in ('tempo_s', 'pico_rss_mb'):
+                if campo == 'tempo_s' and anterior[campo] < TEMPO_MINIMO_COMPARACAO:
+                    continue
+                if medicao[campo] > anterior[campo] * (1 + tolerancia):
+                    regressoes.append({
+                        'linhas': cenario['linhas'],
+                        'etapa': medicao['etapa'],
+                        'medida': campo,
+                        'base': anterior[campo],
+                        'atual': medicao[campo],
+                    })
+
+    inicializacao, anterior = atual.get('inicializacao'), base.get('inicializacao')
+    if inicializacao and anterior and inicializacao['processo_s'] > anterior['processo_s'] * (1 + tolerancia):
+        regressoes.append({
+            'linhas': None,
+            'etapa': 'inicializacao',
+            'medida': 'processo_s',
+            'base': anterior['processo_s'],
+            'atual': inicializacao['processo_s'],
+        })
+
+    return regressoes
+
+
+def _ambiente():
+    return {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark das etapas do ENEMAnalyzer')
+    parser.add_argument('--linhas', type=int, nargs='+', default=[10_000, 100_000],
+                        help='tamanhos dos arquivos sintéticos')
+    parser.add_argument('--arquivo', help='usar um arquivo de microdados existente em vez dos sintéticos')
+    parser.add_argument('--pasta', default=os.path.join(tempfile.gettempdir(), 'enem_benchmark'),
+                        help='pasta dos arquivos sintéticos (reaproveitados entre execuções)')
+    parser.add_argument('--repeticoes', type=int, default=1, help='execuções por tamanho (mediana dos tempos)')
+    parser.add_argument('--processos', type=int, default=1, help='número de processos da agregação')
+    parser.add_argument('--formato-graficos', default='compartilhado', choices=FORMATOS_GRAFICOS,
+                        help='formato do salvar_graficos_html')
+    parser.add_argument('--rastrear-alocacoes', action='store_true',
+                        help='medir também o pico de alocações com tracemalloc (mais lento)')
+    parser.add_argument('--saida', default='benchmark.json', help='arquivo JSON de resultados')
+    parser.add_argument('--base', help='JSON de uma execução anterior para comparação')
+    parser.add_argument('--tolerancia', type=float, default=0.25, help='piora aceita em relação à base')
+    parser.add_argument('--repeticoes-inicializacao', type=int, default=5,
+                        help='processos medidos na inicialização (0 = não mede)')
+    parser.add_argument('--meta-inicializacao', type=float, default=META_INICIALIZACAO_S,
+                        help='tempo máximo (s) de um processo que importa o main')
+    parser.add_argument('--apenas-inicializacao', action='store_true',
+                        help='mede só a inicialização, sem os cenários')
+    args = parser.parse_args()
+
+    os.makedirs(args.pasta, exist_ok=True)
+    pasta_graficos = os.path.join(args.pasta, 'graficos')
+
+    if args.apenas_inicializacao:
+        cenarios = []
+    elif args.arquivo:
+        cenarios = [(None, args.arquivo)]
+    else:
+        cenarios = []
+        for linhas in args.linhas:
+            arquivo = os.path.join(args.pasta, f'MICRODADOS_SINTETICOS_{linhas}.csv')
+            if not os.path.exists(arquivo):
+                print(f"🧪 Gerando {linhas:,} registros sintéticos...")
+                gerar_microdados(arquivo, linhas)
+            cenarios.append((linhas, arquivo))
+
+    resultado = {'ambiente': _ambiente(), 'cenarios': []}
+    falhas = []
+
+    if args.repeticoes_inicializacao > 0:
+        inicializacao = medir_inicializacao(args.repeticoes_inicializacao)
+        inicializacao['meta_s'] = args.meta_inicializacao
+        resultado['inicializacao'] = inicializacao
+
+        status = '✅' if inicializacao['processo_s'] <= args.meta_inicializacao else '❌'
+        print(f"{status} Inicialização (import main): {inicializacao['processo_s']:.3f}s por processo, "
+              f"{inicializacao['importacao_s']:.3f}s de import (meta {args.meta_inicializacao:.2f}s)")
+        if status == '❌':
+            falhas.append(f"inicialização acima da meta: {inicializacao['processo_s']:.3f}s")
+        if inicializacao['pacotes_graficos']:
+            falhas.append(f"import main carregou {', '.join(inicializacao['pacotes_graficos'])}")
+
+    for linhas, arquivo in cenarios:
+        print(f"⏱️ Medindo {arquivo}...")
+        rodadas = [
+            executar_rodada(arquivo, pasta_graficos, n_processos=args.processos,
+                            rastrear_alocacoes=args.rastrear_alocacoes, formato_graficos=args.formato_graficos)
+            for _ in range(args.repeticoes)
+        ]
+        etapas = consolidar(rodadas)
+        resultado['cenarios'].append({
+            'linhas': linhas if linhas is not None else etapas[0]['linhas_saida'],
+            'arquivo': arquivo,
+            'tamanho_mb': round(os.path.getsize(arquivo) / 2**20, 1),
+            'etapas': etapas,
+        })
+
+        for medicao in etapas:
+            status = '✅' if medicao['sucesso'] else '❌'
+            print(f"   {status} {medicao['etapa']:<40} {medicao['tempo_s']:>8.3f}s "
+                  f"CPU {medicao['cpu_s']:>8.3f}s  pico {medicao['pico_rss_mb']:>8.1f} MB")
+
+    regressoes = []
+    if args.base:
+        with open(args.base, encoding='utf-8') as arquivo:
+            regressoes = comparar(resultado, json.load(arquivo), args.tolerancia)
+        resultado['regressoes'] = regressoes
+
+    with open(args.saida, 'w', encoding='utf-8') as arquivo:
+        json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+    print(f"💾 Resultados salvos em {args.saida}")
+
+    if regressoes:
+        print(f"⚠️ {len(regressoes)} regressões em relação a {args.base}:")
+        for regressao in regressoes:
+            print(f"   {regressao['linhas']} linhas | {regressao['etapa']} | {regressao['medida']}: "
+                  f"{regressao['base']} -> {regressao['atual']}")
+
+    for falha in falhas:
+        print(f"❌ {falha}")
+
+    if regressoes or falhas:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""
+Cache colunar (Parquet particionado por SG_UF_ESC) dos microdados
+O CSV é convertido uma única vez; as execuções seguintes leem apenas as
+colunas e partições necessárias. Requer o pacote opcional pyarrow.
+"""
+
+import hashlib
+import io
+import json
+import os
+import shutil
+
+import pandas as pd
+
+from esquema import ESQUEMA_MICRODADOS, tipos_colunas
+
+ARQUIVO_FONTE = 'fonte.json'
+COLUNA_PARTICAO = 'SG_UF_ESC'
+PARTICOES_ESPERADAS = 28  # 27 UFs mais a partição de valores nulos
+
+# Bytes lidos por vez no hash do conteúdo
+TAMANHO_LEITURA_HASH = 1 << 24
+
+
+def pyarrow_disponivel():
+    """
+    Indica se o pacote opcional pyarrow está instalado
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _novo_resumo():
+    return hashlib.blake2b(digest_size=16)
+
+
+class LeitorComHash(io.RawIOBase):
+    """
+    Arquivo binário que calcula o hash (blake2b) de todos os bytes lidos,
+    para que o hash do conteúdo saia da mesma leitura que processa o arquivo
+    Uso: pd.read_csv(io.BufferedReader(leitor), ...) e depois leitor.concluir()
+    """
+
+    def __init__(self, arquivo):
+        super().__init__()
+        self._arquivo = open(arquivo, 'rb')
+        self._resumo = _novo_resumo()
+
+    def readable(self):
+        return True
+
+    def readinto(self, destino):
+        lidos = self._arquivo.readinto(destino)
+        if lidos:
+            self._resumo.update(memoryview(destino)[:lidos])
+        return lidos
+
+    def concluir(self):
+        """
+        Lê o que faltar do arquivo (leituras interrompidas, como as de uma
+        amostra), fecha o arquivo e retorna o hash do conteúdo completo
+        (o leitor pode já ter sido fechado por quem o consumiu)
+        """
+        buffer = bytearray(TAMANHO_LEITURA_HASH)
+        while self.readinto(buffer):
+            pass
+        self._arquivo.close()
+        return self._resumo.hexdigest()
+
+
+def hash_conteudo(arquivo):
+    """
+    Hash (blake2b) do conteúdo completo do arquivo, lido em blocos
+    """
+    return LeitorComHash(arquivo).concluir()
+
+
+def impressao_digital(arquivo, com_hash=True):
+    """
+    Identifica a versão do arquivo de origem: tamanho, mtime e hash do
+    conteúdo completo (com_hash=False: só tamanho e mtime, sem ler o arquivo)
+    """
+    info = os.stat(arquivo)
+    impressao = {
+        'tamanho': info.st_size,
+        'mtime': info.st_mtime,
+    }
+    if com_hash:
+        impressao['hash'] = hash_conteudo(arquivo)
+    return impressao
+
+
+def mesma_versao(fonte, arquivo):
+    """
+    Indica se o arquivo ainda é a versão descrita por fonte (tamanho, mtime
+    e hash do conteúdo completo)
+    Tamanho diferente invalida; mtime diferente (ex.: cópia do arquivo ou
+    nova publicação com o mesmo tamanho) exige o mesmo hash do conteúdo
+    """
+    info = os.stat(arquivo)
+    if fonte.get('tamanho') != info.st_size:
+        return False
+    if fonte.get('mtime') == info.st_mtime:
+        return True
+    return fonte.get('hash') is not None and fonte['hash'] == hash_conteudo(arquivo)
+
+
+def hash_cache(pasta):
+    """
+    Hash do conteúdo completo do arquivo que gerou o cache (None sem cache)
+    """
+    fonte = _ler_fonte(pasta)
+    return None if fonte is None else fonte.get('hash')
+
+
+def _ler_fonte(pasta):
+    caminho = os.path.join(pasta, ARQUIVO_FONTE)
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def cache_valido(arquivo, pasta, colunas=()):
+    """
+    Verifica se o cache existe, corresponde à versão atual do arquivo
+    e contém todas as colunas pedidas
+    """
+    if not pyarrow_disponivel() or not os.path.exists(arquivo):
+        return False
+
+    fonte = _ler_fonte(pasta)
+    if fonte is None:
+        return False
+
+    # Colunas ausentes no próprio CSV não invalidam o cache
+    pedidas = set(colunas) & set(fonte.get('cabecalho', colunas))
+    if not pedidas <= set(fonte['colunas']):
+        return False
+
+    # mtime diferente com o mesmo conteúdo (ex.: cópia do arquivo) ainda é
+    # válido; o hash do conteúdo completo é conferido
+    return mesma_versao(fonte, arquivo)
+
+
+def _tipo_arrow(dtype):
+    import pyarrow as pa
+
+    tipos = {
+        'int8': pa.int8(), 'Int8': pa.int8(),
+        'int16': pa.int16(), 'Int16': pa.int16(),
+        'int32': pa.int32(), 'Int32': pa.int32(),
+        'int64': pa.int64(), 'Int64': pa.int64(),
+        'float32': pa.float32(), 'float64': pa.float64(),
+        'category': pa.string()
+    }
+    return tipos[dtype]
+
+
+def converter_para_cache(arquivo, pasta, tamanho_bloco=500_000):
+    """
+    Converte o CSV de microdados em Parquet particionado por SG_UF_ESC
+    arquivo: CSV de origem (';', latin-1)
+    pasta: diretório do cache (substituído por completo)
+    tamanho_bloco: linhas lidas por bloco durante a conversão
+    Retorna o número de linhas gravadas
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    cabecalho = pd.read_csv(arquivo, sep=';', encoding='latin-1', nrows=0).columns
+    colunas = [col for col in cabecalho if col in ESQUEMA_MICRODADOS]
+    tipos = tipos_colunas(colunas)
+    esquema = pa.schema([(col, _tipo_arrow(tipos[col])) for col in colunas])
+
+    fonte = impressao_digital(arquivo, com_hash=False)
+    fonte['colunas'] = colunas
+    fonte['cabecalho'] = list(cabecalho)
+    total = 0
+
+    # O hash do conteúdo completo é calculado na mesma leitura da conversão
+    bruto = LeitorComHash(arquivo)
+
+    def lotes():
+        nonlocal total
+        with pd.read_csv(io.BufferedReader(bruto, TAMANHO_LEITURA_HASH), sep=';', encoding='latin-1',
+                         usecols=colunas, dtype=tipos, chunksize=tamanho_bloco) as leitor:
+            for bloco in leitor:
+                total += len(bloco)
+                for col in bloco.select_dtypes('category').columns:
+                    bloco[col] = bloco[col].astype(object).where(bloco[col].notna(), None)
+                yield from pa.Table.from_pandas(bloco, schema=esquema, preserve_index=False).to_batches()
+
+    # Gravar em diretório temporário e trocar no final (cache nunca fica pela metade)
+    temporaria = pasta.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(temporaria, ignore_errors=True)
+
+    particionamento = None
+    if COLUNA_PARTICAO in colunas:
+        particionamento = ds.partitioning(pa.schema([(COLUNA_PARTICAO, pa.string())]), flavor='hive')
+
+    ds.write_dataset(
+        lotes(),
+        temporaria,
+        schema=esquema,
+        format='parquet',
+        partitioning=particionamento,
+        # O gravador acumula até min_rows_per_group linhas em cada partição
+        # aberta; dividir pelo número de UFs limita o total ao de um bloco
+        min_rows_per_group=max(min(tamanho_bloco, 1 << 17) // PARTICOES_ESPERADAS, 1024),
+        existing_data_behavior='overwrite_or_ignore'
+    )
+
+    fonte['hash'] = bruto.concluir()
+    with open(os.path.join(temporaria, ARQUIVO_FONTE), 'w', encoding='utf-8') as f:
+        json.dump(fonte, f)
+
+    shutil.rmtree(pasta, ignore_errors=True)
+    os.replace(temporaria, pasta)
+
+    return total
+
+
+def _abrir(pasta):
+    import pyarrow.dataset as ds
+
+    return ds.dataset(
+        pasta,
+        format='parquet',
+        partitioning='hive',
+        exclude_invalid_files=True,
+        ignore_prefixes=['.', '_', ARQUIVO_FONTE]
+    )
+
+
+def _filtro_ufs(ufs):
+    import pyarrow.dataset as ds
+
+    if ufs is None:
+        return None
+    return ds.field(COLUNA_PARTICAO).isin(list(ufs))
+
+
+def _para_pandas(tabela, colunas):
+    dados = tabela.to_pandas()
+    return dados.astype(tipos_colunas(colunas))
+
+
+def ler_cache(pasta, colunas, amostra=None, ufs=None):
+    """
+    Lê colunas do cache como DataFrame com os tipos do esquema
+    colunas: colunas a ler (as ausentes no cache são ignoradas)
+    amostra: número máximo de linhas (None = todas), na ordem das
+             partições e não na do arquivo
+    ufs: partições (siglas de UF) a ler (None = todas)
+    """
+    dataset = _abrir(pasta)
+    colunas = [col for col in colunas if col in dataset.schema.names]
+    filtro = _filtro_ufs(ufs)
+
+    if amostra is None:
+        tabela = dataset.to_table(columns=colunas, filter=filtro)
+    else:
+        tabela = dataset.head(amostra, columns=colunas, filter=filtro)
+
+    return _para_pandas(tabela, colunas)
+
+
+def ler_cache_em_blocos(pasta, colunas, amostra=None, tamanho_bloco=500_000, ufs=None):
+    """
+    Itera sobre o cache em DataFrames de até tamanho_bloco linhas
+    """
+    import pyarrow as pa
+
+    dataset = _abrir(pasta)
+    colunas = [col for col in colunas if col in dataset.schema.names]
+    restantes = amostra
+    pendentes = []
+    acumulado = 0
+
+    # Lotes do Parquet seguem os row groups de cada partição; juntar os
+    # pequenos evita processar muitos blocos minúsculos
+    for lote in dataset.to_batches(columns=colunas, filter=_filtro_ufs(ufs), batch_size=tamanho_bloco):
+        if restantes is not None:
+            if restantes <= 0:
+                break
+            lote = lote.slice(0, restantes)
+            restantes -= lote.num_rows
+
+        pendentes.append(lote)
+        acumulado += lote.num_rows
+        if acumulado >= tamanho_bloco:
+            yield _para_pandas(pa.Table.from_batches(pendentes), colunas)
+            pendentes = []
+            acumulado = 0
+
+    if acumulado:
+        yield _para_pandas(pa.Table.from_batches(pendentes), colunas)
@@ -0,0 +1,212 @@
+"""
+Consultas filtradas sobre os dados processados
+Cada dimensão de baixa cardinalidade criada pelo processar_dados tem um
+índice ordenado: os números das linhas agrupados pelo código da categoria,
+com o início de cada categoria. Um filtro parte da dimensão mais seletiva
+(só as linhas dela são lidas) e as demais condições são verificadas nos
+códigos dessas linhas, sem varrer o DataFrame inteiro.
+"""
+
+import numpy as np
+import pandas as pd
+
+from agregacao import TabelaMomentos
+from esquema import COLUNAS_NOTAS
+
+# Dimensões indexadas (as ausentes nos dados são ignoradas)
+DIMENSOES_CONSULTA = (
+    'SEXO', 'COR_RACA', 'TIPO_ESCOLA', 'REGIAO', 'SG_UF_ESC', 'FAIXA_ETARIA',
+    'NIVEL_SOCIOECONOMICO', 'DEPENDENCIA_ESCOLA', 'ANO'
+)
+
+# Colunas numéricas disponíveis para agregados e maiores valores
+COLUNAS_CONSULTA = COLUNAS_NOTAS + ['MEDIA_OBJETIVAS']
+
+
+def _codificar(serie):
+    """
+    Códigos inteiros (-1 = nulo) e categorias de uma coluna
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie.cat.codes.to_numpy(), serie.cat.categories
+    codigos, categorias = pd.factorize(serie, sort=True, use_na_sentinel=True)
+    return codigos, categorias
+
+
+class IndiceConsulta:
+    """
+    Índices ordenados das dimensões de um DataFrame processado
+    Guarda apenas os códigos, a ordem das linhas e referências às colunas
+    numéricas (sem copiar os dados)
+    """
+
+    def __init__(self, dados, dimensoes=DIMENSOES_CONSULTA, colunas=COLUNAS_CONSULTA):
+        self.dados = dados
+        self.total = len(dados)
+        tipo_linha = np.int32 if self.total < 2**31 else np.int64
+
+        self.codigos = {}
+        self.categorias = {}
+        self.ordem = {}
+        self.inicios = {}
+        for dimensao in dimensoes:
+            if dimensao not in dados.columns:
+                continue
+            codigos, categorias = _codificar(dados[dimensao])
+            # Nulos (-1) ficam na primeira faixa, antes da categoria 0
+            contagens = np.bincount(codigos + 1, minlength=len(categorias) + 1)
+            self.codigos[dimensao] = codigos
+            self.categorias[dimensao] = categorias
+            self.ordem[dimensao] = np.argsort(codigos, kind='stable').astype(tipo_linha, copy=False)
+            self.inicios[dimensao] = np.concatenate([[0], np.cumsum(contagens)])
+
+        self.valores = {col: dados[col].to_numpy() for col in colunas if col in dados.columns}
+
+    @property
+    def dimensoes(self):
+        return list(self.codigos)
+
+    def _codigos_filtro(self, dimensao, valores):
+        if dimensao not in self.codigos:
+            raise ValueError(f"Dimensão não indexada: {dimensao} (opções: {', '.join(self.dimensoes)})")
+
+        if isinstance(valores, (list, tuple, set, frozenset)):
+            valores = list(valores)
+        else:
+            valores = [valores]
+
+        categorias = self.categorias[dimensao]
+        codigos = categorias.get_indexer(valores)
+        if (codigos < 0).any():
+            desconhecidos = [valor for valor, codigo in zip(valores, codigos) if codigo < 0]
+            raise ValueError(f"Valores inexistentes em {dimensao}: {desconhecidos}")
+        return np.unique(codigos)
+
+    def linhas(self, filtros=None):
+        """
+        Números das linhas (em ordem crescente) que atendem aos filtros
+        filtros: dicionário dimensão -> valor ou lista de valores aceitos
+        Retorna None quando não há filtros (todas as linhas)
+        """
+        if not filtros:
+            return None
+
+        condicoes = [(dimensao, self._codigos_filtro(dimensao, valores)) for dimensao, valores in filtros.items()]
+
+        def tamanho(condicao):
+            dimensao, codigos = condicao
+            inicios = self.inicios[dimensao]
+            return int((inicios[codigos + 2] - inicios[codigos + 1]).sum())
+
+        condicoes.sort(key=tamanho)
+        dimensao, codigos = condicoes[0]
+        inicios = self.inicios[dimensao]
+        partes = [self.ordem[dimensao][inicios[codigo + 1]:inicios[codigo + 2]] for codigo in codigos]
+        linhas = partes[0] if len(partes) == 1 else np.sort(np.concatenate(partes))
+
+        for dimensao, codigos in condicoes[1:]:
+            if len(linhas) == 0:
+                break
+            codigos_linhas = self.codigos[dimensao][linhas]
+            if len(codigos) == 1:
+                linhas = linhas[codigos_linhas == codigos[0]]
+            else:
+                linhas = linhas[np.isin(codigos_linhas, codigos)]
+
+        return linhas
+
+    def contar(self, filtros=None):
+        """
+        Número de linhas que atendem aos filtros
+        """
+        linhas = self.linhas(filtros)
+        return self.total if linhas is None else len(linhas)
+
+    def agregar(self, filtros=None, por=None, colunas=None):
+        """
+        Momentos das colunas numéricas nas linhas filtradas
+        por: dimensão indexada para agrupar o resultado (None = total)
+        colunas: colunas a resumir (None = todas as disponíveis)
+        Retorna uma TabelaMomentos (media(), desvio(), participantes...)
+        """
+        colunas = [col for col in (colunas or self.valores) if col in self.valores]
+        linhas = self.linhas(filtros)
+
+        # Linhas ordenadas por grupo: cada grupo ocupa um intervalo contíguo,
+        # resumido por reduceat (ordenadas None = todas as linhas, sem cópia)
+        if por is None:
+            ordenadas = linhas
+            participantes = np.array([self.total if linhas is None else len(linhas)])
+            indice = pd.RangeIndex(1)
+            chaves = ()
+        else:
+            if por not in self.codigos:
+                raise ValueError(f"Dimensão não indexada: {por} (opções: {', '.join(self.dimensoes)})")
+            n_grupos = len(self.categorias[por])
+            if linhas is None:
+                # O próprio índice da dimensão já está na ordem dos grupos
+                inicios = self.inicios[por]
+                ordenadas = self.ordem[por][inicios[1]:]
+                participantes = np.diff(inicios[1:])
+            else:
+                grupos = self.codigos[por][linhas]
+                contagens = np.bincount(grupos + 1, minlength=n_grupos + 1)
+                ordenadas = linhas[np.argsort(grupos, kind='stable')][contagens[0]:]
+                participantes = contagens[1:]
+            indice = pd.Index(self.categorias[por], name=por)
+            chaves = (por,)
+
+        presentes = participantes > 0
+        inicios = (np.cumsum(participantes) - participantes)[presentes]
+        n, soma, soma_q, minimo, maximo = {}, {}, {}, {}, {}
+
+        for col in colunas:
+            valores = self.valores[col] if ordenadas is None else self.valores[col][ordenadas]
+            valores = valores.astype(np.float64)
+            for resultado in (n, soma, soma_q, minimo, maximo):
+                resultado[col] = np.full(len(indice), np.nan)
+            if not presentes.any():
+                continue
+
+            validos = ~np.isnan(valores)
+            minimo[col][presentes] = np.fmin.reduceat(valores, inicios)
+            maximo[col][presentes] = np.fmax.reduceat(valores, inicios)
+            valores[~validos] = 0.0
+            n[col][presentes] = np.add.reduceat(validos, inicios, dtype=np.int64)
+            soma[col][presentes] = np.add.reduceat(valores, inicios)
+            soma_q[col][presentes] = np.add.reduceat(valores * valores, inicios)
+
+        def tabela(partes, tipo=np.float64):
+            return pd.DataFrame(partes, index=indice, columns=colunas)[presentes].astype(tipo)
+
+        return TabelaMomentos(
+            chaves,
+            participantes=pd.Series(participantes, index=indice)[presentes],
+            n=tabela(n, np.int64),
+            soma=tabela(soma),
+            soma_q=tabela(soma_q),
+            minimo=tabela(minimo),
+            maximo=tabela(maximo)
+        )
+
+    def maiores(self, filtros=None, coluna='NU_NOTA_REDACAO', k=10):
+        """
+        As k linhas com os maiores valores da coluna entre as filtradas
+        (em ordem decrescente; nulos são ignorados)
+        """
+        if coluna not in self.valores:
+            raise ValueError(f"Coluna não disponível para consulta: {coluna}")
+
+        linhas = self.linhas(filtros)
+        valores = self.valores[coluna] if linhas is None else self.valores[coluna][linhas]
+        valores = np.where(np.isnan(valores), -np.inf, valores)
+
+        k = min(k, int(np.isfinite(valores).sum()))
+        if k <= 0:
+            return self.dados.iloc[:0]
+
+        escolhidas = np.argpartition(-valores, k - 1)[:k]
+        escolhidas = escolhidas[np.argsort(-valores[escolhidas], kind='stable')]
+        if linhas is not None:
+            escolhidas = linhas[escolhidas]
+        return self.dados.iloc[escolhidas]
@@ -0,0 +1,108 @@
+"""
+Cubo de agregados persistido em disco
+Guarda os momentos das notas (contagem, soma, soma dos quadrados) no
+cruzamento de todas as dimensões derivadas pelo processar_dados, mais os
+histogramas das notas por UF, a hierarquia geográfica por município e
+os momentos por resposta do questionário.
+Qualquer tabulação sobre essas dimensões é obtida consolidando o cubo,
+sem reler os microdados.
+"""
+
+import os
+
+import pandas as pd
+
+from cache_colunar import mesma_versao
+
+# Dimensões do cubo (REGIAO depende da UF e não multiplica as células)
+DIMENSOES_CUBO = (
+    'SG_UF_ESC', 'REGIAO', 'SEXO', 'NIVEL_SOCIOECONOMICO', 'FAIXA_ETARIA',
+    'TIPO_ESCOLA', 'COR_RACA', 'DEPENDENCIA_ESCOLA'
+)
+
+# Alterar quando o processamento mudar, para invalidar cubos antigos
+VERSAO_CUBO = 5
+
+
+class CuboAgregados:
+    """
+    Tabela fina de momentos sobre DIMENSOES_CUBO com a identificação da
+    fonte que a gerou
+    geografia: HierarquiaGeografica (município -> UF -> região -> nacional)
+    questionario: TabelaMomentos por (ITEM, RESPOSTA) do questionário
+    """
+
+    def __init__(self, fina, histogramas, fonte, geografia=None, questionario=None):
+        self.fina = fina
+        self.histogramas = histogramas
+        self.fonte = fonte
+        self.geografia = geografia
+        self.questionario = questionario
+
+    @property
+    def dimensoes(self):
+        return self.fina.chaves
+
+    @property
+    def total_registros(self):
+        return int(self.fina.participantes.sum())
+
+    def cobre(self, chaves):
+        """
+        Indica se o cubo responde ao agrupamento pedido
+        """
+        return all(chave in self.dimensoes for chave in chaves)
+
+    def cruzar(self, chaves):
+        """
+        Momentos consolidados para qualquer combinação das dimensões
+        """
+        return self.fina.agrupar(chaves)
+
+    def salvar(self, caminho):
+        """
+        Grava o cubo (arquivo temporário seguido de troca atômica)
+        """
+        temporario = caminho + '.tmp'
+        pd.to_pickle(self, temporario)
+        os.replace(temporario, caminho)
+
+    @staticmethod
+    def carregar(caminho, arquivo, amostra):
+        """
+        Lê o cubo gravado se ele corresponder à versão atual do arquivo de
+        origem e à amostra (ver cache_colunar.mesma_versao)
+        Retorna None se não existir ou estiver desatualizado
+        """
+        if not os.path.exists(caminho):
+            return None
+
+        try:
+            cubo = pd.read_pickle(caminho)
+        except Exception:
+            return None
+
+        if not isinstance(cubo, CuboAgregados):
+            return None
+        if cubo.fonte.get('amostra') != amostra or cubo.fonte.get('versao') != VERSAO_CUBO:
+            return None
+        if not mesma_versao(cubo.fonte, arquivo):
+            return None
+
+        return cubo
+
+
+def identificar_fonte(impressao, amostra):
+    """
+    Chave de validade do cubo: versão do arquivo (tamanho, mtime e hash do
+    conteúdo completo), amostra e versão do cubo
+    Com outro mtime, o cubo só é reaproveitado se o hash do conteúdo for o
+    mesmo (ex.: cópia do arquivo)
+    """
+    return {
+        'tamanho': impressao['tamanho'],
+        'mtime': impressao['mtime'],
+        'hash': impressao['hash'],
+        'amostra': amostra,
+        'versao': VERSAO_CUBO
+    }
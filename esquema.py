@@ -0,0 +1,118 @@
+"""
+Esquema declarado dos microdados do ENEM
+Define os tipos compactos de cada coluna e quais colunas cada análise utiliza,
+para que o carregamento leia apenas o necessário
+"""
+
+COLUNAS_NOTAS = ['NU_NOTA_CN', 'NU_NOTA_CH', 'NU_NOTA_LC', 'NU_NOTA_MT', 'NU_NOTA_REDACAO']
+COLUNAS_OBJETIVAS = ['NU_NOTA_CN', 'NU_NOTA_CH', 'NU_NOTA_LC', 'NU_NOTA_MT']
+COLUNAS_PRESENCA = ['TP_PRESENCA_CN', 'TP_PRESENCA_CH', 'TP_PRESENCA_LC', 'TP_PRESENCA_MT']
+COLUNAS_QUESTIONARIO = [f'Q{i:03d}' for i in range(1, 26)]
+
+# Tipos compactos por coluna do arquivo bruto
+# - códigos TP_*: inteiros de 8 bits (nulláveis quando o campo pode vir vazio)
+# - notas: float32 (precisão de sobra para notas com uma casa decimal)
+# - siglas e letras do questionário: categóricas
+# TP_SEXO vem como letra ('M'/'F') nos arquivos recentes, por isso é categórica
+ESQUEMA_MICRODADOS = {
+    'NU_INSCRICAO': 'int64',
+    'NU_ANO': 'int16',
+    'NU_IDADE': 'Int16',
+    'TP_FAIXA_ETARIA': 'Int8',
+    'TP_SEXO': 'category',
+    'TP_COR_RACA': 'Int8',
+    'TP_ESCOLA': 'Int8',
+    'TP_DEPENDENCIA_ADM_ESC': 'Int8',
+    'CO_MUNICIPIO_ESC': 'Int32',
+    'NO_MUNICIPIO_ESC': 'category',
+    'CO_UF_ESC': 'Int8',
+    'SG_UF_ESC': 'category',
+    'TP_PRESENCA_CN': 'int8',
+    'TP_PRESENCA_CH': 'int8',
+    'TP_PRESENCA_LC': 'int8',
+    'TP_PRESENCA_MT': 'int8',
+    'NU_NOTA_CN': 'float32',
+    'NU_NOTA_CH': 'float32',
+    'NU_NOTA_LC': 'float32',
+    'NU_NOTA_MT': 'float32',
+    'NU_NOTA_REDACAO': 'float32',
+}
+ESQUEMA_MICRODADOS.update({col: 'category' for col in COLUNAS_QUESTIONARIO})
+
+# Colunas usadas pelo processar_dados independentemente das análises habilitadas
+COLUNAS_PROCESSAMENTO = COLUNAS_PRESENCA + ['TP_COR_RACA', 'TP_ESCOLA']
+
+# Colunas do arquivo bruto exigidas por cada análise (na ordem de execução)
+COLUNAS_POR_ANALISE = {
+    'estatisticas_gerais': COLUNAS_NOTAS + ['TP_SEXO', 'SG_UF_ESC'],
+    # Os códigos do IBGE completam a UF ausente e identificam o município
+    'analise_1_desempenho_por_estado': COLUNAS_NOTAS + ['SG_UF_ESC', 'CO_UF_ESC', 'CO_MUNICIPIO_ESC',
+                                                        'NO_MUNICIPIO_ESC'],
+    # Todos os itens do questionário (Q006, a renda, define o nível socioeconômico)
+    'analise_2_desempenho_socioeconomico': COLUNAS_NOTAS + COLUNAS_QUESTIONARIO + ['TP_DEPENDENCIA_ADM_ESC'],
+    'analise_3_maiores_notas_redacao': ['NU_NOTA_REDACAO', 'SG_UF_ESC'],
+    'analise_4_genero_areas': COLUNAS_NOTAS + ['TP_SEXO'],
+    # Arquivos recentes trazem só a faixa etária (TP_FAIXA_ETARIA), sem NU_IDADE
+    'analise_5_faixa_etaria': COLUNAS_NOTAS + ['NU_IDADE', 'TP_FAIXA_ETARIA'],
+}
+
+ANALISES = tuple(COLUNAS_POR_ANALISE)
+
+# Agrupamentos (colunas derivadas pelo processar_dados) cujos momentos
+# cada análise consulta; vazio = total geral
+# A análise 1 usa a hierarquia geográfica (geografia.py), calculada à parte
+# para que o município não multiplique as células dos demais agrupamentos
+AGRUPAMENTOS_POR_ANALISE = {
+    'estatisticas_gerais': [(), ('SEXO',), ('REGIAO',)],
+    'analise_1_desempenho_por_estado': [],
+    'analise_2_desempenho_socioeconomico': [('NIVEL_SOCIOECONOMICO',), ('DEPENDENCIA_ESCOLA',)],
+    'analise_3_maiores_notas_redacao': [],
+    'analise_4_genero_areas': [('SEXO',)],
+    'analise_5_faixa_etaria': [('FAIXA_ETARIA',)],
+}
+
+
+# Colunas de nota cujos histogramas (quantis exatos, por UF) cada análise consulta
+HISTOGRAMAS_POR_ANALISE = {
+    'analise_3_maiores_notas_redacao': ['NU_NOTA_REDACAO'],
+}
+
+# Bytes por valor de cada tipo em memória (nulláveis têm um byte de máscara;
+# categóricas guardam códigos de 8 bits)
+BYTES_POR_TIPO = {
+    'int8': 1, 'Int8': 2, 'int16': 2, 'Int16': 3, 'int32': 4, 'Int32': 5,
+    'int64': 8, 'Int64': 9, 'float32': 4, 'float64': 8, 'category': 1,
+}
+
+
+def colunas_necessarias(analises=None):
+    """
+    Retorna a lista de colunas do arquivo bruto necessárias para as análises
+    analises: nomes das análises habilitadas (None = todas)
+    """
+    if analises is None:
+        analises = ANALISES
+
+    colunas = list(COLUNAS_PROCESSAMENTO)
+    for analise in analises:
+        if analise not in COLUNAS_POR_ANALISE:
+            raise ValueError(f"Análise desconhecida: {analise}")
+        colunas.extend(COLUNAS_POR_ANALISE[analise])
+
+    # Remover duplicadas preservando a ordem
+    return list(dict.fromkeys(colunas))
+
+
+def tipos_colunas(colunas):
+    """
+    Retorna o dicionário de dtypes do esquema restrito às colunas informadas
+    """
+    return {col: ESQUEMA_MICRODADOS[col] for col in colunas if col in ESQUEMA_MICRODADOS}
+
+
+def bytes_por_linha(colunas):
+    """
+    Estimativa dos bytes por linha em memória das colunas, pelos tipos do esquema
+    (colunas fora do esquema contam como texto, 8 bytes de ponteiro mais o valor)
+    """
+    return sum(BYTES_POR_TIPO.get(ESQUEMA_MICRODADOS.get(col), 64) for col in colunas)
@@ -0,0 +1,236 @@
+"""
+Estatísticas inferenciais das comparações entre grupos
+Erros padrão, intervalos de confiança e tamanhos de efeito (d de Cohen)
+saem direto dos momentos combináveis (contagem, soma e soma dos
+quadrados) de uma TabelaMomentos, para todos os grupos e colunas de uma
+vez, em qualquer agrupamento e em qualquer modo de execução.
+
+O bootstrap usa a variante de Poisson: cada reamostra dá a cada linha um
+peso Poisson(1), e as somas ponderadas de um lote de reamostras saem de
+produtos matriciais com as linhas ordenadas por grupo. Lotes de
+reamostras e fatias de linhas são dimensionados para um limite de
+memória, e os lotes podem ser divididos entre processos.
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from paralelo import numero_processos
+
+# Bytes por célula (reamostra x linha) de um lote: sorteio de 16 bits e peso em float64
+BYTES_POR_CELULA = 10
+
+# Níveis da tabela de consulta dos pesos de Poisson
+NIVEIS_POISSON = 1 << 16
+
+# Linhas por fatia do bootstrap
+LINHAS_POR_FATIA = 1 << 16
+
+# Arrays do bootstrap herdados pelos processos filhos via fork
+_reamostragem_compartilhada = None
+
+
+def quantil_normal(confianca):
+    """
+    Valor crítico bilateral da normal padrão (1.96 para confianca=0.95)
+    """
+    return NormalDist().inv_cdf(0.5 + confianca / 2)
+
+
+def _juntar(partes, colunas):
+    """
+    DataFrame com colunas em dois níveis (coluna, medida), na ordem das colunas
+    """
+    tabela = pd.concat(partes, axis=1, names=['medida', 'coluna'])
+    tabela = tabela.reorder_levels(['coluna', 'medida'], axis=1)
+    ordem = [(coluna, medida) for coluna in colunas for medida in partes]
+    return tabela[ordem]
+
+
+def intervalos(momentos, confianca=0.95):
+    """
+    Média, erro padrão e intervalo de confiança (aproximação normal) de
+    cada coluna por grupo
+    Grupos com menos de duas notas ficam sem erro padrão
+    Retorna DataFrame com colunas (coluna, medida); ex.: tabela['NU_NOTA_MT']
+    """
+    media = momentos.media()
+    erro = momentos.desvio() / np.sqrt(momentos.n.where(momentos.n > 1))
+    z = quantil_normal(confianca)
+
+    return _juntar({
+        'n': momentos.n,
+        'media': media,
+        'erro_padrao': erro,
+        'ic_inferior': media - z * erro,
+        'ic_superior': media + z * erro,
+    }, media.columns)
+
+
+def comparar(momentos, dimensao, referencia, confianca=0.95):
+    """
+    Compara a média de cada grupo da dimensão com a do grupo de referência,
+    dentro de cada combinação das demais chaves da tabela
+    Diferença de médias com erro padrão e intervalo de confiança de Welch,
+    e d de Cohen (diferença sobre o desvio padrão combinado)
+    Ex.: comparar(momentos_por_sexo, 'SEXO', 'Feminino')
+    Retorna DataFrame com colunas (coluna, medida), um grupo por linha
+    """
+    if dimensao not in momentos.chaves:
+        raise KeyError(f"Dimensão ausente na tabela: {dimensao} (chaves: {', '.join(momentos.chaves)})")
+
+    n = momentos.n.where(momentos.n > 1)
+    media = momentos.media()
+    variancia = momentos.desvio() ** 2
+
+    rotulos = n.index.get_level_values(momentos.chaves.index(dimensao))
+    eh_referencia = np.asarray(rotulos == referencia)
+    if not eh_referencia.any():
+        raise ValueError(f"Grupo inexistente em {dimensao}: {referencia}")
+    grupos = n.index[~eh_referencia]
+
+    def da_referencia(tabela):
+        # Valores da referência repetidos em cada grupo comparado (alinhados
+        # pelas demais chaves quando houver)
+        base = tabela[eh_referencia]
+        if n.index.nlevels == 1:
+            valores = np.repeat(base.to_numpy(), len(grupos), axis=0)
+        else:
+            valores = base.droplevel(dimensao).reindex(grupos.droplevel(dimensao)).to_numpy()
+        return pd.DataFrame(valores, index=grupos, columns=tabela.columns)
+
+    n_a, media_a, variancia_a = n[~eh_referencia], media[~eh_referencia], variancia[~eh_referencia]
+    n_b, media_b, variancia_b = da_referencia(n), da_referencia(media), da_referencia(variancia)
+
+    diferenca = media_a - media_b
+    erro = np.sqrt(variancia_a / n_a + variancia_b / n_b)
+    desvio_combinado = np.sqrt(((n_a - 1) * variancia_a + (n_b - 1) * variancia_b) / (n_a + n_b - 2))
+    z = quantil_normal(confianca)
+
+    return _juntar({
+        'diferenca': diferenca,
+        'erro_padrao': erro,
+        'ic_inferior': diferenca - z * erro,
+        'ic_superior': diferenca + z * erro,
+        'cohen_d': diferenca / desvio_combinado,
+    }, media.columns)
+
+
+def _tabela_poisson():
+    """
+    Quantis da Poisson(1) em NIVEIS_POISSON níveis uniformes: um inteiro
+    aleatório de 16 bits vira um peso por consulta à tabela (bem mais rápido
+    que sortear a Poisson; valores acima de 8, probabilidade < 1e-5, não ocorrem)
+    """
+    k = np.arange(16)
+    acumulada = np.cumsum(np.exp(-1.0) / np.cumprod(np.r_[1, k[1:]]))
+    uniformes = (np.arange(NIVEIS_POISSON) + 0.5) / NIVEIS_POISSON
+    return np.searchsorted(acumulada, uniformes).astype(np.float64)
+
+
+def _reamostrar_lote(semente, n_reamostras, compartilhados=None):
+    """
+    Médias por grupo de um lote de reamostras de Poisson
+    Retorna array (reamostras, grupos, colunas)
+    """
+    valores, validos, grupos, n_grupos, linhas_por_fatia = compartilhados or _reamostragem_compartilhada
+    gerador = np.random.default_rng(semente)
+    tabela = _tabela_poisson()
+    soma = np.zeros((n_reamostras, n_grupos, valores.shape[1]))
+    contagem = np.zeros_like(soma)
+
+    for inicio in range(0, len(grupos), linhas_por_fatia):
+        codigos = grupos[inicio:inicio + linhas_por_fatia]
+        pesos = tabela[gerador.integers(0, NIVEIS_POISSON, size=(n_reamostras, len(codigos)), dtype=np.uint16)]
+
+        # Linhas ordenadas por grupo: cada grupo é um trecho contíguo da
+        # fatia, somado para todas as reamostras e colunas em um produto matricial
+        limites = np.r_[np.flatnonzero(codigos[1:] != codigos[:-1]) + 1, len(codigos)]
+        comeco = 0
+        for fim in limites:
+            trecho = slice(inicio + comeco, inicio + fim)
+            soma[:, codigos[comeco]] += pesos[:, comeco:fim] @ valores[trecho]
+            contagem[:, codigos[comeco]] += pesos[:, comeco:fim] @ validos[trecho]
+            comeco = fim
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return soma / contagem
+
+
+def bootstrap_medias(dados, chaves, colunas, n_reamostras=1000, confianca=0.95, semente=None,
+                     n_processos=1, memoria_lote=64 * 2**20):
+    """
+    Intervalos de confiança bootstrap (percentis) das médias por grupo
+    chaves: colunas de agrupamento (vazio = total geral); grupos com chave nula são descartados
+    colunas: colunas numéricas (nulos são ignorados)
+    memoria_lote: bytes de trabalho de cada lote de reamostras (por processo)
+    semente: as mesmas reamostras para qualquer número de processos
+    Retorna DataFrame com colunas (coluna, medida): media, erro_padrao,
+    ic_inferior, ic_superior
+    """
+    global _reamostragem_compartilhada
+
+    chaves, colunas = list(chaves), list(colunas)
+    if chaves:
+        agrupados = dados.groupby(chaves, observed=True, dropna=True, sort=True)
+        codigos = agrupados.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+        indice = agrupados.size().index
+    else:
+        codigos = np.zeros(len(dados), dtype=np.int64)
+        indice = pd.RangeIndex(1)
+
+    # Linhas ordenadas por grupo (as de chave nula, código -1, ficam de fora)
+    ordem = np.argsort(codigos, kind='stable')
+    ordem = ordem[np.searchsorted(codigos[ordem], 0):]
+    valores = dados[colunas].to_numpy(dtype=np.float64, na_value=np.nan)[ordem]
+    codigos = codigos[ordem]
+    validos = ~np.isnan(valores)
+    valores[~validos] = 0.0
+    validos = validos.astype(np.float64)
+
+    linhas_por_fatia = max(min(len(codigos), LINHAS_POR_FATIA), 1)
+    por_lote = int(np.clip(memoria_lote // (BYTES_POR_CELULA * linhas_por_fatia), 1, n_reamostras))
+    tamanhos = [min(por_lote, n_reamostras - inicio) for inicio in range(0, n_reamostras, por_lote)]
+    sementes = np.random.SeedSequence(semente).spawn(len(tamanhos))
+    compartilhados = (valores, validos, codigos, len(indice), linhas_por_fatia)
+
+    n_processos = min(numero_processos(n_processos), len(tamanhos))
+    if n_processos == 1:
+        lotes = [_reamostrar_lote(s, tamanho, compartilhados) for s, tamanho in zip(sementes, tamanhos)]
+    elif 'fork' in multiprocessing.get_all_start_methods():
+        _reamostragem_compartilhada = compartilhados
+        try:
+            contexto = multiprocessing.get_context('fork')
+            with ProcessPoolExecutor(n_processos, mp_context=contexto) as executor:
+                lotes = list(executor.map(_reamostrar_lote, sementes, tamanhos))
+        finally:
+            _reamostragem_compartilhada = None
+    else:
+        with ProcessPoolExecutor(n_processos) as executor:
+            lotes = list(executor.map(_reamostrar_lote, sementes, tamanhos,
+                                      [compartilhados] * len(tamanhos)))
+
+    reamostras = np.concatenate(lotes)
+    alfa = (1 - confianca) / 2
+    inferior, superior = np.nanquantile(reamostras, [alfa, 1 - alfa], axis=0)
+
+    soma = np.column_stack([np.bincount(codigos, valores[:, j], minlength=len(indice))
+                            for j in range(len(colunas))])
+    contagem = np.column_stack([np.bincount(codigos, validos[:, j], minlength=len(indice))
+                                for j in range(len(colunas))])
+
+    def tabela(matriz):
+        return pd.DataFrame(matriz, index=indice, columns=colunas)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        media = soma / contagem
+        return _juntar({
+            'media': tabela(media),
+            'erro_padrao': tabela(np.nanstd(reamostras, axis=0, ddof=1)),
+            'ic_inferior': tabela(inferior),
+            'ic_superior': tabela(superior),
+        }, colunas)
@@ -0,0 +1,177 @@
+"""
+Hierarquia geográfica das notas: município -> UF -> região -> nacional
+Os momentos das notas são calculados uma única vez no nível mais fino
+(município da escola, com a UF e a região) e os níveis superiores saem
+da consolidação dos momentos do nível logo abaixo, sem nova passagem
+pelos dados. A tabela fina é combinável entre blocos e processos.
+
+A UF ausente é completada pelos códigos do IBGE: os dois primeiros
+dígitos do código do município são o código da UF.
+"""
+
+import numpy as np
+import pandas as pd
+
+from agregacao import TabelaMomentos
+from paralelo import momentos_paralelos
+from preprocessamento import categorizar
+
+# Código IBGE da UF -> sigla
+UF_POR_CODIGO = {
+    11: 'RO', 12: 'AC', 13: 'AM', 14: 'RR', 15: 'PA', 16: 'AP', 17: 'TO',
+    21: 'MA', 22: 'PI', 23: 'CE', 24: 'RN', 25: 'PB', 26: 'PE', 27: 'AL', 28: 'SE', 29: 'BA',
+    31: 'MG', 32: 'ES', 33: 'RJ', 35: 'SP',
+    41: 'PR', 42: 'SC', 43: 'RS',
+    50: 'MS', 51: 'MT', 52: 'GO', 53: 'DF'
+}
+
+# Chaves de cada nível, do mais fino ao nacional (a região depende da UF
+# e a UF do município, então as chaves extras não multiplicam os grupos)
+NIVEIS_GEOGRAFICOS = {
+    'municipio': ('SG_UF_ESC', 'REGIAO', 'CO_MUNICIPIO_ESC'),
+    'uf': ('SG_UF_ESC', 'REGIAO'),
+    'regiao': ('REGIAO',),
+    'nacional': (),
+}
+
+CHAVES_GEOGRAFICAS = NIVEIS_GEOGRAFICOS['municipio']
+
+
+def completar_uf(dados):
+    """
+    Sigla da UF da escola com as ausentes preenchidas pelo código do IBGE
+    da UF (CO_UF_ESC) ou do município (CO_MUNICIPIO_ESC)
+    Retorna a coluna SG_UF_ESC sem alterações quando não falta nenhuma
+    (ou não há códigos) e None quando não há nenhuma das colunas
+    """
+    codigos = None
+    for col, divisor in (('CO_UF_ESC', 1), ('CO_MUNICIPIO_ESC', 100_000)):
+        if col in dados.columns:
+            valores = dados[col].to_numpy(dtype='float64', na_value=np.nan) // divisor
+            codigos = valores if codigos is None else np.where(np.isnan(codigos), valores, codigos)
+
+    existente = dados['SG_UF_ESC'] if 'SG_UF_ESC' in dados.columns else None
+    if codigos is None or (existente is not None and not existente.isna().any()):
+        return existente
+
+    # Categorias em ordem alfabética, como as lidas do CSV
+    mapa = dict(sorted(UF_POR_CODIGO.items(), key=lambda item: item[1]))
+    siglas = categorizar(pd.Series(codigos), mapa)
+    if existente is None:
+        return siglas
+
+    existente = existente.astype('category')
+    categorias = existente.cat.categories.union(siglas.categories)
+    resultado = existente.cat.set_categories(categorias).cat.codes.to_numpy().copy()
+    traducao = np.append(categorias.get_indexer(siglas.categories), -1)
+    faltam = resultado < 0
+    resultado[faltam] = traducao[siglas.codes[faltam]]
+    return pd.Categorical.from_codes(resultado, categories=categorias)
+
+
+class HierarquiaGeografica:
+    """
+    Tabela fina de momentos por município (chaves nulas mantidas, para que
+    linhas sem município ainda contem na UF) e os níveis consolidados
+    """
+
+    def __init__(self, fina=None, nomes=None):
+        self.fina = fina
+        self.nomes = pd.Series(dtype=object) if nomes is None else nomes
+        self._niveis = {}
+
+    @property
+    def niveis(self):
+        """
+        Níveis disponíveis com as colunas dos dados resumidos
+        """
+        if self.fina is None:
+            return []
+        return [nivel for nivel, chaves in NIVEIS_GEOGRAFICOS.items()
+                if all(chave in self.fina.chaves for chave in chaves)]
+
+    @classmethod
+    def calcular(cls, dados, colunas, n_processos=1):
+        """
+        Hierarquia de um DataFrame processado, com a tabela fina calculada
+        em uma passagem (dividida entre n_processos)
+        """
+        chaves = tuple(chave for chave in CHAVES_GEOGRAFICAS if chave in dados.columns)
+        fina = momentos_paralelos(dados, [chaves], colunas, n_processos, resolver=False)
+        return cls(fina, cls.nomes_municipios(dados))
+
+    def adicionar(self, dados, colunas):
+        """
+        Acrescenta os momentos das colunas de um bloco de dados processados
+        (e os nomes dos municípios, quando presentes)
+        """
+        chaves = [chave for chave in CHAVES_GEOGRAFICAS if chave in dados.columns]
+        parcial = TabelaMomentos.calcular(dados, chaves, colunas, dropna=False)
+        self.combinar(HierarquiaGeografica(parcial, self.nomes_municipios(dados)))
+        return self
+
+    def combinar(self, outra):
+        """
+        Soma os momentos e os nomes de outra hierarquia com as mesmas chaves
+        """
+        if outra.fina is not None:
+            partes = [self.fina, outra.fina] if self.fina is not None else [outra.fina]
+            self.fina = TabelaMomentos.combinar(partes)
+        if len(outra.nomes):
+            nomes = pd.concat([self.nomes, outra.nomes]) if len(self.nomes) else outra.nomes
+            self.nomes = nomes[~nomes.index.duplicated()]
+        self._niveis = {}
+        return self
+
+    @staticmethod
+    def nomes_municipios(dados):
+        """
+        Nome de cada código de município dos dados (None sem as colunas)
+        """
+        if 'CO_MUNICIPIO_ESC' not in dados.columns or 'NO_MUNICIPIO_ESC' not in dados.columns:
+            return None
+        codigos = dados['CO_MUNICIPIO_ESC']
+        primeiras = (codigos.notna() & ~codigos.duplicated()).to_numpy()
+        return pd.Series(
+            np.asarray(dados['NO_MUNICIPIO_ESC'].to_numpy()[primeiras], dtype=object),
+            index=pd.Index(codigos.to_numpy()[primeiras], name='CO_MUNICIPIO_ESC'),
+            name='NO_MUNICIPIO_ESC'
+        )
+
+    def nivel(self, nome):
+        """
+        Momentos de um nível ('municipio', 'uf', 'regiao' ou 'nacional')
+        Cada nível é a consolidação do nível logo abaixo: a UF inclui as
+        linhas sem município, e região e nacional somam as UFs
+        """
+        if nome not in NIVEIS_GEOGRAFICOS:
+            raise ValueError(f"Nível geográfico desconhecido: {nome} (opções: {', '.join(NIVEIS_GEOGRAFICOS)})")
+        if nome not in self.niveis:
+            raise ValueError(f"Nível {nome} indisponível: faltam colunas de {NIVEIS_GEOGRAFICOS[nome]}")
+
+        if nome not in self._niveis:
+            ordem = list(NIVEIS_GEOGRAFICOS)
+            abaixo = ordem[ordem.index(nome) - 1] if nome not in ('municipio', 'uf') else None
+            origem = self.nivel(abaixo) if abaixo else self.fina
+            self._niveis[nome] = origem.agrupar(NIVEIS_GEOGRAFICOS[nome])
+
+        return self._niveis[nome]
+
+    def tabela(self, nome='municipio', uf=None):
+        """
+        Médias das notas e participantes de cada grupo do nível
+        uf: sigla (ou lista de siglas) para restringir municípios e UFs
+        """
+        momentos = self.nivel(nome)
+        tabela = momentos.media().round(1)
+        tabela['PARTICIPANTES'] = momentos.participantes
+
+        if nome == 'municipio' and len(self.nomes):
+            codigos = tabela.index.get_level_values('CO_MUNICIPIO_ESC')
+            tabela.insert(0, 'NO_MUNICIPIO_ESC', self.nomes.reindex(codigos).to_numpy())
+
+        if uf is not None and 'SG_UF_ESC' in momentos.chaves:
+            siglas = [uf] if isinstance(uf, str) else list(uf)
+            tabela = tabela[tabela.index.get_level_values('SG_UF_ESC').isin(siglas)]
+
+        return tabela
@@ -0,0 +1,207 @@
+"""
+Gerador de microdados sintéticos do ENEM
+Escreve CSVs com o layout do arquivo oficial (mesmos nomes de colunas,
+separador ';' e encoding latin-1), com distribuições plausíveis de notas,
+UFs e taxas de ausência. Útil para testes de desempenho sem o arquivo real.
+
+Uso: python gerador_sintetico.py --linhas 1000000 --saida MICRODADOS_SINTETICOS.csv
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# Sigla, código IBGE e peso aproximado de participantes por UF
+UFS = [
+    ('RO', 11, 0.8), ('AC', 12, 0.5), ('AM', 13, 2.2), ('RR', 14, 0.3), ('PA', 15, 5.2),
+    ('AP', 16, 0.5), ('TO', 17, 0.8), ('MA', 21, 4.0), ('PI', 22, 2.2), ('CE', 23, 6.0),
+    ('RN', 24, 1.9), ('PB', 25, 2.3), ('PE', 26, 5.3), ('AL', 27, 1.7), ('SE', 28, 1.2),
+    ('BA', 29, 7.9), ('MG', 31, 9.8), ('ES', 32, 1.8), ('RJ', 33, 7.0), ('SP', 35, 17.6),
+    ('PR', 41, 4.4), ('SC', 42, 2.4), ('RS', 43, 4.2), ('MS', 50, 1.2), ('MT', 51, 1.6),
+    ('GO', 52, 3.2), ('DF', 53, 1.7)
+]
+
+# Colunas do arquivo de 2023, na ordem oficial
+COLUNAS_2023 = (
+    ['NU_INSCRICAO', 'NU_ANO', 'TP_FAIXA_ETARIA', 'TP_SEXO', 'TP_ESTADO_CIVIL', 'TP_COR_RACA',
+     'TP_NACIONALIDADE', 'TP_ST_CONCLUSAO', 'TP_ANO_CONCLUIU', 'TP_ESCOLA', 'TP_ENSINO',
+     'IN_TREINEIRO', 'CO_MUNICIPIO_ESC', 'NO_MUNICIPIO_ESC', 'CO_UF_ESC', 'SG_UF_ESC',
+     'TP_DEPENDENCIA_ADM_ESC', 'TP_LOCALIZACAO_ESC', 'TP_SIT_FUNC_ESC', 'CO_MUNICIPIO_PROVA',
+     'NO_MUNICIPIO_PROVA', 'CO_UF_PROVA', 'SG_UF_PROVA']
+    + [f'TP_PRESENCA_{area}' for area in ('CN', 'CH', 'LC', 'MT')]
+    + [f'CO_PROVA_{area}' for area in ('CN', 'CH', 'LC', 'MT')]
+    + [f'NU_NOTA_{area}' for area in ('CN', 'CH', 'LC', 'MT')]
+    + [f'TX_RESPOSTAS_{area}' for area in ('CN', 'CH', 'LC', 'MT')]
+    + ['TP_LINGUA']
+    + [f'TX_GABARITO_{area}' for area in ('CN', 'CH', 'LC', 'MT')]
+    + ['TP_STATUS_REDACAO']
+    + [f'NU_NOTA_COMP{i}' for i in range(1, 6)]
+    + ['NU_NOTA_REDACAO']
+    + [f'Q{i:03d}' for i in range(1, 24)]
+)
+
+# Média e desvio das notas objetivas (escala TRI) e limites observados
+PARAMETROS_NOTAS = {
+    'CN': (495.0, 75.0, 300.0, 870.0),
+    'CH': (523.0, 80.0, 290.0, 850.0),
+    'LC': (518.0, 70.0, 280.0, 820.0),
+    'MT': (533.0, 110.0, 320.0, 960.0),
+}
+
+# Número de alternativas de cada item do questionário socioeconômico
+ALTERNATIVAS_QUESTIONARIO = {
+    1: 8, 2: 8, 3: 6, 4: 6, 5: 20, 6: 17, 7: 4, 8: 5, 9: 5, 10: 5, 11: 5, 12: 5,
+    13: 5, 14: 5, 15: 5, 16: 5, 17: 5, 18: 2, 19: 5, 20: 2, 21: 2, 22: 5, 23: 2,
+}
+
+
+def _letras(rng, n, alternativas, concentracao=1.5):
+    """
+    Respostas A, B, C... com probabilidade decrescente
+    """
+    pesos = 1 / np.arange(1, alternativas + 1) ** (1 / concentracao)
+    letras = np.array([chr(ord('A') + i) for i in range(alternativas)])
+    return letras[rng.choice(alternativas, n, p=pesos / pesos.sum())]
+
+
+def _inteiros(valores, mascara):
+    """
+    Coluna inteira que fica vazia fora da máscara
+    """
+    return pd.Series(valores).astype('Int64').where(mascara)
+
+
+def _respostas(rng, n, tamanho=45, variantes=500):
+    """
+    Strings de respostas sorteadas de um conjunto fixo (evita gerar texto por linha)
+    """
+    conjunto = np.array([''.join(rng.choice(list('ABCDE'), tamanho)) for _ in range(variantes)])
+    return conjunto[rng.integers(0, variantes, n)]
+
+
+def gerar_bloco(n, rng, inicio=0, ano=2023):
+    """
+    Gera um DataFrame sintético com n participantes no layout oficial
+    inicio: deslocamento do número de inscrição
+    """
+    siglas = np.array([uf[0] for uf in UFS])
+    codigos = np.array([uf[1] for uf in UFS])
+    pesos = np.array([uf[2] for uf in UFS])
+    uf_prova = rng.choice(len(UFS), n, p=pesos / pesos.sum())
+
+    # Cerca de 35% ainda cursam o ensino médio e têm dados da escola
+    concluindo = rng.random(n) < 0.35
+    faixa = np.where(concluindo, rng.choice([2, 3, 4], n, p=[0.3, 0.55, 0.15]),
+                     rng.choice(np.arange(1, 21), n, p=np.r_[0.01, 0.05, 0.18, 0.16, 0.12, 0.09,
+                                                             0.07, 0.05, 0.04, 0.03, np.full(10, 0.02)]))
+
+    dados = {
+        'NU_INSCRICAO': ano * 100_000_000 + inicio + np.arange(n, dtype=np.int64),
+        'NU_ANO': np.full(n, ano),
+        'TP_FAIXA_ETARIA': faixa,
+        'TP_SEXO': np.where(rng.random(n) < 0.6, 'F', 'M'),
+        'TP_ESTADO_CIVIL': rng.choice([0, 1, 2, 3, 4], n, p=[0.04, 0.86, 0.08, 0.015, 0.005]),
+        'TP_COR_RACA': rng.choice(np.arange(7), n, p=[0.02, 0.40, 0.13, 0.42, 0.02, 0.006, 0.004]),
+        'TP_NACIONALIDADE': rng.choice([0, 1, 2, 3, 4], n, p=[0.001, 0.98, 0.01, 0.007, 0.002]),
+        'TP_ST_CONCLUSAO': np.where(concluindo, 2, rng.choice([1, 3, 4], n, p=[0.6, 0.3, 0.1])),
+        'TP_ANO_CONCLUIU': np.where(concluindo, 0, rng.integers(0, 18, n)),
+        'TP_ESCOLA': np.where(concluindo, rng.choice([2, 3], n, p=[0.8, 0.2]), 1),
+        'TP_ENSINO': _inteiros(np.where(concluindo, 1, 0), concluindo),
+        'IN_TREINEIRO': (faixa <= 2).astype(int) * (rng.random(n) < 0.5),
+    }
+
+    uf_escola = np.where(rng.random(n) < 0.97, uf_prova, rng.choice(len(UFS), n))
+    municipio = codigos[uf_escola] * 100_000 + rng.integers(0, 800, n)
+    dados['CO_MUNICIPIO_ESC'] = _inteiros(municipio, concluindo)
+    dados['NO_MUNICIPIO_ESC'] = np.where(concluindo, np.char.add('Municipio ', municipio.astype(str)), '')
+    dados['CO_UF_ESC'] = _inteiros(codigos[uf_escola], concluindo)
+    dados['SG_UF_ESC'] = np.where(concluindo, siglas[uf_escola], '')
+    dependencia = np.where(dados['TP_ESCOLA'] == 3, 4, rng.choice([1, 2, 3], n, p=[0.04, 0.93, 0.03]))
+    dados['TP_DEPENDENCIA_ADM_ESC'] = _inteiros(dependencia, concluindo)
+    dados['TP_LOCALIZACAO_ESC'] = _inteiros(rng.choice([1, 2], n, p=[0.95, 0.05]), concluindo)
+    dados['TP_SIT_FUNC_ESC'] = _inteiros(np.ones(n, dtype=int), concluindo)
+
+    municipio_prova = codigos[uf_prova] * 100_000 + rng.integers(0, 800, n)
+    dados['CO_MUNICIPIO_PROVA'] = municipio_prova
+    dados['NO_MUNICIPIO_PROVA'] = np.char.add('Municipio ', municipio_prova.astype(str))
+    dados['CO_UF_PROVA'] = codigos[uf_prova]
+    dados['SG_UF_PROVA'] = siglas[uf_prova]
+
+    # Ausência: ~28% faltam no 1º dia (LC, CH) e parte dos presentes falta no 2º (CN, MT)
+    dia1 = rng.choice([0, 1, 2], n, p=[0.28, 0.717, 0.003])
+    dia2 = np.where(dia1 == 1, rng.choice([0, 1, 2], n, p=[0.07, 0.928, 0.002]),
+                    np.where(rng.random(n) < 0.05, 1, 0))
+    presenca = {'CN': dia2, 'CH': dia1, 'LC': dia1, 'MT': dia2}
+    for area in ('CN', 'CH', 'LC', 'MT'):
+        dados[f'TP_PRESENCA_{area}'] = presenca[area]
+
+    for i, area in enumerate(('CN', 'CH', 'LC', 'MT')):
+        dados[f'CO_PROVA_{area}'] = _inteiros(1221 + 10 * i + rng.integers(0, 4, n), presenca[area] == 1)
+
+    # Renda (Q006) desloca as notas para dar correlação socioeconômica
+    renda = _letras(rng, n, 17, concentracao=1.2)
+    deslocamento = (np.vectorize(ord)(renda) - ord('A')) * 6.0 + np.where(dados['TP_ESCOLA'] == 3, 45.0, 0.0)
+
+    for area, (media, desvio, minimo, maximo) in PARAMETROS_NOTAS.items():
+        notas = np.round(np.clip(rng.normal(media - 30 + deslocamento, desvio), minimo, maximo), 1)
+        dados[f'NU_NOTA_{area}'] = np.where(presenca[area] == 1, notas, np.nan)
+
+    for area in ('CN', 'CH', 'LC', 'MT'):
+        presentes = presenca[area] == 1
+        dados[f'TX_RESPOSTAS_{area}'] = np.where(presentes, _respostas(rng, n), '')
+
+    dados['TP_LINGUA'] = rng.choice([0, 1], n, p=[0.55, 0.45])
+    for area in ('CN', 'CH', 'LC', 'MT'):
+        dados[f'TX_GABARITO_{area}'] = np.where(presenca[area] == 1, _respostas(rng, n, variantes=4), '')
+
+    # Redação: competências de 0 a 200 em passos de 20; ~3% zeradas
+    presentes_redacao = presenca['LC'] == 1
+    zerada = rng.random(n) < 0.03
+    dados['TP_STATUS_REDACAO'] = _inteiros(np.where(zerada, rng.choice([2, 4, 6], n), 1), presentes_redacao)
+    total = np.zeros(n)
+    for i in range(1, 6):
+        competencia = np.clip(np.round(rng.normal(120 + deslocamento / 5, 35) / 20) * 20, 0, 200)
+        competencia = np.where(zerada, 0, competencia)
+        dados[f'NU_NOTA_COMP{i}'] = np.where(presentes_redacao, competencia, np.nan)
+        total += competencia
+    dados['NU_NOTA_REDACAO'] = np.where(presentes_redacao, total, np.nan)
+
+    for item, alternativas in ALTERNATIVAS_QUESTIONARIO.items():
+        dados[f'Q{item:03d}'] = renda if item == 6 else _letras(rng, n, alternativas)
+
+    return pd.DataFrame(dados)[COLUNAS_2023]
+
+
+def gerar_microdados(caminho, linhas, semente=2023, tamanho_bloco=200_000, ano=2023):
+    """
+    Escreve um CSV sintético com o número de linhas pedido
+    A geração é feita em blocos, com memória limitada
+    Retorna o caminho do arquivo gerado
+    """
+    rng = np.random.default_rng(semente)
+
+    with open(caminho, 'w', encoding='latin-1', newline='') as arquivo:
+        for inicio in range(0, linhas, tamanho_bloco):
+            n = min(tamanho_bloco, linhas - inicio)
+            bloco = gerar_bloco(n, rng, inicio, ano)
+            bloco.to_csv(arquivo, sep=';', index=False, header=(inicio == 0), float_format='%.1f')
+
+    return caminho
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gera microdados sintéticos do ENEM')
+    parser.add_argument('--linhas', type=int, default=100_000, help='número de participantes')
+    parser.add_argument('--saida', default='MICRODADOS_SINTETICOS.csv', help='arquivo CSV de saída')
+    parser.add_argument('--semente', type=int, default=2023, help='semente aleatória')
+    parser.add_argument('--ano', type=int, default=2023, help='ano da edição (NU_ANO e NU_INSCRICAO)')
+    args = parser.parse_args()
+
+    print(f"🧪 Gerando {args.linhas:,} registros sintéticos em {args.saida}...")
+    gerar_microdados(args.saida, args.linhas, args.semente, ano=args.ano)
+    print("✅ Arquivo gerado")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,515 @@
+"""
+Atualização incremental do cubo de agregados
+Re-publicações corrigidas dos microdados e extratos parciais são aplicados
+ao cubo somando a contribuição das linhas novas ou alteradas e subtraindo
+a das versões antigas (e das linhas removidas), em vez de reprocessar o
+arquivo inteiro:
+
+- o arquivo é dividido em partições com um hash dos bytes de cada uma; os
+  cortes dependem só da chave de cada linha (o primeiro campo,
+  NU_INSCRICAO nos microdados), então inserir ou remover linhas muda só as
+  partições em que isso acontece, e as iguais às já aplicadas nem chegam
+  ao pd.read_csv. A mesma passagem calcula o hash do arquivo inteiro, que
+  identifica a versão do cubo
+- nas partições alteradas, cada linha recebe um hash das colunas brutas,
+  comparado com o guardado para a mesma NU_INSCRICAO; só as linhas novas
+  ou alteradas passam pelo processamento
+- o estado (hash, célula do cubo, respostas do questionário e notas de
+  cada inscrição) fica em uma pasta, com um arquivo por partição; uma
+  atualização só lê e regrava os arquivos das partições alteradas
+
+Os arquivos não podem ter quebras de linha dentro dos campos (como nos
+microdados do INEP).
+"""
+
+import hashlib
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+from agregacao import TabelaMomentos
+from cache_colunar import LeitorComHash, impressao_digital
+from cubo import DIMENSOES_CUBO, CuboAgregados, identificar_fonte
+from esquema import COLUNAS_NOTAS, COLUNAS_QUESTIONARIO
+from geografia import CHAVES_GEOGRAFICAS, HierarquiaGeografica
+from preprocessamento import concatenar_blocos
+from quantis import HistogramaQuantis
+from questionario import momentos_questionario
+
+# Tamanho médio das partições (os cortes dependem da chave de cada linha)
+LINHAS_POR_PARTICAO = 100_000
+TAMANHO_LEITURA = 1 << 24
+
+# Bytes do início de cada linha (até o primeiro separador) que decidem os cortes
+TAMANHO_CHAVE = 16
+SEPARADOR = ord(';')
+
+# Alterar quando o formato do estado mudar, para descartar estados antigos
+VERSAO_INCREMENTAL = 5
+
+
+def _cortes(dados, fins, linhas_por_particao):
+    """
+    Indica as linhas que encerram uma partição: aquelas cujo hash do
+    primeiro campo é múltiplo de linhas_por_particao
+    dados: bytes do bloco (array uint8), começando no início de uma linha
+    fins: posições das quebras de linha no bloco
+    """
+    if not len(fins):
+        return np.zeros(0, dtype=bool)
+
+    inicios = np.concatenate(([0], fins[:-1] + 1))
+    posicoes = inicios[:, None] + np.arange(TAMANHO_CHAVE)
+    janela = np.where(posicoes < fins[:, None], dados[np.minimum(posicoes, len(dados) - 1)], 0).astype(np.uint64)
+    janela[np.cumsum(janela == SEPARADOR, axis=1) > 0] = 0
+
+    # FNV-1a seguido de uma mistura final (splitmix64)
+    resumo = np.full(len(fins), 0xcbf29ce484222325, dtype=np.uint64)
+    for coluna in janela.T:
+        resumo ^= coluna
+        resumo *= np.uint64(0x100000001b3)
+    resumo ^= resumo >> np.uint64(31)
+    resumo *= np.uint64(0xbf58476d1ce4e5b9)
+    resumo ^= resumo >> np.uint64(29)
+    return resumo % np.uint64(linhas_por_particao) == 0
+
+
+def particoes_arquivo(arquivo, linhas_por_particao=LINHAS_POR_PARTICAO, tamanho_leitura=TAMANHO_LEITURA):
+    """
+    Divide o arquivo (após o cabeçalho) em partições de linhas inteiras,
+    em uma única passagem pelos bytes
+    Uma partição termina na linha cujo hash do primeiro campo é múltiplo
+    de linhas_por_particao (tamanho médio das partições)
+    Retorna o cabeçalho, a lista de (inicio, fim, hash) de cada partição
+    (posições em bytes; hash de 64 bits do conteúdo) e o hash do conteúdo
+    completo do arquivo (o mesmo de hash_conteudo)
+    """
+    def inteiro(resumo):
+        return int.from_bytes(resumo.digest(), 'little', signed=True)
+
+    particoes = []
+    bruto = LeitorComHash(arquivo)
+    with io.BufferedReader(bruto, tamanho_leitura) as f:
+        cabecalho = f.readline()
+        inicio = posicao = len(cabecalho)
+        resumo = hashlib.blake2b(digest_size=8)
+        resto = b''
+
+        while True:
+            lido = f.read(tamanho_leitura)
+            # A linha incompleta do fim do bloco anterior abre este
+            bloco = resto + lido
+            if not lido:
+                resumo.update(bloco)
+                posicao += len(bloco)
+                break
+
+            dados = np.frombuffer(bloco, dtype=np.uint8)
+            fins = np.flatnonzero(dados == ord('\n'))
+            completas = int(fins[-1]) + 1 if len(fins) else 0
+            anterior = 0
+            for fim in fins[_cortes(dados, fins, linhas_por_particao)] + 1:
+                resumo.update(bloco[anterior:fim])
+                particoes.append((inicio, posicao + int(fim), inteiro(resumo)))
+                inicio = posicao + int(fim)
+                anterior = int(fim)
+                resumo = hashlib.blake2b(digest_size=8)
+
+            resumo.update(bloco[anterior:completas])
+            resto = bloco[completas:]
+            posicao += completas
+
+        if posicao > inicio:
+            particoes.append((inicio, posicao, inteiro(resumo)))
+
+    return cabecalho, particoes, bruto.concluir()
+
+
+def _hash_linhas(dados, colunas):
+    """
+    Hash de 64 bits de cada linha nas colunas (categóricas pelo valor)
+    """
+    return pd.util.hash_pandas_object(dados[colunas], index=False).to_numpy()
+
+
+class EstadoIncremental:
+    """
+    Contribuição de cada inscrição ao cubo e o cubo resultante, gravados
+    em uma pasta: estado.pkl (cubo e resumo das partições) e um arquivo
+    com as linhas de cada partição
+    linhas das partições: NU_INSCRICAO, HASH (colunas brutas), VALIDA (passou
+            pelo filtro de presença), CELULA (hash das dimensões),
+            CELULA_GEOGRAFICA (hash das chaves da hierarquia geográfica),
+            dimensões, município, respostas do questionário e notas
+    particoes: hash da partição de origem -> resumo (arquivo, linhas,
+               menor e maior NU_INSCRICAO, células das linhas válidas e
+               se o conteúdo ainda é o da partição, o que deixa de valer
+               quando um extrato corrige alguma das suas linhas)
+    """
+
+    def __init__(self, pasta):
+        self.pasta = pasta
+        self.particoes = {}
+        self.cubo = None
+        self.versao = VERSAO_INCREMENTAL
+        self._geracao = 0
+        self._pendentes = {}
+
+    @property
+    def total_inscricoes(self):
+        return sum(resumo['linhas'] for resumo in self.particoes.values())
+
+    def salvar(self):
+        """
+        Grava as partições alteradas e o estado (arquivos temporários
+        seguidos de troca atômica); arquivos de partições que saíram do
+        estado só são removidos depois
+        """
+        os.makedirs(self.pasta, exist_ok=True)
+        for resumo in self._pendentes.values():
+            caminho = os.path.join(self.pasta, resumo['arquivo'])
+            pd.to_pickle(resumo.pop('linhas_pendentes'), caminho + '.tmp')
+            os.replace(caminho + '.tmp', caminho)
+        self._pendentes = {}
+
+        caminho = os.path.join(self.pasta, 'estado.pkl')
+        pd.to_pickle(self, caminho + '.tmp')
+        os.replace(caminho + '.tmp', caminho)
+
+        usados = {resumo['arquivo'] for resumo in self.particoes.values()} | {'estado.pkl'}
+        for nome in os.listdir(self.pasta):
+            if nome not in usados:
+                os.remove(os.path.join(self.pasta, nome))
+
+    @staticmethod
+    def carregar(pasta):
+        """
+        Lê o estado gravado; None se não existir ou for de outra versão
+        """
+        caminho = os.path.join(pasta, 'estado.pkl')
+        if not os.path.exists(caminho):
+            return None
+
+        try:
+            estado = pd.read_pickle(caminho)
+        except Exception:
+            return None
+
+        if not isinstance(estado, EstadoIncremental) or estado.versao != VERSAO_INCREMENTAL:
+            return None
+
+        estado.pasta = pasta
+        return estado
+
+    def _linhas_particao(self, particao):
+        """
+        Linhas guardadas de uma partição (as pendentes, se alteradas nesta atualização)
+        """
+        resumo = self.particoes[particao]
+        if 'linhas_pendentes' in resumo:
+            return resumo['linhas_pendentes'].copy()
+        return pd.read_pickle(os.path.join(self.pasta, resumo['arquivo']))
+
+    def _carregar_particoes(self, particoes):
+        """
+        Junta as linhas guardadas das partições, com a coluna PARTICAO
+        Retorna None sem partições
+        """
+        blocos = [self._linhas_particao(particao).assign(PARTICAO=particao) for particao in particoes]
+        return concatenar_blocos(blocos) if blocos else None
+
+    def _gravar_particao(self, particao, linhas, integra):
+        """
+        Substitui as linhas de uma partição (gravadas em salvar()); sem
+        linhas, a partição sai do estado
+        """
+        self._pendentes.pop(particao, None)
+        if linhas is None or not len(linhas):
+            self.particoes.pop(particao, None)
+            return
+
+        linhas = linhas.drop(columns=['PARTICAO'], errors='ignore').reset_index(drop=True)
+        validas = linhas[linhas['VALIDA']]
+        self._geracao += 1
+        resumo = {
+            'arquivo': f'{particao & 0xffffffffffffffff:016x}_{self._geracao}.pkl',
+            'linhas': len(linhas),
+            'chave_min': linhas['NU_INSCRICAO'].min(),
+            'chave_max': linhas['NU_INSCRICAO'].max(),
+            'celulas': {celula: np.unique(validas[celula].to_numpy()) for celula in ('CELULA', 'CELULA_GEOGRAFICA')},
+            'integra': integra,
+            'linhas_pendentes': linhas,
+        }
+        self.particoes[particao] = resumo
+        self._pendentes[particao] = resumo
+
+    def _ler_particoes(self, arquivo, cabecalho, lidas, ler_csv, colunas):
+        """
+        Lê as partições indicadas do arquivo
+        Retorna as linhas brutas com as colunas HASH e PARTICAO (sem
+        inscrições repetidas), ou None sem partições
+        """
+        brutos = []
+        with open(arquivo, 'rb') as f:
+            for inicio, fim, hash_particao in lidas:
+                f.seek(inicio)
+                bloco = ler_csv(colunas, fonte=io.BytesIO(cabecalho + f.read(fim - inicio)))
+                if 'NU_INSCRICAO' not in bloco.columns:
+                    raise ValueError(f"{arquivo} não tem a coluna NU_INSCRICAO")
+
+                bloco['HASH'] = _hash_linhas(bloco, [col for col in bloco.columns if col != 'NU_INSCRICAO'])
+                bloco['PARTICAO'] = hash_particao
+                brutos.append(bloco)
+
+        if not brutos:
+            return None
+        brutas = concatenar_blocos(brutos)
+        return brutas[~brutas['NU_INSCRICAO'].duplicated(keep='last')].reset_index(drop=True)
+
+    @staticmethod
+    def _contribuicoes(brutas, processar):
+        """
+        Processa as linhas brutas e guarda o que cada uma soma ao cubo
+        """
+        processadas = processar(brutas.drop(columns=['HASH', 'PARTICAO']))
+        dimensoes = [col for col in DIMENSOES_CUBO if col in processadas.columns]
+        geograficas = [col for col in CHAVES_GEOGRAFICAS if col in processadas.columns]
+        municipio = [col for col in ('CO_MUNICIPIO_ESC', 'NO_MUNICIPIO_ESC') if col in processadas.columns]
+        itens = [col for col in COLUNAS_QUESTIONARIO if col in processadas.columns]
+        notas = [col for col in COLUNAS_NOTAS if col in processadas.columns]
+
+        contribuicoes = processadas[dimensoes + municipio + itens + notas].reindex(brutas.index)
+        contribuicoes.insert(0, 'CELULA_GEOGRAFICA', _hash_linhas(contribuicoes, geograficas))
+        contribuicoes.insert(0, 'CELULA', _hash_linhas(contribuicoes, dimensoes))
+        contribuicoes.insert(0, 'VALIDA', brutas.index.isin(processadas.index))
+        for col in ('PARTICAO', 'HASH', 'NU_INSCRICAO'):
+            contribuicoes.insert(0, col, brutas[col].to_numpy())
+        return contribuicoes
+
+    def _particoes_das_chaves(self, chaves):
+        """
+        Partições do estado cujo intervalo de NU_INSCRICAO contém alguma das chaves
+        """
+        chaves = np.sort(chaves)
+        return [
+            particao for particao, resumo in self.particoes.items()
+            if np.searchsorted(chaves, resumo['chave_min'], 'left') < np.searchsorted(chaves, resumo['chave_max'], 'right')
+        ]
+
+    def atualizar(self, arquivo, ler_csv, processar, colunas, parcial=False,
+                  linhas_por_particao=LINHAS_POR_PARTICAO):
+        """
+        Aplica uma versão do arquivo (ou um extrato parcial) ao estado
+        ler_csv(colunas, fonte=...): leitura do CSV com o esquema
+        processar(dados): filtro e colunas derivadas (ENEMAnalyzer._processar)
+        colunas: colunas brutas lidas (NU_INSCRICAO é incluída)
+        parcial: o arquivo traz só algumas inscrições (nenhuma é removida)
+        Retorna um dicionário com as contagens da atualização
+        """
+        colunas = list(dict.fromkeys(['NU_INSCRICAO', *colunas]))
+        cabecalho, particoes, hash_arquivo = particoes_arquivo(arquivo, linhas_por_particao)
+
+        # Versão completa: são lidas as partições do arquivo que não estão
+        # íntegras no estado, e saem do estado as que não estão no arquivo
+        integras = {particao for particao, resumo in self.particoes.items() if resumo['integra']}
+        lidas = particoes if parcial else [particao for particao in particoes if particao[2] not in integras]
+        brutas = self._ler_particoes(arquivo, cabecalho, lidas, ler_csv, colunas)
+
+        if parcial:
+            afetadas = [] if brutas is None else self._particoes_das_chaves(brutas['NU_INSCRICAO'].to_numpy())
+        else:
+            no_arquivo = {particao[2] for particao in particoes}
+            afetadas = [particao for particao in self.particoes if particao not in no_arquivo & integras]
+        anteriores = self._carregar_particoes(afetadas)
+
+        # Linhas lidas iguais às guardadas não são processadas de novo
+        inalteradas = np.zeros(0 if brutas is None else len(brutas), dtype=bool)
+        posicoes = np.full(len(inalteradas), -1)
+        if brutas is not None and anteriores is not None:
+            posicoes = pd.Index(anteriores['NU_INSCRICAO']).get_indexer(brutas['NU_INSCRICAO'])
+            inalteradas = (posicoes >= 0) & (anteriores['HASH'].to_numpy()[np.maximum(posicoes, 0)]
+                                             == brutas['HASH'].to_numpy())
+
+        alteradas = None if brutas is None else brutas[~inalteradas]
+        novas = self._contribuicoes(alteradas, processar) if alteradas is not None and len(alteradas) else None
+
+        # Linhas guardadas que saem: substituídas pelas novas versões e, em
+        # uma versão completa do arquivo, as inscrições que não aparecem mais
+        saem = np.zeros(0 if anteriores is None else len(anteriores), dtype=bool)
+        substituidas = saem.copy()
+        if anteriores is not None:
+            substituidas[posicoes[(posicoes >= 0) & ~inalteradas]] = True
+            saem = substituidas.copy()
+            if not parcial:
+                saem[:] = True
+                saem[posicoes[inalteradas]] = False
+        removidas = saem & ~substituidas
+        antigas = None if anteriores is None else anteriores[saem & anteriores['VALIDA'].to_numpy()]
+
+        if parcial:
+            # Partições que perderam linhas deixam de corresponder ao arquivo
+            for particao, _ in self._agrupar(None if anteriores is None else anteriores[saem]):
+                restantes = anteriores[(anteriores['PARTICAO'] == particao).to_numpy() & ~saem]
+                self._gravar_particao(particao, restantes, integra=False)
+            for particao, linhas in self._agrupar(None if novas is None else novas.copy()):
+                if particao in self.particoes:
+                    linhas = concatenar_blocos([self._linhas_particao(particao), linhas.drop(columns='PARTICAO')])
+                self._gravar_particao(particao, linhas, integra=False)
+        else:
+            # As partições lidas guardam as linhas inalteradas (vindas das
+            # partições guardadas que saem) e as novas versões
+            mantidas = None
+            if anteriores is not None:
+                mantidas = anteriores.iloc[posicoes[inalteradas]].assign(PARTICAO=brutas['PARTICAO'].to_numpy()[inalteradas])
+            for particao in afetadas:
+                self._gravar_particao(particao, None, integra=False)
+            blocos = [bloco for bloco in (mantidas, None if novas is None else novas.copy()) if bloco is not None]
+            for particao, linhas in self._agrupar(concatenar_blocos(blocos) if blocos else None):
+                self._gravar_particao(particao, linhas, integra=True)
+
+        self._atualizar_cubo(novas, antigas, arquivo, hash_arquivo, parcial)
+
+        return {
+            'particoes': len(particoes),
+            'particoes_lidas': len(lidas),
+            'particoes_carregadas': len(afetadas),
+            'linhas_lidas': 0 if brutas is None else len(brutas),
+            'novas': int(0 if novas is None else len(novas) - substituidas.sum()),
+            'alteradas': int(substituidas.sum()),
+            'removidas': int(removidas.sum()),
+        }
+
+    @staticmethod
+    def _agrupar(linhas):
+        """
+        Pares (partição, linhas) das linhas com a coluna PARTICAO
+        """
+        if linhas is None or not len(linhas):
+            return []
+        return list(linhas.groupby('PARTICAO', sort=False))
+
+    def _linhas_das_celulas(self, celula, celulas):
+        """
+        Linhas válidas guardadas nas células indicadas, lidas só das
+        partições que têm alguma delas
+        """
+        particoes = [
+            particao for particao, resumo in self.particoes.items()
+            if np.isin(resumo['celulas'][celula], celulas, assume_unique=True).any()
+        ]
+        linhas = self._carregar_particoes(particoes)
+        if linhas is None:
+            return None
+        return linhas[linhas['VALIDA'].to_numpy() & linhas[celula].isin(celulas).to_numpy()]
+
+    def _aplicar_momentos(self, anterior, chaves, celula, notas, validas_novas, antigas):
+        """
+        Soma as contribuições novas a uma tabela de momentos e subtrai as antigas
+        Mínimo e máximo são recalculados nas células em que uma linha que
+        saiu tinha o mínimo ou o máximo, com as linhas guardadas dessas
+        células (celula: coluna com o hash das chaves)
+        """
+        def momentos(linhas):
+            return TabelaMomentos.calcular(linhas, chaves, notas, dropna=False)
+
+        partes = [] if anterior is None else [anterior]
+        if validas_novas is not None and len(validas_novas):
+            partes.append(momentos(validas_novas))
+        tabela = TabelaMomentos.combinar(partes) if partes else momentos(antigas.iloc[:0])
+
+        if antigas is not None and len(antigas):
+            tabela = tabela.subtrair(momentos(antigas))
+            extremos = tabela.minimo.add_suffix('_MIN').join(tabela.maximo.add_suffix('_MAX')).reset_index()
+            comparadas = antigas[[*chaves, celula, *notas]].merge(extremos, on=list(chaves), how='left')
+            valores = comparadas[notas].to_numpy(dtype=np.float64, na_value=np.nan)
+            no_extremo = ((valores <= comparadas[[f'{col}_MIN' for col in notas]].to_numpy(dtype=np.float64))
+                          | (valores >= comparadas[[f'{col}_MAX' for col in notas]].to_numpy(dtype=np.float64)))
+            celulas = np.unique(comparadas.loc[no_extremo.any(axis=1), celula].to_numpy())
+            restantes = self._linhas_das_celulas(celula, celulas) if len(celulas) else None
+            if restantes is not None and len(restantes):
+                recalculo = momentos(restantes)
+                tabela.minimo, tabela.maximo = tabela.minimo.copy(), tabela.maximo.copy()
+                tabela.minimo.loc[recalculo.minimo.index] = recalculo.minimo.to_numpy()
+                tabela.maximo.loc[recalculo.maximo.index] = recalculo.maximo.to_numpy()
+
+        return tabela
+
+    @staticmethod
+    def _aplicar_questionario(anterior, itens, notas, validas_novas, antigas):
+        """
+        Soma aos momentos por resposta do questionário os das linhas novas e
+        subtrai os das antigas (mínimo e máximo não são calculados)
+        """
+        partes = [] if anterior is None else [anterior]
+        if validas_novas is not None and len(validas_novas):
+            partes.append(momentos_questionario(validas_novas, notas, itens))
+        partes = [parte for parte in partes if parte is not None]
+        if not partes:
+            return None
+
+        tabela = TabelaMomentos.combinar(partes)
+        if antigas is not None and len(antigas):
+            removidas = momentos_questionario(antigas, notas, itens)
+            if removidas is not None:
+                tabela = tabela.subtrair(removidas)
+        return tabela
+
+    def _atualizar_cubo(self, novas, antigas, arquivo, hash_arquivo, parcial):
+        """
+        Soma as contribuições novas ao cubo, à hierarquia geográfica e aos
+        momentos do questionário e subtrai as antigas
+        hash_arquivo: hash do conteúdo completo, calculado com as partições
+        """
+        impressao = dict(impressao_digital(arquivo, com_hash=False), hash=hash_arquivo)
+        fonte = identificar_fonte(impressao, None)
+        if parcial and self.cubo is not None:
+            # O cubo passa a valer para a versão anterior mais os extratos
+            fonte = dict(self.cubo.fonte, extratos=self.cubo.fonte.get('extratos', []) + [fonte['hash']])
+
+        linhas = novas if novas is not None else antigas
+        if linhas is None:
+            if self.cubo is None:
+                raise ValueError(f"{arquivo} não tem linhas")
+            # Nenhuma linha mudou: só a identificação do cubo é atualizada
+            self.cubo.fonte = fonte
+            return
+
+        colunas = linhas.columns
+        dimensoes = [col for col in DIMENSOES_CUBO if col in colunas]
+        geograficas = [col for col in CHAVES_GEOGRAFICAS if col in colunas]
+        itens = [col for col in COLUNAS_QUESTIONARIO if col in colunas]
+        notas = [col for col in COLUNAS_NOTAS if col in colunas]
+
+        validas_novas = novas[novas['VALIDA']] if novas is not None else None
+        anterior = self.cubo.fina if self.cubo is not None else None
+        fina = self._aplicar_momentos(anterior, dimensoes, 'CELULA', notas, validas_novas, antigas)
+
+        geografia_anterior = self.cubo.geografia if self.cubo is not None else None
+        geografia = HierarquiaGeografica(
+            self._aplicar_momentos(None if geografia_anterior is None else geografia_anterior.fina,
+                                   geograficas, 'CELULA_GEOGRAFICA', notas, validas_novas, antigas),
+            None if geografia_anterior is None else geografia_anterior.nomes
+        )
+        if validas_novas is not None:
+            geografia.combinar(HierarquiaGeografica(nomes=HierarquiaGeografica.nomes_municipios(validas_novas)))
+
+        questionario = self._aplicar_questionario(
+            None if self.cubo is None else self.cubo.questionario, itens, notas, validas_novas, antigas
+        )
+
+        histogramas = {} if self.cubo is None else dict(self.cubo.histogramas)
+        for col in notas:
+            histograma = histogramas.get(col) or HistogramaQuantis.para_coluna(col)
+            if validas_novas is not None and len(validas_novas):
+                histograma.combinar(HistogramaQuantis.para_coluna(col).adicionar(
+                    validas_novas[col], validas_novas.get('SG_UF_ESC')
+                ))
+            if antigas is not None and len(antigas):
+                histograma.subtrair(HistogramaQuantis.para_coluna(col).adicionar(
+                    antigas[col], antigas.get('SG_UF_ESC')
+                ))
+            histogramas[col] = histograma
+
+        self.cubo = CuboAgregados(fina, histogramas, fonte, geografia, questionario)
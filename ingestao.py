@@ -0,0 +1,318 @@
+"""
+Ingestão retomável dos microdados
+O arquivo é dividido em blocos endereçados por posição em bytes (alinhados
+às quebras de linha); cada bloco é lido direto da sua posição, então os
+blocos podem ser lidos e processados em paralelo. O resultado de cada
+bloco concluído é gravado em uma pasta de checkpoints, e uma execução
+interrompida (erro, falta de memória, processo encerrado) retoma só os
+blocos que faltam.
+
+Linhas malformadas (número de campos diferente do cabeçalho ou valor
+incompatível com o tipo do esquema) vão para a quarentena em vez de
+abortar a leitura. Como no modo incremental, os arquivos não podem ter
+quebras de linha nem separadores dentro dos campos.
+"""
+
+import csv
+import io
+import multiprocessing
+import os
+import shutil
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from cache_colunar import impressao_digital
+from esquema import tipos_colunas
+from paralelo import numero_processos
+
+BYTES_POR_BLOCO = 64 * 2**20
+SEPARADOR = b';'
+
+# Alterar quando o formato dos checkpoints mudar, para descartar os antigos
+VERSAO_INGESTAO = 2
+
+ARQUIVO_MANIFESTO = 'manifesto.pkl'
+
+# Arquivo, leitura e processamento herdados pelos processos filhos via fork
+_tarefa_compartilhada = None
+
+
+def limites_blocos(arquivo, bytes_por_bloco=BYTES_POR_BLOCO):
+    """
+    Divide o arquivo (após o cabeçalho) em blocos de linhas inteiras com
+    cerca de bytes_por_bloco cada, sem ler o conteúdo (só o fim da linha
+    em cada limite)
+    Retorna o cabeçalho e a lista de (inicio, fim) em bytes
+    """
+    with open(arquivo, 'rb') as f:
+        cabecalho = f.readline()
+        tamanho = os.fstat(f.fileno()).st_size
+        limites = [len(cabecalho)]
+        while limites[-1] < tamanho:
+            alvo = limites[-1] + max(bytes_por_bloco, 1)
+            if alvo >= tamanho:
+                limites.append(tamanho)
+                break
+            # Completar a linha que contém o byte anterior ao alvo
+            f.seek(alvo - 1)
+            f.readline()
+            limites.append(min(f.tell(), tamanho))
+
+    return cabecalho, list(zip(limites[:-1], limites[1:]))
+
+
+def _contar_linhas(corpo):
+    if not corpo:
+        return 0
+    return corpo.count(b'\n') + (0 if corpo.endswith(b'\n') else 1)
+
+
+def _valores_invalidos(lidas, numericas):
+    """
+    Linhas com valores que não cabem no tipo do esquema
+    lidas: colunas numéricas lidas sem tipos (dtype=None)
+    numericas: coluna -> tipo do esquema
+    Retorna (máscara das linhas inválidas, linha -> motivo)
+    """
+    invalidas = np.zeros(len(lidas), dtype=bool)
+    motivos = {}
+    for col in lidas.columns:
+        tipo = numericas[col]
+        preenchidos = lidas[col].notna().to_numpy()
+        valores = lidas[col]
+        if not pd.api.types.is_numeric_dtype(valores.dtype):
+            valores = pd.to_numeric(valores, errors='coerce')
+        valores = valores.to_numpy(dtype='float64', na_value=np.nan)
+        ruins = preenchidos & np.isnan(valores)
+        if tipo.lower().startswith('int'):
+            limites = np.iinfo(tipo.lower())
+            with np.errstate(invalid='ignore'):
+                fora = (valores % 1 != 0) | (valores < limites.min) | (valores > limites.max)
+            ruins |= fora & ~np.isnan(valores)
+            if tipo.islower():
+                # Inteiros não nulláveis não aceitam campo vazio
+                ruins |= ~preenchidos
+        for i in np.flatnonzero(ruins & ~invalidas):
+            motivos[i] = f'valor inválido em {col}'
+        invalidas |= ruins
+
+    return invalidas, motivos
+
+
+def _ler_tolerante(cabecalho, corpo, ler_csv, colunas):
+    """
+    Leitura de um bloco com problemas: separa as linhas com número de
+    campos errado e, se a leitura ainda falhar, as com valores fora do esquema
+    Retorna (dados, quarentena)
+    """
+    campos = cabecalho.count(SEPARADOR)
+    linhas = corpo.split(b'\n')
+    quarentena = []
+    boas = []
+    for linha in linhas:
+        if linha.count(SEPARADOR) == campos:
+            boas.append(linha)
+        elif linha.strip(b'\r'):
+            quarentena.append((linha, 'número de campos'))
+
+    # Sem as linhas de campos errados, o bloco costuma ler normalmente
+    try:
+        dados = ler_csv(colunas, fonte=io.BytesIO(cabecalho + b'\n'.join(boas)), quoting=csv.QUOTE_NONE)
+        if len(dados) == len(boas):
+            return dados, quarentena
+    except (ValueError, OverflowError, TypeError):
+        pass
+
+    # Conferir os valores das colunas numéricas pelos tipos do esquema; sem
+    # tipos declarados, só as colunas com algum texto não numérico vêm como
+    # texto. Sem colunas numéricas no arquivo não há o que conferir (e a
+    # lista vazia faria o ler_csv ler todas as colunas das análises)
+    presentes = set(cabecalho.rstrip(b'\r\n').decode('latin-1').split(';'))
+    numericas = {col: tipo for col, tipo in tipos_colunas(colunas).items() if tipo != 'category' and col in presentes}
+    invalidas = np.zeros(len(boas), dtype=bool)
+    motivos = {}
+    if numericas:
+        lidas = ler_csv(list(numericas), fonte=io.BytesIO(cabecalho + b'\n'.join(boas)), dtype=None,
+                        quoting=csv.QUOTE_NONE)
+        invalidas, motivos = _valores_invalidos(lidas, numericas)
+
+    quarentena.extend((boas[i], motivos[i]) for i in np.flatnonzero(invalidas))
+    validas = [linha for linha, invalida in zip(boas, invalidas) if not invalida]
+    dados = ler_csv(colunas, fonte=io.BytesIO(cabecalho + b'\n'.join(validas)), quoting=csv.QUOTE_NONE)
+    return dados, quarentena
+
+
+def ler_intervalo(arquivo, cabecalho, inicio, fim, ler_csv, colunas):
+    """
+    Lê as linhas de um intervalo de bytes do arquivo
+    ler_csv(colunas, fonte=..., **kwargs): leitura do CSV com o esquema
+    Blocos íntegros são lidos de uma vez; os demais, linha a linha
+    Retorna (dados, quarentena: lista de (linha em bytes, motivo))
+    """
+    with open(arquivo, 'rb') as f:
+        f.seek(inicio)
+        corpo = f.read(fim - inicio)
+
+    # Conferência rápida dos bytes: mesmo número de separadores em todas as linhas
+    linhas = _contar_linhas(corpo)
+    if corpo.count(SEPARADOR) == linhas * cabecalho.count(SEPARADOR):
+        try:
+            dados = ler_csv(colunas, fonte=io.BytesIO(cabecalho + corpo))
+            if len(dados) == linhas:
+                return dados, []
+        except (ValueError, OverflowError, TypeError):
+            pass
+
+    return _ler_tolerante(cabecalho, corpo, ler_csv, colunas)
+
+
+def _concluir_bloco(inicio, fim, caminho, tarefa=None):
+    """
+    Lê e processa um bloco e grava o checkpoint (executada em um processo
+    do pool); retorna o número de linhas em quarentena
+    """
+    arquivo, cabecalho, ler_csv, colunas, processar = tarefa or _tarefa_compartilhada
+    dados, quarentena = ler_intervalo(arquivo, cabecalho, inicio, fim, ler_csv, colunas)
+    checkpoint = {
+        'linhas': len(dados) + len(quarentena),
+        'quarentena': quarentena,
+        'resultado': processar(dados),
+    }
+
+    temporario = caminho + '.tmp'
+    pd.to_pickle(checkpoint, temporario)
+    os.replace(temporario, caminho)
+    return len(quarentena)
+
+
+class IngestaoRetomavel:
+    """
+    Blocos de bytes de um arquivo com o resultado de cada bloco concluído
+    gravado na pasta de checkpoints
+    parametros: o que é calculado em cada bloco (colunas, agrupamentos...);
+                checkpoints de outros parâmetros ou de outra versão do
+                arquivo são descartados
+    """
+
+    def __init__(self, arquivo, pasta, parametros, bytes_por_bloco=BYTES_POR_BLOCO):
+        self.arquivo = arquivo
+        self.pasta = pasta
+        self.parametros = parametros
+        self.bytes_por_bloco = bytes_por_bloco
+        self.cabecalho = None
+        self.blocos = []
+        self.quarentena = []
+
+    def _caminho(self, indice):
+        return os.path.join(self.pasta, f'bloco_{indice:06d}.pkl')
+
+    def concluidos(self):
+        return [indice for indice in range(len(self.blocos)) if os.path.exists(self._caminho(indice))]
+
+    def preparar(self):
+        """
+        Divide o arquivo em blocos e confere os checkpoints existentes
+        Retorna o número de blocos já concluídos
+        """
+        # Tamanho e mtime identificam a versão do arquivo sem relê-lo: uma
+        # nova publicação (mesmo com o mesmo tamanho) descarta os checkpoints
+        impressao = impressao_digital(self.arquivo, com_hash=False)
+        manifesto = {
+            'tamanho': impressao['tamanho'],
+            'mtime': impressao['mtime'],
+            'bytes_por_bloco': self.bytes_por_bloco,
+            'parametros': self.parametros,
+            'versao': VERSAO_INGESTAO,
+        }
+
+        caminho = os.path.join(self.pasta, ARQUIVO_MANIFESTO)
+        anterior = None
+        if os.path.exists(caminho):
+            try:
+                anterior = pd.read_pickle(caminho)
+            except Exception:
+                anterior = None
+
+        if anterior != manifesto:
+            shutil.rmtree(self.pasta, ignore_errors=True)
+            os.makedirs(self.pasta)
+            pd.to_pickle(manifesto, caminho)
+
+        self.cabecalho, self.blocos = limites_blocos(self.arquivo, self.bytes_por_bloco)
+        return len(self.concluidos())
+
+    def executar(self, processar, ler_csv, colunas, n_processos=1):
+        """
+        Lê e processa os blocos que ainda não têm checkpoint
+        processar(dados): resultado do bloco, gravado no checkpoint
+        Em caso de erro, os blocos já concluídos ficam gravados
+        Retorna o número de blocos processados nesta execução
+        """
+        global _tarefa_compartilhada
+
+        concluidos = set(self.concluidos())
+        pendentes = [indice for indice in range(len(self.blocos)) if indice not in concluidos]
+        tarefa = (self.arquivo, self.cabecalho, ler_csv, list(colunas), processar)
+        argumentos = [(*self.blocos[indice], self._caminho(indice)) for indice in pendentes]
+
+        n_processos = min(numero_processos(n_processos), max(len(pendentes), 1))
+        if n_processos == 1:
+            for inicio, fim, caminho in argumentos:
+                _concluir_bloco(inicio, fim, caminho, tarefa)
+        elif 'fork' in multiprocessing.get_all_start_methods():
+            _tarefa_compartilhada = tarefa
+            try:
+                contexto = multiprocessing.get_context('fork')
+                with ProcessPoolExecutor(n_processos, mp_context=contexto) as executor:
+                    futuros = [executor.submit(_concluir_bloco, *argumento) for argumento in argumentos]
+                    for futuro in futuros:
+                        futuro.result()
+            finally:
+                _tarefa_compartilhada = None
+        else:
+            with ProcessPoolExecutor(n_processos) as executor:
+                futuros = [executor.submit(_concluir_bloco, *argumento, tarefa) for argumento in argumentos]
+                for futuro in futuros:
+                    futuro.result()
+
+        return len(pendentes)
+
+    def resultados(self):
+        """
+        Percorre os checkpoints na ordem do arquivo, guardando as linhas
+        em quarentena em self.quarentena
+        Gera (linhas lidas, resultado) de cada bloco
+        """
+        self.quarentena = []
+        for indice in range(len(self.blocos)):
+            checkpoint = pd.read_pickle(self._caminho(indice))
+            self.quarentena.extend(checkpoint['quarentena'])
+            yield checkpoint['linhas'], checkpoint['resultado']
+
+    def gravar_quarentena(self, caminho):
+        """
+        Grava as linhas em quarentena no formato original (com o cabeçalho),
+        prontas para serem corrigidas e reaplicadas; sem linhas, remove o
+        arquivo de uma execução anterior
+        Retorna a contagem de linhas por motivo
+        """
+        if not self.quarentena:
+            if os.path.exists(caminho):
+                os.remove(caminho)
+            return Counter()
+
+        with open(caminho, 'wb') as f:
+            f.write(self.cabecalho)
+            for linha, _ in self.quarentena:
+                f.write(linha.rstrip(b'\r') + b'\n')
+
+        return Counter(motivo for _, motivo in self.quarentena)
+
+    def limpar(self):
+        """
+        Remove a pasta de checkpoints
+        """
+        shutil.rmtree(self.pasta, ignore_errors=True)
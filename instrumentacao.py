@@ -0,0 +1,215 @@
+"""
+Instrumentação das etapas da análise
+Mede tempo de parede, tempo de CPU, pico de memória residente, bytes
+lidos e linhas de entrada/saída de cada etapa, e exporta o relatório em
+JSON-lines ou no formato textfile do Prometheus
+"""
+
+import contextlib
+import json
+import os
+import resource
+import sys
+import time
+from datetime import datetime
+
+
+def memoria_kb(campo):
+    """
+    Lê um campo de /proc/self/status em KB (Linux); None se indisponível
+    """
+    try:
+        with open('/proc/self/status') as status:
+            for linha in status:
+                if linha.startswith(campo + ':'):
+                    return int(linha.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def reiniciar_pico():
+    """
+    Zera o pico de memória residente do processo (Linux >= 4.0)
+    Retorna False se não for possível; nesse caso o pico é o do processo todo
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as arquivo:
+            arquivo.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def pico_kb():
+    """
+    Pico de memória residente do processo em KB
+    """
+    pico = memoria_kb('VmHWM')
+    if pico is None:
+        # ru_maxrss está em KB no Linux e em bytes no macOS
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == 'darwin':
+            pico //= 1024
+    return pico
+
+
+def bytes_lidos():
+    """
+    Total de bytes lidos pelo processo (rchar de /proc/self/io); None se indisponível
+    """
+    try:
+        with open('/proc/self/io') as io:
+            for linha in io:
+                if linha.startswith('rchar:'):
+                    return int(linha.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+@contextlib.contextmanager
+def medir(nome):
+    """
+    Mede o bloco de código e preenche o dicionário entregue ao bloco
+    O bloco pode informar 'linhas_entrada', 'linhas_saida' e 'sucesso'
+    """
+    medicao = {'etapa': nome, 'linhas_entrada': None, 'linhas_saida': None, 'sucesso': True}
+
+    pico_por_etapa = reiniciar_pico()
+    pico_inicial = pico_kb()
+    rss_inicial = memoria_kb('VmRSS')
+    lidos_inicial = bytes_lidos()
+    inicio = time.perf_counter()
+    inicio_cpu = time.process_time()
+
+    try:
+        yield medicao
+    except BaseException:
+        medicao['sucesso'] = False
+        raise
+    finally:
+        medicao['tempo_s'] = round(time.perf_counter() - inicio, 4)
+        medicao['cpu_s'] = round(time.process_time() - inicio_cpu, 4)
+
+        pico = pico_kb()
+        # Com o pico zerado, a variação é relativa à memória no início da
+        # etapa; sem isso, só o aumento do pico do processo é visível
+        base = rss_inicial if pico_por_etapa and rss_inicial is not None else pico_inicial
+        medicao['pico_rss_mb'] = round(pico / 1024, 1)
+        medicao['delta_pico_rss_mb'] = round(max(pico - base, 0) / 1024, 1)
+
+        lidos = bytes_lidos()
+        medicao['bytes_lidos'] = None if lidos is None or lidos_inicial is None else lidos - lidos_inicial
+
+
+class RelatorioExecucao:
+    """
+    Medições das etapas de uma execução
+    Avalia como verdadeiro quando todas as etapas tiveram sucesso, para
+    manter o uso de executar_analise_completa como condição
+    """
+
+    def __init__(self, rotulos=None):
+        self.inicio = datetime.now().isoformat(timespec='seconds')
+        self.rotulos = dict(rotulos or {})
+        self.etapas = []
+
+    @contextlib.contextmanager
+    def etapa(self, nome):
+        """
+        Mede uma etapa e a acrescenta ao relatório (mesmo se falhar)
+        """
+        with contextlib.ExitStack() as pilha:
+            medicao = pilha.enter_context(medir(nome))
+            pilha.callback(self.etapas.append, medicao)
+            yield medicao
+
+    @property
+    def sucesso(self):
+        return all(medicao['sucesso'] for medicao in self.etapas)
+
+    def __bool__(self):
+        return self.sucesso
+
+    def tempo_total(self):
+        return round(sum(medicao['tempo_s'] for medicao in self.etapas), 4)
+
+    def para_dict(self):
+        return {
+            'inicio': self.inicio,
+            'rotulos': self.rotulos,
+            'sucesso': self.sucesso,
+            'tempo_total_s': self.tempo_total(),
+            'etapas': list(self.etapas),
+        }
+
+    def resumo(self):
+        """
+        Tabela de texto com as medições de cada etapa
+        """
+        linhas = [f"{'etapa':<40} {'tempo':>9} {'CPU':>9} {'Δ pico':>10} {'lido':>10}"]
+        for medicao in self.etapas:
+            lidos = medicao['bytes_lidos']
+            linhas.append(
+                f"{medicao['etapa']:<40} {medicao['tempo_s']:>8.3f}s {medicao['cpu_s']:>8.3f}s "
+                f"{medicao['delta_pico_rss_mb']:>7.1f} MB "
+                f"{'-' if lidos is None else f'{lidos / 2**20:.1f} MB':>10}"
+            )
+        return '\n'.join(linhas)
+
+    def salvar_jsonl(self, caminho):
+        """
+        Acrescenta uma linha JSON por etapa ao arquivo (execuções se acumulam)
+        """
+        with open(caminho, 'a', encoding='utf-8') as arquivo:
+            for medicao in self.etapas:
+                registro = {'inicio': self.inicio, **self.rotulos, **medicao}
+                arquivo.write(json.dumps(registro, ensure_ascii=False) + '\n')
+
+    def salvar_prometheus(self, caminho, prefixo='enem'):
+        """
+        Grava as medições no formato textfile do Prometheus (node_exporter)
+        O arquivo é substituído atomicamente para não ser lido pela metade
+        """
+        metricas = [
+            ('tempo_segundos', 'Tempo de parede da etapa', 'tempo_s', 1),
+            ('cpu_segundos', 'Tempo de CPU da etapa', 'cpu_s', 1),
+            ('pico_rss_bytes', 'Pico de memória residente durante a etapa', 'pico_rss_mb', 2**20),
+            ('delta_pico_rss_bytes', 'Aumento de memória residente na etapa', 'delta_pico_rss_mb', 2**20),
+            ('bytes_lidos', 'Bytes lidos pelo processo na etapa', 'bytes_lidos', 1),
+            ('linhas_entrada', 'Linhas recebidas pela etapa', 'linhas_entrada', 1),
+            ('linhas_saida', 'Linhas produzidas pela etapa', 'linhas_saida', 1),
+            ('sucesso', 'Etapa concluída com sucesso (1) ou não (0)', 'sucesso', 1),
+        ]
+        rotulos = ''.join(f',{chave}="{valor}"' for chave, valor in self.rotulos.items())
+
+        linhas = []
+        for nome, ajuda, campo, escala in metricas:
+            linhas.append(f'# HELP {prefixo}_etapa_{nome} {ajuda}')
+            linhas.append(f'# TYPE {prefixo}_etapa_{nome} gauge')
+            for medicao in self.etapas:
+                if medicao[campo] is not None:
+                    valor = float(medicao[campo]) * escala
+                    linhas.append(f'{prefixo}_etapa_{nome}{{etapa="{medicao["etapa"]}"{rotulos}}} {valor!r}')
+
+        linhas.append(f'# HELP {prefixo}_execucao_sucesso Execução concluída com sucesso (1) ou não (0)')
+        linhas.append(f'# TYPE {prefixo}_execucao_sucesso gauge')
+        seletor = f'{{{rotulos.lstrip(",")}}}' if rotulos else ''
+        linhas.append(f'{prefixo}_execucao_sucesso{seletor} {int(self.sucesso)}')
+
+        temporario = caminho + '.tmp'
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            arquivo.write('\n'.join(linhas) + '\n')
+        os.replace(temporario, caminho)
+
+    def salvar(self, caminho, formato='jsonl'):
+        """
+        Exporta o relatório ('jsonl' ou 'prometheus')
+        """
+        if formato == 'prometheus':
+            self.salvar_prometheus(caminho)
+        elif formato == 'jsonl':
+            self.salvar_jsonl(caminho)
+        else:
+            raise ValueError(f"Formato de métricas desconhecido: {formato}")
@@ -1,13 +1,36 @@
 import pandas as pd
 import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import plotly.offline as pyo
-from datetime import datetime
+import argparse
+import functools
+import io
 import os
+import sys
 import warnings
 
+from amostragem import ESTRATEGIAS_AMOSTRAGEM, criar_amostrador
+from cache_colunar import (
+    TAMANHO_LEITURA_HASH, LeitorComHash, cache_valido, converter_para_cache, hash_cache, impressao_digital,
+    ler_cache, ler_cache_em_blocos, pyarrow_disponivel
+)
+from agregacao import PlanoAgregacao, TabelaMomentos
+from consulta import IndiceConsulta
+from cubo import DIMENSOES_CUBO, CuboAgregados, identificar_fonte
+from estatisticas import bootstrap_medias, comparar, intervalos
+from esquema import (
+    AGRUPAMENTOS_POR_ANALISE, ANALISES, COLUNAS_NOTAS, COLUNAS_OBJETIVAS, COLUNAS_PRESENCA,
+    HISTOGRAMAS_POR_ANALISE, colunas_necessarias, tipos_colunas
+)
+from geografia import HierarquiaGeografica, completar_uf
+from incremental import EstadoIncremental
+from ingestao import IngestaoRetomavel
+from instrumentacao import RelatorioExecucao
+from paralelo import AgregadorParalelo, momentos_fatia, momentos_paralelos, numero_processos
+from planejador import bytes_por_linha_csv, planejar
+from preprocessamento import categorizar, concatenar_blocos, filtrar_linhas, mascara_igual
+from quantis import HistogramaQuantis, MaioresPorGrupo
+from questionario import amplitude_itens, momentos_questionario, tabela_questionario
+from saida_graficos import FORMATOS_GRAFICOS, salvar_figuras
+
 warnings.filterwarnings('ignore')
 
 
@@ -17,13 +40,39 @@ class ENEMAnalyzer:
     Versão standalone sem dependência do Streamlit
     """
 
-    def _init_(self, arquivo_dados="MICRODADOS_ENEM_2023.csv"):
+    def __init__(self, arquivo_dados="MICRODADOS_ENEM_2023.csv", analises=None, pasta_cache=None,
+                 n_processos=1, verbose=True, memoria_max=None):
         self.arquivo_dados = arquivo_dados
+        self.n_processos = n_processos
+        self.verbose = verbose
+        self.memoria_max = memoria_max
+        self.plano = None
+        self.pasta_cache = pasta_cache or os.path.splitext(arquivo_dados)[0] + '_cache'
+        self.arquivo_cubo = os.path.splitext(arquivo_dados)[0] + '_cubo.pkl'
+        self.pasta_incremental = os.path.splitext(arquivo_dados)[0] + '_incremental'
+        self.pasta_checkpoints = os.path.splitext(arquivo_dados)[0] + '_checkpoints'
+        self.arquivo_quarentena = os.path.splitext(arquivo_dados)[0] + '_quarentena.csv'
+        self.cubo = None
+        self.analises = list(ANALISES) if analises is None else list(analises)
         self.dados = None
         self.dados_processados = False
+        self.colunas = set()
+        self.total_registros = 0
+        self.linhas_lidas = 0
+        self.agregados = {}
+        self.histogramas = {}
+        self.maiores = None
+        self.k_maiores = 3
+        self.geografia = None
+        self.min_participantes_municipio = 30
+        self.questionario = None
+        self.min_participantes_resposta = 30
+        self.indice = None
+        # False pula a criação das figuras (e a importação do plotly)
+        self.gerar_graficos = True
 
         # Mapeamentos para melhorar a legibilidade
-        self.map_sexo = {1: 'Masculino', 2: 'Feminino'}
+        self.map_sexo = {1: 'Masculino', 2: 'Feminino', 'M': 'Masculino', 'F': 'Feminino'}
         self.map_cor_raca = {
             1: 'Não declarado', 2: 'Branca', 3: 'Preta',
             4: 'Parda', 5: 'Amarela', 6: 'Indígena'
@@ -33,6 +82,20 @@ class ENEMAnalyzer:
             1: 'Federal', 2: 'Estadual', 3: 'Municipal', 4: 'Privada'
         }
 
+        # Faixas do TP_FAIXA_ETARIA (arquivos sem NU_IDADE) nas mesmas faixas
+        # usadas para a idade: 1 = menor de 17, 2 = 17, 3 a 10 = 18 a 25 anos,
+        # 11 em diante = 26 ou mais
+        self.map_faixa_etaria = {1: 'Menor que 18', 2: 'Menor que 18', 3: '18-19', 4: '18-19',
+                                 5: '20-21', 6: '20-21', 7: '22-25', 8: '22-25', 9: '22-25', 10: '22-25'}
+        self.map_faixa_etaria.update({codigo: 'Mais de 25' for codigo in range(11, 21)})
+
+        # Faixas de renda familiar (Q006): letras A (nenhuma renda) a Q, ou
+        # o número da faixa (1 a 17), agrupadas de duas em duas até a faixa 8
+        niveis_renda = ['Muito Baixo', 'Baixo', 'Médio', 'Alto']
+        self.map_renda = {faixa: niveis_renda[(faixa - 1) // 2] if faixa <= 8 else 'Muito Alto'
+                          for faixa in range(1, 18)}
+        self.map_renda.update({chr(ord('A') + faixa - 1): nivel for faixa, nivel in self.map_renda.items()})
+
         # Mapeamento de regiões
         self.regioes = {
             'AC': 'Norte', 'AP': 'Norte', 'AM': 'Norte', 'PA': 'Norte',
@@ -44,180 +107,908 @@ class ENEMAnalyzer:
             'PR': 'Sul', 'RS': 'Sul', 'SC': 'Sul'
         }
 
-    def carregar_dados(self, amostra=None):
+    def _exibir(self, *args, **kwargs):
+        """
+        Mensagens de progresso (silenciadas com verbose=False)
+        """
+        if self.verbose:
+            print(*args, **kwargs)
+
+    def _ler_csv(self, colunas=None, fonte=None, **kwargs):
+        """
+        Abre o arquivo de microdados com o esquema das análises habilitadas
+        colunas: colunas a ler (None = as das análises habilitadas)
+        fonte: caminho ou buffer a ler (None = o arquivo do analisador)
+        kwargs: repassados ao pd.read_csv (nrows, chunksize...); dtype
+                substitui os tipos do esquema
+        """
+        colunas = colunas or colunas_necessarias(self.analises)
+
+        # Carregar dados com encoding adequado
+        return pd.read_csv(
+            self.arquivo_dados if fonte is None else fonte,
+            sep=';',
+            encoding='latin-1',
+            usecols=lambda col: col in colunas,
+            dtype=kwargs.pop('dtype', tipos_colunas(colunas)),
+            low_memory=False,
+            **kwargs
+        )
+
+    def _cache_disponivel(self, colunas=None):
+        """
+        Indica se o cache colunar existe, corresponde ao arquivo atual e
+        contém as colunas (None = as das análises habilitadas)
+        """
+        return cache_valido(self.arquivo_dados, self.pasta_cache, colunas or colunas_necessarias(self.analises))
+
+    def _ler_blocos(self, amostra, tamanho_bloco, colunas=None, impressao=None):
+        """
+        Itera sobre os dados em blocos, a partir do cache colunar quando
+        disponível ou do CSV caso contrário
+        Com amostra, lê sempre o CSV: o cache é particionado por UF e suas
+        primeiras linhas não são as primeiras do arquivo
+        colunas: colunas a ler (None = as das análises habilitadas)
+        impressao: dicionário que recebe em 'hash' o hash do conteúdo
+                   completo do arquivo, calculado na própria leitura (ou o
+                   do cache, conferido ao validá-lo)
+        """
+        colunas = colunas or colunas_necessarias(self.analises)
+
+        if amostra is None and self._cache_disponivel(colunas):
+            if impressao is not None:
+                impressao['hash'] = hash_cache(self.pasta_cache)
+            yield from ler_cache_em_blocos(self.pasta_cache, colunas, amostra, tamanho_bloco)
+            return
+
+        bruto = LeitorComHash(self.arquivo_dados) if impressao is not None else None
+        fonte = io.BufferedReader(bruto, TAMANHO_LEITURA_HASH) if bruto is not None else None
+        with self._ler_csv(nrows=amostra, chunksize=tamanho_bloco, colunas=colunas, fonte=fonte) as leitor:
+            yield from leitor
+
+        if bruto is not None:
+            impressao['hash'] = bruto.concluir()
+
+    def criar_cache(self, tamanho_bloco=500_000):
+        """
+        Converte o CSV em cache colunar (Parquet particionado por UF)
+        Só é necessário uma vez por versão do arquivo de microdados
+        """
+        if not pyarrow_disponivel():
+            self._exibir("❌ Cache colunar requer o pacote pyarrow (pip install pyarrow)")
+            return False
+
+        if not os.path.exists(self.arquivo_dados):
+            self._exibir(f"❌ Arquivo não encontrado: {self.arquivo_dados}")
+            return False
+
+        if cache_valido(self.arquivo_dados, self.pasta_cache):
+            self._exibir(f"✅ Cache colunar já atualizado em '{self.pasta_cache}'")
+            return True
+
+        self._exibir(f"🗜️ Convertendo {self.arquivo_dados} para cache colunar em '{self.pasta_cache}'...")
+
+        try:
+            total = converter_para_cache(self.arquivo_dados, self.pasta_cache, tamanho_bloco)
+        except Exception as e:
+            self._exibir(f"❌ Erro ao criar cache: {e}")
+            return False
+
+        self._exibir(f"✅ Cache criado: {total:,} registros")
+        return True
+
+    def carregar_dados(self, amostra=None, amostragem='inicio', semente=None, tamanho_bloco=500_000):
         """
         Carrega os dados do ENEM
         amostra: número de linhas para carregar (None = todos os dados)
+        amostragem: como escolher as linhas da amostra
+                    'inicio' = primeiras linhas do arquivo (mais rápido);
+                    'aleatoria' = amostra uniforme do arquivo todo;
+                    'estratificada' = proporcional por UF da escola (SG_UF_ESC)
+        semente: semente da amostragem aleatória (reprodutibilidade)
+
+        Apenas as colunas usadas pelas análises habilitadas são lidas,
+        já com os tipos compactos declarados em esquema.py. Se existir um
+        cache colunar atualizado (criar_cache), a leitura é feita dele.
+        As amostragens aleatória e estratificada leem o arquivo uma única
+        vez em blocos, mantendo em memória só a amostra e o bloco atual.
         """
-        print(f"📂 Carregando dados de {self.arquivo_dados}...")
+        self._exibir(f"📂 Carregando dados de {self.arquivo_dados}...")
 
         if not os.path.exists(self.arquivo_dados):
-            print(f"❌ Arquivo não encontrado: {self.arquivo_dados}")
-            print("💡 Certifique-se de que o arquivo está na pasta correta")
+            self._exibir(f"❌ Arquivo não encontrado: {self.arquivo_dados}")
+            self._exibir("💡 Certifique-se de que o arquivo está na pasta correta")
             return False
 
         try:
-            # Carregar dados com encoding adequado
-            self.dados = pd.read_csv(
-                self.arquivo_dados,
-                sep=';',
-                encoding='latin-1',
-                nrows=amostra,
-                low_memory=False
-            )
-
-            print(f"✅ Dados carregados: {len(self.dados):,} registros")
-            print(f"📊 Colunas disponíveis: {len(self.dados.columns)}")
+            if amostra is not None and amostragem != 'inicio':
+                colunas = colunas_necessarias(self.analises)
+                if amostragem == 'estratificada' and 'SG_UF_ESC' not in colunas:
+                    colunas = colunas + ['SG_UF_ESC']
+
+                self._exibir(f"🎲 Amostragem {amostragem} de {amostra:,} registros...")
+                amostrador = criar_amostrador(amostragem, amostra, semente)
+                for bloco in self._ler_blocos(None, tamanho_bloco, colunas):
+                    amostrador.adicionar(bloco)
+                self.dados = amostrador.resultado()
+                if self.dados is None:
+                    self.dados = self._ler_csv(colunas=colunas, nrows=0)
+                self._exibir(f"📄 {amostrador.vistos:,} registros lidos do arquivo")
+            elif amostra is None and self._cache_disponivel():
+                self._exibir(f"⚡ Usando cache colunar '{self.pasta_cache}'")
+                self.dados = ler_cache(self.pasta_cache, colunas_necessarias(self.analises))
+            else:
+                # Leitura em blocos: o pico fica perto do tamanho final dos
+                # dados mais um bloco, em vez de várias vezes o arquivo
+                with self._ler_csv(nrows=amostra, chunksize=tamanho_bloco) as leitor:
+                    self.dados = concatenar_blocos(list(leitor))
+
+            self.linhas_lidas = len(self.dados)
+            self._exibir(f"✅ Dados carregados: {len(self.dados):,} registros")
+            self._exibir(f"📊 Colunas disponíveis: {len(self.dados.columns)}")
 
             return True
 
         except Exception as e:
-            print(f"❌ Erro ao carregar dados: {e}")
+            self._exibir(f"❌ Erro ao carregar dados: {e}")
             return False
 
-    def processar_dados(self):
+    def _processar(self, dados):
         """
-        Processa e limpa os dados para análise
-        """
-        if self.dados is None:
-            print("❌ Dados não carregados. Execute carregar_dados() primeiro.")
-            return False
+        Aplica o filtro de presença, os mapeamentos e as colunas derivadas
+        a um DataFrame (dados completos ou um bloco) e retorna o resultado
 
-        print("🔄 Processando dados...")
+        O filtro é aplicado primeiro, com uma única máscara, para que as
+        colunas derivadas sejam calculadas apenas nas linhas mantidas.
+        Os rótulos são categóricos gerados direto dos códigos.
+        """
+        # Filtrar apenas participantes presentes
+        dados = filtrar_linhas(dados, mascara_igual(dados, COLUNAS_PRESENCA, 1))
 
         # Aplicar mapeamentos
-        if 'TP_SEXO' in self.dados.columns:
-            self.dados['SEXO'] = self.dados['TP_SEXO'].map(self.map_sexo)
+        if 'TP_SEXO' in dados.columns:
+            dados['SEXO'] = categorizar(dados['TP_SEXO'], self.map_sexo)
 
-        if 'TP_COR_RACA' in self.dados.columns:
-            self.dados['COR_RACA'] = self.dados['TP_COR_RACA'].map(self.map_cor_raca)
+        if 'TP_COR_RACA' in dados.columns:
+            dados['COR_RACA'] = categorizar(dados['TP_COR_RACA'], self.map_cor_raca)
 
-        if 'TP_ESCOLA' in self.dados.columns:
-            self.dados['TIPO_ESCOLA'] = self.dados['TP_ESCOLA'].map(self.map_tp_escola)
+        if 'TP_ESCOLA' in dados.columns:
+            dados['TIPO_ESCOLA'] = categorizar(dados['TP_ESCOLA'], self.map_tp_escola)
 
-        if 'TP_DEPENDENCIA_ADM_ESC' in self.dados.columns:
-            self.dados['DEPENDENCIA_ESCOLA'] = self.dados['TP_DEPENDENCIA_ADM_ESC'].map(self.map_dependencia)
+        if 'TP_DEPENDENCIA_ADM_ESC' in dados.columns:
+            dados['DEPENDENCIA_ESCOLA'] = categorizar(dados['TP_DEPENDENCIA_ADM_ESC'], self.map_dependencia)
+
+        # Completar a UF ausente pelo código do IBGE da UF ou do município
+        siglas_uf = completar_uf(dados)
+        if siglas_uf is not None:
+            dados['SG_UF_ESC'] = siglas_uf
 
         # Adicionar região
-        if 'SG_UF_ESC' in self.dados.columns:
-            self.dados['REGIAO'] = self.dados['SG_UF_ESC'].map(self.regioes)
-        elif 'CO_UF_ESC' in self.dados.columns:
-            # Mapear código da UF para sigla (se necessário)
-            pass
+        if 'SG_UF_ESC' in dados.columns:
+            dados['REGIAO'] = categorizar(dados['SG_UF_ESC'], self.regioes)
 
         # Criar faixas etárias
-        if 'NU_IDADE' in self.dados.columns:
-            self.dados['FAIXA_ETARIA'] = pd.cut(
-                self.dados['NU_IDADE'],
+        if 'NU_IDADE' in dados.columns:
+            dados['FAIXA_ETARIA'] = pd.cut(
+                dados['NU_IDADE'],
                 bins=[0, 17, 19, 21, 25, 100],
                 labels=['Menor que 18', '18-19', '20-21', '22-25', 'Mais de 25']
             )
+        elif 'TP_FAIXA_ETARIA' in dados.columns:
+            dados['FAIXA_ETARIA'] = categorizar(dados['TP_FAIXA_ETARIA'], self.map_faixa_etaria).as_ordered()
 
         # Converter notas para numérico
-        colunas_notas = ['NU_NOTA_CN', 'NU_NOTA_CH', 'NU_NOTA_LC', 'NU_NOTA_MT', 'NU_NOTA_REDACAO']
-        for col in colunas_notas:
-            if col in self.dados.columns:
-                self.dados[col] = pd.to_numeric(self.dados[col], errors='coerce')
+        for col in COLUNAS_NOTAS:
+            if col in dados.columns and not pd.api.types.is_numeric_dtype(dados[col]):
+                dados[col] = pd.to_numeric(dados[col], errors='coerce')
 
         # Calcular média das objetivas
-        objetivas = ['NU_NOTA_CN', 'NU_NOTA_CH', 'NU_NOTA_LC', 'NU_NOTA_MT']
-        objetivas_existentes = [col for col in objetivas if col in self.dados.columns]
+        objetivas_existentes = [col for col in COLUNAS_OBJETIVAS if col in dados.columns]
 
         if len(objetivas_existentes) > 0:
-            self.dados['MEDIA_OBJETIVAS'] = self.dados[objetivas_existentes].mean(axis=1)
+            dados['MEDIA_OBJETIVAS'] = dados[objetivas_existentes].mean(axis=1)
 
         # Criar classificação socioeconômica simplificada baseada na renda (Q006)
-        if 'Q006' in self.dados.columns:
-            self.dados['Q006_NUM'] = pd.to_numeric(self.dados['Q006'], errors='coerce')
-            self.dados['NIVEL_SOCIOECONOMICO'] = pd.cut(
-                self.dados['Q006_NUM'],
-                bins=[0, 2, 4, 6, 8, 17],
-                labels=['Muito Baixo', 'Baixo', 'Médio', 'Alto', 'Muito Alto']
+        if 'Q006' in dados.columns:
+            dados['NIVEL_SOCIOECONOMICO'] = categorizar(dados['Q006'], self.map_renda).as_ordered()
+
+        return dados
+
+    def processar_dados(self):
+        """
+        Processa e limpa os dados para análise
+        """
+        if self.dados is None:
+            self._exibir("❌ Dados não carregados. Execute carregar_dados() primeiro.")
+            return False
+
+        self._exibir("🔄 Processando dados...")
+
+        self.dados = self._processar(self.dados)
+        self.cubo = None
+        self.indice = None
+        self.colunas = set(self.dados.columns)
+        self.total_registros = len(self.dados)
+        self.agregados = {}
+        self.histogramas = {}
+        self.maiores = None
+        self.geografia = None
+        self.questionario = None
+
+        self.dados_processados = True
+        self._exibir(f"✅ Dados processados: {len(self.dados):,} registros válidos")
+
+        return True
+
+    def _resumir_blocos(self, amostra, tamanho_bloco, colunas, agrupamentos, colunas_histograma, maiores,
+                        geografia=None, questionario=False, impressao=None):
+        """
+        Lê e processa os dados em blocos, resumindo cada bloco em momentos
+        (plano de agregação), histogramas por UF, maiores notas e, quando
+        pedidos, a hierarquia geográfica (HierarquiaGeografica vazia) e os
+        momentos por resposta do questionário
+        impressao: recebe o hash do conteúdo lido (ver _ler_blocos)
+        Retorna o agregador com os momentos combinados e o total de linhas lidas
+        """
+        colunas_notas = [col for col in COLUNAS_NOTAS if col in colunas]
+        self.colunas = set()
+        self.total_registros = 0
+        self.histogramas = {}
+        self.maiores = maiores
+        self.geografia = geografia
+        self.questionario = None
+        partes_questionario = []
+        lidos = 0
+
+        with AgregadorParalelo(agrupamentos, colunas_notas, self.n_processos) as agregador:
+            for bloco in self._ler_blocos(amostra, tamanho_bloco, colunas, impressao):
+                lidos += len(bloco)
+                bloco = self._processar(bloco)
+                self.colunas.update(bloco.columns)
+                self.total_registros += len(bloco)
+                agregador.enviar(bloco)
+
+                for col in colunas_histograma:
+                    if col in bloco.columns:
+                        self.histogramas.setdefault(col, HistogramaQuantis.para_coluna(col))
+                        self.histogramas[col].adicionar(bloco[col], bloco.get('SG_UF_ESC'))
+
+                if self.maiores is not None and {'NU_NOTA_REDACAO', 'SG_UF_ESC'} <= set(bloco.columns):
+                    self.maiores.adicionar(bloco)
+
+                if self.geografia is not None:
+                    self.geografia.adicionar(bloco, colunas_notas)
+
+                if questionario:
+                    partes_questionario.append(momentos_questionario(bloco, colunas_notas))
+
+            self.agregados = agregador.resultado()
+
+        partes_questionario = [parte for parte in partes_questionario if parte is not None]
+        if partes_questionario:
+            self.questionario = TabelaMomentos.combinar(partes_questionario)
+
+        return agregador, lidos
+
+    def processar_em_blocos(self, amostra=None, tamanho_bloco=500_000):
+        """
+        Processa o arquivo em blocos sem manter os dados em memória
+        amostra: número de linhas para ler (None = todos os dados)
+        tamanho_bloco: linhas lidas por bloco
+
+        Cada bloco é processado e resumido em momentos parciais por grupo,
+        histogramas das notas e maiores notas de redação por UF, que são
+        combinados ao final. Apenas os agregados ficam em memória.
+        """
+        self._exibir(f"📂 Processando {self.arquivo_dados} em blocos de {tamanho_bloco:,} linhas...")
+
+        if not os.path.exists(self.arquivo_dados):
+            self._exibir(f"❌ Arquivo não encontrado: {self.arquivo_dados}")
+            self._exibir("💡 Certifique-se de que o arquivo está na pasta correta")
+            return False
+
+        colunas_histograma = self._colunas_histograma()
+        maiores = None
+        if 'analise_3_maiores_notas_redacao' in self.analises:
+            maiores = MaioresPorGrupo('NU_NOTA_REDACAO', 'SG_UF_ESC', self.k_maiores)
+
+        try:
+            _, lidos = self._resumir_blocos(
+                amostra, tamanho_bloco, colunas_necessarias(self.analises),
+                self._agrupamentos(), colunas_histograma, maiores, self._nova_geografia(),
+                self._com_questionario()
             )
+        except Exception as e:
+            self._exibir(f"❌ Erro ao processar dados: {e}")
+            return False
 
-        # Filtrar apenas participantes presentes
-        colunas_presenca = ['TP_PRESENCA_CN', 'TP_PRESENCA_CH', 'TP_PRESENCA_LC', 'TP_PRESENCA_MT']
-        for col in colunas_presenca:
-            if col in self.dados.columns:
-                self.dados = self.dados[self.dados[col] == 1]
+        self.dados = None
+        self.cubo = None
+        self.linhas_lidas = lidos
+
+        self.dados_processados = True
+        self._exibir(f"✅ Dados processados: {lidos:,} registros lidos, {self.total_registros:,} válidos")
+
+        return True
+
+    def _colunas_histograma(self):
+        """
+        Colunas de nota cujos histogramas as análises habilitadas consultam
+        """
+        return list(dict.fromkeys(
+            col
+            for analise in self.analises
+            for col in HISTOGRAMAS_POR_ANALISE.get(analise, [])
+        ))
+
+    def _resumir_bloco(self, agrupamentos, colunas_histograma, com_maiores, com_geografia, com_questionario,
+                       bloco):
+        """
+        Processa um bloco e o resume nos mesmos agregados do processamento
+        em blocos (gravados no checkpoint da ingestão retomável)
+        """
+        bloco = self._processar(bloco)
+        colunas_notas = [col for col in COLUNAS_NOTAS if col in bloco.columns]
+        resumo = {
+            'colunas': set(bloco.columns),
+            'validos': len(bloco),
+            'fina': momentos_fatia(bloco, agrupamentos, colunas_notas),
+            'histogramas': {
+                col: HistogramaQuantis.para_coluna(col).adicionar(bloco[col], bloco.get('SG_UF_ESC'))
+                for col in colunas_histograma if col in bloco.columns
+            },
+            'maiores': None,
+            'geografia': None,
+            'questionario': None,
+        }
+        if com_maiores and {'NU_NOTA_REDACAO', 'SG_UF_ESC'} <= set(bloco.columns):
+            resumo['maiores'] = MaioresPorGrupo('NU_NOTA_REDACAO', 'SG_UF_ESC', self.k_maiores).adicionar(bloco)
+        if com_geografia:
+            resumo['geografia'] = HierarquiaGeografica().adicionar(bloco, colunas_notas)
+        if com_questionario:
+            resumo['questionario'] = momentos_questionario(bloco, colunas_notas)
+        return resumo
+
+    def processar_retomavel(self, tamanho_bloco=500_000, manter_checkpoints=False):
+        """
+        Processa o arquivo completo em blocos endereçados por posição em
+        bytes, gravando os agregados de cada bloco concluído em
+        pasta_checkpoints (ver ingestao.py)
+        Uma execução interrompida retoma dos blocos que faltam; linhas
+        malformadas vão para arquivo_quarentena em vez de abortar
+        Os blocos são lidos e processados em paralelo com n_processos
+        tamanho_bloco: linhas por bloco (convertidas em bytes pelo tamanho
+                       médio das linhas do arquivo)
+        manter_checkpoints: não apagar os checkpoints ao concluir
+        """
+        if not os.path.exists(self.arquivo_dados):
+            self._exibir(f"❌ Arquivo não encontrado: {self.arquivo_dados}")
+            self._exibir("💡 Certifique-se de que o arquivo está na pasta correta")
+            return False
 
+        colunas = colunas_necessarias(self.analises)
+        agrupamentos = self._agrupamentos()
+        colunas_histograma = self._colunas_histograma()
+        com_maiores = 'analise_3_maiores_notas_redacao' in self.analises
+        com_geografia = self._nova_geografia() is not None
+        com_questionario = self._com_questionario()
+        bytes_por_bloco = max(int(tamanho_bloco * bytes_por_linha_csv(self.arquivo_dados)), 1)
+
+        ingestao = IngestaoRetomavel(self.arquivo_dados, self.pasta_checkpoints, {
+            'colunas': colunas,
+            'agrupamentos': agrupamentos,
+            'histogramas': colunas_histograma,
+            'maiores': self.k_maiores if com_maiores else None,
+            'geografia': com_geografia,
+            'questionario': com_questionario,
+        }, bytes_por_bloco)
+
+        self._exibir(f"📂 Processando {self.arquivo_dados} em blocos retomáveis de "
+                     f"{bytes_por_bloco / 2**20:,.1f} MB...")
+        try:
+            concluidos = ingestao.preparar()
+            if concluidos:
+                self._exibir(f"♻️ Retomando de '{self.pasta_checkpoints}': {concluidos} de "
+                             f"{len(ingestao.blocos)} blocos já concluídos")
+            ingestao.executar(
+                functools.partial(self._resumir_bloco, agrupamentos, colunas_histograma, com_maiores,
+                                  com_geografia, com_questionario),
+                self._ler_csv, colunas, self.n_processos
+            )
+        except Exception as e:
+            self._exibir(f"❌ Erro ao processar dados: {e}")
+            if ingestao.blocos:
+                self._exibir(f"💡 {len(ingestao.concluidos())} de {len(ingestao.blocos)} blocos concluídos "
+                             f"ficam em '{self.pasta_checkpoints}'; execute novamente para retomar")
+            return False
+
+        # Combinar os agregados dos blocos
+        finas = []
+        partes_questionario = []
+        lidos = 0
+        self.colunas = set()
+        self.total_registros = 0
+        self.histogramas = {}
+        self.maiores = MaioresPorGrupo('NU_NOTA_REDACAO', 'SG_UF_ESC', self.k_maiores) if com_maiores else None
+        self.geografia = HierarquiaGeografica() if com_geografia else None
+        for linhas, resumo in ingestao.resultados():
+            lidos += linhas
+            self.colunas.update(resumo['colunas'])
+            self.total_registros += resumo['validos']
+            finas.append(resumo['fina'])
+            for col, histograma in resumo['histogramas'].items():
+                self.histogramas.setdefault(col, HistogramaQuantis.para_coluna(col)).combinar(histograma)
+            if resumo['maiores'] is not None:
+                self.maiores.combinar(resumo['maiores'])
+            if resumo['geografia'] is not None:
+                self.geografia.combinar(resumo['geografia'])
+            if resumo['questionario'] is not None:
+                partes_questionario.append(resumo['questionario'])
+
+        self.agregados = PlanoAgregacao(agrupamentos).resolver(TabelaMomentos.combinar(finas))
+        self.questionario = TabelaMomentos.combinar(partes_questionario) if partes_questionario else None
+        motivos = ingestao.gravar_quarentena(self.arquivo_quarentena)
+        if not manter_checkpoints:
+            ingestao.limpar()
+
+        self.dados = None
+        self.cubo = None
+        self.indice = None
+        self.linhas_lidas = lidos
         self.dados_processados = True
-        print(f"✅ Dados processados: {len(self.dados):,} registros válidos")
+        self._exibir(f"✅ Dados processados: {lidos:,} registros lidos, {self.total_registros:,} válidos")
+        if motivos:
+            self._exibir(f"⚠️ {sum(motivos.values()):,} linhas em quarentena em '{self.arquivo_quarentena}':")
+            for motivo, quantidade in motivos.most_common():
+                self._exibir(f"   {motivo}: {quantidade:,}")
 
         return True
 
+    def carregar_cubo(self, amostra=None, tamanho_bloco=500_000):
+        """
+        Carrega o cubo de agregados do disco ou o constrói com uma passagem
+        em blocos pelos microdados (apenas quando a fonte mudou)
+        As análises passam a ser respondidas pelo cubo, sem ler os dados
+        """
+        if not os.path.exists(self.arquivo_dados):
+            self._exibir(f"❌ Arquivo não encontrado: {self.arquivo_dados}")
+            self._exibir("💡 Certifique-se de que o arquivo está na pasta correta")
+            return False
+
+        cubo = CuboAgregados.carregar(self.arquivo_cubo, self.arquivo_dados, amostra)
+        self.linhas_lidas = 0
+
+        if cubo is not None:
+            self._exibir(f"⚡ Usando cubo de agregados '{self.arquivo_cubo}'")
+        else:
+            self._exibir(f"🧊 Construindo cubo de agregados a partir de {self.arquivo_dados}...")
+            # O hash do conteúdo que identifica o cubo sai da própria leitura
+            impressao = impressao_digital(self.arquivo_dados, com_hash=False)
+            try:
+                agregador, lidos = self._resumir_blocos(
+                    amostra, tamanho_bloco, colunas_necessarias(ANALISES),
+                    [DIMENSOES_CUBO], COLUNAS_NOTAS, None, HierarquiaGeografica(), questionario=True,
+                    impressao=impressao
+                )
+            except Exception as e:
+                self._exibir(f"❌ Erro ao construir cubo: {e}")
+                return False
+
+            fonte = identificar_fonte(impressao, amostra)
+            cubo = CuboAgregados(agregador.fina, self.histogramas, fonte, self.geografia, self.questionario)
+            cubo.salvar(self.arquivo_cubo)
+            self.linhas_lidas = lidos
+            self._exibir(f"✅ Cubo salvo: {lidos:,} registros lidos, {len(cubo.fina):,} células")
+
+        self._usar_cubo(cubo)
+        self._exibir(f"✅ Cubo carregado: {self.total_registros:,} registros válidos")
+
+        return True
+
+    def _usar_cubo(self, cubo):
+        """
+        Passa a responder as análises pelo cubo (sem dados em memória)
+        """
+        self.cubo = cubo
+        self.dados = None
+        self.indice = None
+        self.agregados = {}
+        self.histogramas = dict(cubo.histogramas)
+        self.geografia = cubo.geografia
+        self.questionario = cubo.questionario
+        self.colunas = set(cubo.dimensoes) | set(cubo.fina.n.columns)
+        self.total_registros = cubo.total_registros
+        self.dados_processados = True
+
+    def atualizar_incremental(self, arquivo=None, parcial=False):
+        """
+        Atualiza o cubo com uma nova versão do arquivo (ou um extrato parcial)
+        reprocessando só as inscrições novas ou alteradas (ver incremental.py)
+        As análises passam a ser respondidas pelo cubo atualizado
+        arquivo: versão corrigida ou extrato (None = o arquivo do analisador)
+        parcial: o arquivo traz só algumas inscrições (nenhuma é removida)
+        """
+        arquivo = arquivo or self.arquivo_dados
+        if not os.path.exists(arquivo):
+            self._exibir(f"❌ Arquivo não encontrado: {arquivo}")
+            return False
+
+        estado = EstadoIncremental.carregar(self.pasta_incremental)
+        if estado is None:
+            self._exibir(f"🧊 Criando estado incremental a partir de {arquivo}...")
+            estado = EstadoIncremental(self.pasta_incremental)
+        else:
+            self._exibir(f"🔁 Aplicando {arquivo} ao estado incremental ({estado.total_inscricoes:,} inscrições)...")
+
+        try:
+            resumo = estado.atualizar(arquivo, self._ler_csv, self._processar, colunas_necessarias(ANALISES), parcial)
+        except Exception as e:
+            self._exibir(f"❌ Erro na atualização incremental: {e}")
+            return False
+
+        estado.salvar()
+        self.linhas_lidas = resumo['linhas_lidas']
+        self._exibir(f"   📦 {resumo['particoes_lidas']} de {resumo['particoes']} partições lidas "
+                     f"({resumo['linhas_lidas']:,} linhas)")
+        self._exibir(f"   ➕ {resumo['novas']:,} novas | ✏️ {resumo['alteradas']:,} alteradas | "
+                     f"➖ {resumo['removidas']:,} removidas")
+
+        self._usar_cubo(estado.cubo)
+        self._exibir(f"✅ Cubo atualizado: {self.total_registros:,} registros válidos")
+
+        return True
+
+    def cruzar(self, chaves):
+        """
+        Tabulação cruzada das médias das notas por qualquer combinação de
+        dimensões derivadas (usa o cubo quando carregado)
+        """
+        momentos = self._momentos(chaves)
+        tabela = momentos.media().round(1)
+        tabela['PARTICIPANTES'] = momentos.participantes
+        return tabela
+
+    def _agrupamentos(self):
+        """
+        Agrupamentos consultados pelas análises habilitadas
+        """
+        return list(dict.fromkeys(
+            chaves
+            for analise in self.analises
+            for chaves in AGRUPAMENTOS_POR_ANALISE[analise]
+        ))
+
+    def _momentos(self, chaves):
+        """
+        Retorna os momentos das notas agrupados pelas chaves, usando os
+        agregados já calculados quando disponíveis
+        Com o cubo carregado, a consulta é respondida por consolidação dele.
+        Caso contrário, na primeira consulta os agrupamentos de todas as
+        análises habilitadas são calculados juntos em uma única passagem
+        """
+        chaves = tuple(chaves)
+        if chaves not in self.agregados and self.cubo is not None and self.cubo.cobre(chaves):
+            self.agregados[chaves] = self.cubo.cruzar(chaves)
+
+        if chaves not in self.agregados and self.dados is None:
+            # Em blocos ou no cubo, só os agrupamentos resumidos respondem
+            disponiveis = [' x '.join(agrupamento) or '(total)' for agrupamento in self.agregados]
+            if self.cubo is not None:
+                disponiveis.append(f"combinações de {', '.join(self.cubo.dimensoes)}")
+            raise ValueError(f"Agrupamento {' x '.join(chaves) or '(total)'} indisponível sem os dados em memória; "
+                             f"disponíveis: {'; '.join(disponiveis) or 'nenhum'}")
+
+        if chaves not in self.agregados:
+            colunas_existentes = [col for col in COLUNAS_NOTAS if col in self.colunas]
+            agrupamentos = [chaves] + [outras for outras in self._agrupamentos() if outras not in self.agregados]
+
+            self.agregados.update(
+                momentos_paralelos(self.dados, agrupamentos, colunas_existentes, self.n_processos)
+            )
+
+        return self.agregados[chaves]
+
+    def _histograma(self, coluna):
+        """
+        Histograma (por UF, quando disponível) de uma coluna de nota
+        Retorna None se a coluna não foi resumida no processamento em blocos
+        """
+        if coluna not in self.histogramas:
+            if self.dados is None:
+                return None
+            self.histogramas[coluna] = HistogramaQuantis.para_coluna(coluna).adicionar(
+                self.dados[coluna], self.dados.get('SG_UF_ESC')
+            )
+
+        return self.histogramas[coluna]
+
+    def _nova_geografia(self):
+        """
+        Hierarquia geográfica vazia a preencher no processamento em blocos
+        (None quando a análise por estado não está habilitada)
+        """
+        if 'analise_1_desempenho_por_estado' not in self.analises:
+            return None
+        return HierarquiaGeografica()
+
+    def hierarquia_geografica(self):
+        """
+        Hierarquia geográfica das notas (município -> UF -> região -> nacional)
+        Com os dados em memória, a tabela fina é calculada na primeira
+        consulta; nos modos em blocos e cubo ela vem do processamento
+        Retorna None se não estiver disponível
+        """
+        if self.geografia is None and self.dados is not None:
+            colunas_existentes = [col for col in COLUNAS_NOTAS if col in self.colunas]
+            self.geografia = HierarquiaGeografica.calcular(self.dados, colunas_existentes, self.n_processos)
+
+        return self.geografia
+
+    def desempenho_geografico(self, nivel='municipio', uf=None):
+        """
+        Médias das notas e participantes por município, UF, região ou no
+        total nacional, todos consolidados da mesma tabela fina
+        nivel: 'municipio', 'uf', 'regiao' ou 'nacional'
+        uf: sigla (ou lista de siglas) para restringir municípios e UFs
+        Ex.: desempenho_geografico('municipio', uf='PE')
+        """
+        geografia = self.hierarquia_geografica()
+        if geografia is None:
+            raise ValueError("Hierarquia geográfica indisponível: processe os dados com a análise 1 habilitada")
+        return geografia.tabela(nivel, uf)
+
+    def _com_questionario(self):
+        """
+        Indica se o processamento em blocos resume o questionário por
+        resposta (só com a análise socioeconômica habilitada)
+        """
+        return 'analise_2_desempenho_socioeconomico' in self.analises
+
+    def matriz_questionario(self):
+        """
+        Momentos das notas por resposta de cada item do questionário
+        (chaves ITEM e RESPOSTA; ver questionario.py)
+        Com os dados em memória, todos os itens são calculados juntos na
+        primeira consulta; nos modos em blocos e cubo eles vêm do processamento
+        Retorna None se não estiver disponível
+        """
+        if self.questionario is None and self.dados is not None:
+            colunas_existentes = [col for col in COLUNAS_NOTAS if col in self.colunas]
+            self.questionario = momentos_questionario(self.dados, colunas_existentes, n_processos=self.n_processos)
+
+        return self.questionario
+
+    def desempenho_questionario(self, itens=None):
+        """
+        Médias das notas, média geral e participantes por resposta de cada
+        item do questionário socioeconômico (Q001 a Q025)
+        itens: item ou lista de itens (None = todos)
+        Ex.: desempenho_questionario(['Q001', 'Q002'])
+        """
+        questionario = self.matriz_questionario()
+        if questionario is None:
+            raise ValueError("Questionário indisponível: processe os dados com a análise 2 habilitada")
+        return tabela_questionario(questionario, itens)
+
+    def percentis_notas(self, percentis=(0.25, 0.5, 0.75, 0.9, 0.95, 0.99), uf=None):
+        """
+        Percentis exatos de cada coluna de nota disponível
+        uf: sigla para restringir a um estado (None = todos)
+        """
+        resultado = {}
+        for col in COLUNAS_NOTAS:
+            if col in self.colunas:
+                histograma = self._histograma(col)
+                if histograma is not None:
+                    resultado[col] = [histograma.quantil(q, uf) for q in percentis]
+
+        return pd.DataFrame(resultado, index=pd.Index(percentis, name='PERCENTIL'))
+
+    def maiores_notas(self, k=None):
+        """
+        As k maiores notas de redação de cada UF
+        """
+        k = k or self.k_maiores
+        if self.dados is not None and (self.maiores is None or self.maiores.k < k):
+            self.maiores = MaioresPorGrupo('NU_NOTA_REDACAO', 'SG_UF_ESC', k).adicionar(self.dados)
+
+        if self.maiores is None:
+            return None
+
+        return self.maiores.resultado().groupby('SG_UF_ESC', observed=True, sort=False).head(k)
+
+    def _indice_consulta(self):
+        """
+        Índices das dimensões dos dados processados (criados na primeira consulta)
+        """
+        if self.dados is None or not self.dados_processados:
+            self._exibir("❌ Consultas requerem os dados processados em memória (carregar_dados e processar_dados)")
+            return None
+
+        if self.indice is None:
+            self.indice = IndiceConsulta(self.dados)
+        return self.indice
+
+    def consultar(self, por=None, colunas=None, **filtros):
+        """
+        Momentos das notas nas linhas que atendem aos filtros, sem varrer os dados
+        por: dimensão para agrupar o resultado (None = total)
+        filtros: dimensão=valor ou dimensão=[valores] (SEXO, COR_RACA,
+                 TIPO_ESCOLA, REGIAO, SG_UF_ESC, FAIXA_ETARIA, NIVEL_SOCIOECONOMICO...)
+        Ex.: consultar(COR_RACA='Parda', TIPO_ESCOLA='Pública', REGIAO='Nordeste',
+                       FAIXA_ETARIA='18-19').media()['NU_NOTA_MT']
+        """
+        indice = self._indice_consulta()
+        if indice is None:
+            return None
+        return indice.agregar(filtros, por, colunas)
+
+    def consultar_maiores(self, coluna='NU_NOTA_REDACAO', k=10, **filtros):
+        """
+        Registros com as k maiores notas da coluna entre os que atendem aos filtros
+        Ex.: consultar_maiores(SG_UF_ESC='PE')
+        """
+        indice = self._indice_consulta()
+        if indice is None:
+            return None
+        return indice.maiores(filtros, coluna, k)
+
+    def intervalos_confianca(self, chaves=(), confianca=0.95):
+        """
+        Média, erro padrão e intervalo de confiança das notas por grupo,
+        calculados dos momentos (funciona em todos os modos)
+        Ex.: intervalos_confianca(('REGIAO',))['NU_NOTA_MT']
+        """
+        return intervalos(self._momentos(chaves), confianca)
+
+    def comparar_grupos(self, dimensao, referencia, chaves=None, confianca=0.95):
+        """
+        Diferença de médias (IC de Welch) e d de Cohen de cada grupo da
+        dimensão em relação ao grupo de referência
+        chaves: agrupamento completo (None = só a dimensão); as demais chaves
+                separam as comparações, ex.: ('REGIAO', 'SEXO') compara os
+                sexos dentro de cada região
+        """
+        return comparar(self._momentos(chaves or (dimensao,)), dimensao, referencia, confianca)
+
+    def intervalos_bootstrap(self, chaves=(), n_reamostras=1000, confianca=0.95, semente=None,
+                             memoria_lote=64 * 2**20):
+        """
+        Intervalos de confiança bootstrap (percentis) das médias das notas
+        por grupo; requer os dados processados em memória
+        """
+        if self.dados is None or not self.dados_processados:
+            self._exibir("❌ O bootstrap requer os dados processados em memória (carregar_dados e processar_dados)")
+            return None
+
+        colunas_existentes = [col for col in COLUNAS_NOTAS if col in self.colunas]
+        return bootstrap_medias(self.dados, chaves, colunas_existentes, n_reamostras, confianca, semente,
+                                self.n_processos, memoria_lote)
+
     def estatisticas_gerais(self):
         """
         Exibe estatísticas gerais dos dados
         """
         if not self.dados_processados:
-            print("❌ Execute processar_dados() primeiro")
+            self._exibir("❌ Execute processar_dados() primeiro")
             return
 
-        print("\n" + "=" * 50)
-        print("📈 ESTATÍSTICAS GERAIS - ENEM 2023")
-        print("=" * 50)
+        self._exibir("\n" + "=" * 50)
+        self._exibir("📈 ESTATÍSTICAS GERAIS - ENEM 2023")
+        self._exibir("=" * 50)
 
-        print(f"👥 Total de participantes: {len(self.dados):,}")
+        self._exibir(f"👥 Total de participantes: {self.total_registros:,}")
 
         # Estatísticas das notas
-        colunas_notas = ['NU_NOTA_CN', 'NU_NOTA_CH', 'NU_NOTA_LC', 'NU_NOTA_MT', 'NU_NOTA_REDACAO']
         areas_nomes = ['Ciências da Natureza', 'Ciências Humanas', 'Linguagens', 'Matemática', 'Redação']
 
-        print(f"\n📊 MÉDIAS DAS NOTAS:")
-        for i, col in enumerate(colunas_notas):
-            if col in self.dados.columns:
-                media = self.dados[col].mean()
-                desvio = self.dados[col].std()
-                print(f"   {areas_nomes[i]}: {media:.1f} (±{desvio:.1f})")
+        geral = self._momentos(())
+        medias = geral.media().iloc[0]
+        desvios = geral.desvio().iloc[0]
+
+        self._exibir(f"\n📊 MÉDIAS DAS NOTAS:")
+        for i, col in enumerate(COLUNAS_NOTAS):
+            if col in medias.index:
+                self._exibir(f"   {areas_nomes[i]}: {medias[col]:.1f} (±{desvios[col]:.1f})")
 
         # Distribuição por sexo
-        if 'SEXO' in self.dados.columns:
-            print(f"\n👫 DISTRIBUIÇÃO POR SEXO:")
-            dist_sexo = self.dados['SEXO'].value_counts()
+        if 'SEXO' in self.colunas:
+            self._exibir(f"\n👫 DISTRIBUIÇÃO POR SEXO:")
+            dist_sexo = self._momentos(('SEXO',)).participantes.sort_values(ascending=False)
             for sexo, count in dist_sexo.items():
-                pct = (count / len(self.dados)) * 100
-                print(f"   {sexo}: {count:,} ({pct:.1f}%)")
+                pct = (count / self.total_registros) * 100
+                self._exibir(f"   {sexo}: {count:,} ({pct:.1f}%)")
 
         # Distribuição por região
-        if 'REGIAO' in self.dados.columns:
-            print(f"\n🌍 DISTRIBUIÇÃO POR REGIÃO:")
-            dist_regiao = self.dados['REGIAO'].value_counts()
+        if 'REGIAO' in self.colunas:
+            self._exibir(f"\n🌍 DISTRIBUIÇÃO POR REGIÃO:")
+            dist_regiao = self._momentos(('REGIAO',)).participantes.sort_values(ascending=False)
             for regiao, count in dist_regiao.items():
-                pct = (count / len(self.dados)) * 100
-                print(f"   {regiao}: {count:,} ({pct:.1f}%)")
+                pct = (count / self.total_registros) * 100
+                self._exibir(f"   {regiao}: {count:,} ({pct:.1f}%)")
+
+    def resumo_geral(self):
+        """
+        Estatísticas gerais como dicionário: total de participantes, médias e
+        desvios das notas e participantes por sexo e por região
+        """
+        geral = self._momentos(())
+        resumo = {
+            'total_registros': int(self.total_registros),
+            'medias': geral.media().iloc[0].round(1).to_dict(),
+            'desvios': geral.desvio().iloc[0].round(1).to_dict(),
+        }
+
+        for chave, nome in (('SEXO', 'por_sexo'), ('REGIAO', 'por_regiao')):
+            if chave in self.colunas:
+                participantes = self._momentos((chave,)).participantes
+                resumo[nome] = {str(grupo): int(total) for grupo, total in participantes.items()}
+
+        return resumo
 
     def analise_1_desempenho_por_estado(self):
         """
         1. Desempenho médio dos alunos por Estado e região
         """
-        print("\n" + "=" * 50)
-        print("📍 ANÁLISE 1: Desempenho por Estado e Região")
-        print("=" * 50)
+        self._exibir("\n" + "=" * 50)
+        self._exibir("📍 ANÁLISE 1: Desempenho por Estado e Região")
+        self._exibir("=" * 50)
 
-        if 'SG_UF_ESC' not in self.dados.columns:
-            print("❌ Coluna de UF não encontrada")
+        if 'SG_UF_ESC' not in self.colunas:
+            self._exibir("❌ Coluna de UF não encontrada")
             return None
 
         # Calcular médias por UF e região
-        colunas_notas = ['NU_NOTA_CN', 'NU_NOTA_CH', 'NU_NOTA_LC', 'NU_NOTA_MT', 'NU_NOTA_REDACAO']
-        colunas_existentes = [col for col in colunas_notas if col in self.dados.columns]
+        colunas_existentes = [col for col in COLUNAS_NOTAS if col in self.colunas]
 
         if not colunas_existentes:
-            print("❌ Nenhuma coluna de notas encontrada")
+            self._exibir("❌ Nenhuma coluna de notas encontrada")
             return None
 
-        df_estado = self.dados.groupby(['SG_UF_ESC', 'REGIAO'])[colunas_existentes].mean().round(1)
-        df_estado['PARTICIPANTES'] = self.dados.groupby(['SG_UF_ESC', 'REGIAO']).size()
+        # UF, região e municípios saem da mesma tabela fina da hierarquia
+        geografia = self.hierarquia_geografica()
+        if geografia is not None:
+            momentos = geografia.nivel('uf')
+        else:
+            momentos = self._momentos(('SG_UF_ESC', 'REGIAO'))
+        df_estado = momentos.media()[colunas_existentes].round(1)
+        df_estado['PARTICIPANTES'] = momentos.participantes
 
-        print("🏆 TOP 10 ESTADOS - MÉDIA GERAL:")
+        self._exibir("🏆 TOP 10 ESTADOS - MÉDIA GERAL:")
         df_estado['MEDIA_GERAL'] = df_estado[colunas_existentes].mean(axis=1)
         top_estados = df_estado.nlargest(10, 'MEDIA_GERAL')[['MEDIA_GERAL', 'PARTICIPANTES']]
 
         for uf, row in top_estados.iterrows():
-            print(f"   {uf[0]}: {row['MEDIA_GERAL']:.1f} ({row['PARTICIPANTES']:,} participantes)")
+            self._exibir(f"   {uf[0]}: {row['MEDIA_GERAL']:.1f} ({int(row['PARTICIPANTES']):,} participantes)")
+
+        if geografia is not None:
+            df_regiao = geografia.tabela('regiao')
+            df_regiao['MEDIA_GERAL'] = df_regiao[colunas_existentes].mean(axis=1)
+            self._exibir("\n🗺️ MÉDIA GERAL POR REGIÃO:")
+            for regiao, row in df_regiao.sort_values('MEDIA_GERAL', ascending=False).iterrows():
+                self._exibir(f"   {regiao}: {row['MEDIA_GERAL']:.1f} ({int(row['PARTICIPANTES']):,} participantes)")
+
+        if geografia is not None and 'municipio' in geografia.niveis:
+            df_municipio = geografia.tabela('municipio')
+            df_municipio['MEDIA_GERAL'] = df_municipio[colunas_existentes].mean(axis=1)
+            # Municípios com poucos participantes ficam fora do ranking
+            elegiveis = df_municipio[df_municipio['PARTICIPANTES'] >= self.min_participantes_municipio]
+            self._exibir(f"\n🏙️ TOP 10 MUNICÍPIOS - MÉDIA GERAL ({len(df_municipio):,} municípios, "
+                         f"mínimo de {self.min_participantes_municipio} participantes):")
+            for chave, row in elegiveis.nlargest(10, 'MEDIA_GERAL').iterrows():
+                nome = row.get('NO_MUNICIPIO_ESC')
+                nome = chave[2] if pd.isna(nome) else nome
+                self._exibir(f"   {nome} ({chave[0]}): {row['MEDIA_GERAL']:.1f} "
+                             f"({int(row['PARTICIPANTES']):,} participantes)")
 
         # Criar gráfico
+        if not self.gerar_graficos:
+            return None
+        # O plotly (cerca de 1 s de importação) só é importado pelas análises
+        # no momento de criar um gráfico; execuções sem gráficos não pagam
+        # esse custo
+        import plotly.express as px
+
         df_plot = df_estado.reset_index()
         fig = px.bar(
             df_plot,
@@ -236,52 +1027,71 @@ class ENEMAnalyzer:
         """
         2. Desempenho médio dos alunos por faixa socioeconômica - CORRIGIDO
         """
-        print("\n" + "=" * 50)
-        print("💰 ANÁLISE 2: Desempenho por Nível Socioeconômico")
-        print("=" * 50)
+        self._exibir("\n" + "=" * 50)
+        self._exibir("💰 ANÁLISE 2: Desempenho por Nível Socioeconômico")
+        self._exibir("=" * 50)
 
         # Determinar qual coluna usar para análise socioeconômica
-        if 'NIVEL_SOCIOECONOMICO' in self.dados.columns and self.dados['NIVEL_SOCIOECONOMICO'].notna().sum() > 0:
+        if 'NIVEL_SOCIOECONOMICO' in self.colunas and len(self._momentos(('NIVEL_SOCIOECONOMICO',))) > 0:
             coluna_analise = 'NIVEL_SOCIOECONOMICO'
             titulo = 'Desempenho por Nível Socioeconômico'
-            print("📊 Usando classificação por renda familiar (Q006)")
-        elif 'DEPENDENCIA_ESCOLA' in self.dados.columns:
+            self._exibir("📊 Usando classificação por renda familiar (Q006)")
+        elif 'DEPENDENCIA_ESCOLA' in self.colunas:
             coluna_analise = 'DEPENDENCIA_ESCOLA'
             titulo = 'Desempenho por Tipo de Escola'
-            print("📊 Usando tipo de escola como proxy socioeconômico")
+            self._exibir("📊 Usando tipo de escola como proxy socioeconômico")
         else:
-            print("❌ Dados socioeconômicos não disponíveis")
+            self._exibir("❌ Dados socioeconômicos não disponíveis")
             return None
 
-        colunas_notas = ['NU_NOTA_CN', 'NU_NOTA_CH', 'NU_NOTA_LC', 'NU_NOTA_MT', 'NU_NOTA_REDACAO']
-        colunas_existentes = [col for col in colunas_notas if col in self.dados.columns]
+        colunas_existentes = [col for col in COLUNAS_NOTAS if col in self.colunas]
 
         if not colunas_existentes:
-            print("❌ Nenhuma coluna de notas encontrada")
+            self._exibir("❌ Nenhuma coluna de notas encontrada")
             return None
 
-        # Filtrar dados válidos para a análise
-        dados_validos = self.dados[self.dados[coluna_analise].notna()]
-        print(f"📋 Registros válidos para análise: {len(dados_validos):,}")
-
-        # Calcular estatísticas por grupo
-        df_socio = dados_validos.groupby(coluna_analise)[colunas_existentes].agg(['mean', 'count']).round(1)
-
-        # Contar participantes por grupo
-        participantes_por_grupo = dados_validos.groupby(coluna_analise).size()
-
-        print(f"\n📊 MÉDIAS POR {coluna_analise.upper()}:")
-        for categoria in participantes_por_grupo.index:
-            if pd.notna(categoria):
-                n_participantes = participantes_por_grupo[categoria]
-                # Calcular média geral das notas para esta categoria
-                medias_categoria = dados_validos[dados_validos[coluna_analise] == categoria][colunas_existentes].mean()
-                media_geral = medias_categoria.mean()
-
-                print(f"   {categoria}: {media_geral:.1f} ({n_participantes:,} participantes)")
+        # Momentos por grupo (grupos com categoria nula já descartados)
+        momentos = self._momentos((coluna_analise,))
+        participantes_por_grupo = momentos.participantes
+        df_medias = momentos.media()[colunas_existentes]
+        self._exibir(f"📋 Registros válidos para análise: {participantes_por_grupo.sum():,}")
+
+        self._exibir(f"\n📊 MÉDIAS POR {coluna_analise.upper()}:")
+        for categoria, media_geral in df_medias.mean(axis=1).items():
+            n_participantes = participantes_por_grupo[categoria]
+            self._exibir(f"   {categoria}: {media_geral:.1f} ({n_participantes:,} participantes)")
+
+        # Intervalos de confiança e tamanho de efeito em relação ao primeiro grupo
+        ic = intervalos(momentos)
+        referencia = df_medias.index[0]
+        efeitos = comparar(momentos, coluna_analise, referencia)
+        self._exibir(f"\n📏 IC 95% DAS MÉDIAS E d DE COHEN EM RELAÇÃO A '{referencia}':")
+        for categoria in df_medias.index:
+            partes = []
+            for col in colunas_existentes:
+                media, inferior = ic.loc[categoria, (col, 'media')], ic.loc[categoria, (col, 'ic_inferior')]
+                texto = f"{col.replace('NU_NOTA_', '')} {media:.1f}±{media - inferior:.1f}"
+                if categoria in efeitos.index:
+                    texto += f" (d={efeitos.loc[categoria, (col, 'cohen_d')]:+.2f})"
+                partes.append(texto)
+            self._exibir(f"   {categoria}: " + " | ".join(partes))
+
+        # Todos os itens do questionário, resumidos juntos por resposta
+        questionario = self.matriz_questionario()
+        if questionario is not None and len(questionario) > 0:
+            amplitudes = amplitude_itens(questionario, self.min_participantes_resposta)
+            self._exibir("\n📋 ITENS DO QUESTIONÁRIO COM MAIOR DIFERENÇA DE MÉDIA ENTRE RESPOSTAS:")
+            for item, linha in amplitudes.head(5).iterrows():
+                self._exibir(f"   {item}: {linha['AMPLITUDE']:.1f} pontos "
+                             f"({linha['RESPOSTA_MENOR']}: {linha['MENOR_MEDIA']:.1f} | "
+                             f"{linha['RESPOSTA_MAIOR']}: {linha['MAIOR_MEDIA']:.1f})")
 
         # Criar gráfico - CORRIGIDO
-        df_plot = dados_validos.groupby(coluna_analise)[colunas_existentes].mean().reset_index()
+        if not self.gerar_graficos:
+            return None
+        import plotly.express as px
+
+        df_plot = df_medias.reset_index()
 
         df_melted = df_plot.melt(
             id_vars=[coluna_analise],
@@ -317,34 +1127,39 @@ class ENEMAnalyzer:
         """
         3. Distribuição das maiores notas de redação por estado
         """
-        print("\n" + "=" * 50)
-        print("✍️ ANÁLISE 3: Maiores Notas de Redação por Estado")
-        print("=" * 50)
+        self._exibir("\n" + "=" * 50)
+        self._exibir("✍️ ANÁLISE 3: Maiores Notas de Redação por Estado")
+        self._exibir("=" * 50)
 
-        if 'NU_NOTA_REDACAO' not in self.dados.columns:
-            print("❌ Dados de redação não encontrados")
+        if 'NU_NOTA_REDACAO' not in self.colunas:
+            self._exibir("❌ Dados de redação não encontrados")
             return None
 
-        # Top 5% das notas de redação
-        percentil_95 = self.dados['NU_NOTA_REDACAO'].quantile(0.95)
-        top_redacao = self.dados[self.dados['NU_NOTA_REDACAO'] >= percentil_95]
+        histograma = self._histograma('NU_NOTA_REDACAO')
+        if histograma is None:
+            self._exibir("❌ Histograma de redação não calculado no processamento em blocos")
+            return None
 
-        print(f"🎯 Analisando top 5% das notas (≥ {percentil_95:.0f} pontos)")
-        print(f"📝 {len(top_redacao):,} redações no top 5%")
+        # Top 5% das notas de redação (quantil exato pelo histograma)
+        percentil_95 = histograma.quantil(0.95)
 
-        if 'SG_UF_ESC' in self.dados.columns:
-            df_top_redacao = top_redacao.groupby('SG_UF_ESC').agg({
-                'NU_NOTA_REDACAO': ['count', 'mean', 'max']
-            }).round(1)
+        self._exibir(f"🎯 Analisando top 5% das notas (≥ {percentil_95:.0f} pontos)")
+        self._exibir(f"📝 {histograma.contar_acima(percentil_95):,} redações no top 5%")
 
-            df_top_redacao.columns = ['Quantidade', 'Media_Top', 'Nota_Maxima']
+        if 'SG_UF_ESC' in self.colunas:
+            df_top_redacao = histograma.resumo_acima(percentil_95).round(1)
+            df_top_redacao.index.name = 'SG_UF_ESC'
             df_top_redacao = df_top_redacao.sort_values('Quantidade', ascending=False).head(10)
 
-            print("🏆 TOP 10 ESTADOS - MAIORES NOTAS DE REDAÇÃO:")
+            self._exibir("🏆 TOP 10 ESTADOS - MAIORES NOTAS DE REDAÇÃO:")
             for uf, row in df_top_redacao.iterrows():
-                print(f"   {uf}: {row['Quantidade']} redações (máx: {row['Nota_Maxima']:.0f})")
+                self._exibir(f"   {uf}: {row['Quantidade']} redações (máx: {row['Nota_Maxima']:.0f})")
 
             # Criar gráfico
+            if not self.gerar_graficos:
+                return None
+            import plotly.express as px
+
             df_plot = df_top_redacao.reset_index()
             fig = px.scatter(
                 df_plot,
@@ -367,30 +1182,44 @@ class ENEMAnalyzer:
         """
         4. Comparação das notas por gênero em cada área de conhecimento
         """
-        print("\n" + "=" * 50)
-        print("👫 ANÁLISE 4: Desempenho por Gênero nas Áreas")
-        print("=" * 50)
+        self._exibir("\n" + "=" * 50)
+        self._exibir("👫 ANÁLISE 4: Desempenho por Gênero nas Áreas")
+        self._exibir("=" * 50)
 
-        if 'SEXO' not in self.dados.columns:
-            print("❌ Dados de sexo não encontrados")
+        if 'SEXO' not in self.colunas:
+            self._exibir("❌ Dados de sexo não encontrados")
             return None
 
-        colunas_notas = ['NU_NOTA_CN', 'NU_NOTA_CH', 'NU_NOTA_LC', 'NU_NOTA_MT', 'NU_NOTA_REDACAO']
         areas_nomes = ['Ciências Natureza', 'Ciências Humanas', 'Linguagens', 'Matemática', 'Redação']
-        colunas_existentes = [col for col in colunas_notas if col in self.dados.columns]
+        colunas_existentes = [col for col in COLUNAS_NOTAS if col in self.colunas]
 
-        df_genero = self.dados.groupby('SEXO')[colunas_existentes].mean().round(1)
+        momentos = self._momentos(('SEXO',))
+        df_genero = momentos.media()[colunas_existentes].round(1)
+        ic = intervalos(momentos)
 
-        print("📊 COMPARAÇÃO POR GÊNERO:")
+        # Diferença M - F com IC 95% (Welch) e d de Cohen
+        efeitos = None
+        if {'Masculino', 'Feminino'} <= set(df_genero.index):
+            efeitos = comparar(momentos, 'SEXO', 'Feminino').loc['Masculino']
+
+        self._exibir("📊 COMPARAÇÃO POR GÊNERO:")
         for i, col in enumerate(colunas_existentes):
             if len(df_genero) >= 2:
                 masc = df_genero.loc['Masculino', col] if 'Masculino' in df_genero.index else 0
                 fem = df_genero.loc['Feminino', col] if 'Feminino' in df_genero.index else 0
                 diff = masc - fem
-                area_nome = areas_nomes[colunas_notas.index(col)]
-                print(f"   {area_nome}: M={masc:.1f} | F={fem:.1f} | Diff={diff:+.1f}")
+                area_nome = areas_nomes[COLUNAS_NOTAS.index(col)]
+                texto = f"   {area_nome}: M={masc:.1f} | F={fem:.1f} | Diff={diff:+.1f}"
+                if efeitos is not None:
+                    texto += (f" [IC95% {efeitos[(col, 'ic_inferior')]:+.1f}; {efeitos[(col, 'ic_superior')]:+.1f}]"
+                              f" | d={efeitos[(col, 'cohen_d')]:+.2f}")
+                self._exibir(texto)
 
         # Criar gráfico
+        if not self.gerar_graficos:
+            return None
+        import plotly.express as px
+
         df_plot = df_genero.reset_index()
         df_melted = df_plot.melt(
             id_vars='SEXO',
@@ -399,11 +1228,19 @@ class ENEMAnalyzer:
             value_name='Nota_Media'
         )
 
+        # Barras de erro com a meia amplitude do IC 95%
+        meia_amplitude = ic.xs('ic_superior', axis=1, level='medida') - ic.xs('media', axis=1, level='medida')
+        df_erro = meia_amplitude[colunas_existentes].reset_index().melt(
+            id_vars='SEXO', var_name='Area', value_name='IC_95'
+        )
+        df_melted = df_melted.merge(df_erro, on=['SEXO', 'Area'])
+
         fig = px.bar(
             df_melted,
             x='Area',
             y='Nota_Media',
             color='SEXO',
+            error_y='IC_95',
             barmode='group',
             title='Comparação de Desempenho por Gênero',
             height=500
@@ -416,27 +1253,31 @@ class ENEMAnalyzer:
         """
         5. Distribuição das notas por faixa etária
         """
-        print("\n" + "=" * 50)
-        print("📅 ANÁLISE 5: Desempenho por Faixa Etária")
-        print("=" * 50)
+        self._exibir("\n" + "=" * 50)
+        self._exibir("📅 ANÁLISE 5: Desempenho por Faixa Etária")
+        self._exibir("=" * 50)
 
-        if 'FAIXA_ETARIA' not in self.dados.columns:
-            print("❌ Dados de faixa etária não processados")
+        if 'FAIXA_ETARIA' not in self.colunas:
+            self._exibir("❌ Dados de faixa etária não processados")
             return None
 
-        colunas_notas = ['NU_NOTA_CN', 'NU_NOTA_CH', 'NU_NOTA_LC', 'NU_NOTA_MT', 'NU_NOTA_REDACAO']
-        colunas_existentes = [col for col in colunas_notas if col in self.dados.columns]
+        colunas_existentes = [col for col in COLUNAS_NOTAS if col in self.colunas]
 
-        df_idade = self.dados.groupby('FAIXA_ETARIA')[colunas_existentes].mean().round(1)
-        df_idade['PARTICIPANTES'] = self.dados.groupby('FAIXA_ETARIA').size()
+        momentos = self._momentos(('FAIXA_ETARIA',))
+        df_idade = momentos.media()[colunas_existentes].round(1)
+        df_idade['PARTICIPANTES'] = momentos.participantes
 
-        print("📊 MÉDIAS POR FAIXA ETÁRIA:")
+        self._exibir("📊 MÉDIAS POR FAIXA ETÁRIA:")
         for faixa, row in df_idade.iterrows():
             if pd.notna(faixa):
                 media_geral = row[colunas_existentes].mean()
-                print(f"   {faixa}: {media_geral:.1f} ({row['PARTICIPANTES']:,} participantes)")
+                self._exibir(f"   {faixa}: {media_geral:.1f} ({row['PARTICIPANTES']:,} participantes)")
 
         # Criar gráfico
+        if not self.gerar_graficos:
+            return None
+        import plotly.express as px
+
         df_plot = df_idade.reset_index()
         df_melted = df_plot.melt(
             id_vars=['FAIXA_ETARIA', 'PARTICIPANTES'],
@@ -456,78 +1297,246 @@ class ENEMAnalyzer:
 
         return fig
 
-    def salvar_graficos_html(self, graficos, pasta_saida="graficos_enem"):
+    def salvar_graficos_html(self, graficos, pasta_saida="graficos_enem", formato='compartilhado'):
         """
-        Salva todos os gráficos em arquivos HTML
+        Salva todos os gráficos
+        formato: 'compartilhado' (um HTML por gráfico e um único plotly.min.js
+                 na pasta), 'relatorio' (um HTML com todos os gráficos),
+                 'html' (HTMLs independentes), 'json' (só as figuras) ou
+                 'png'/'svg' (requer kaleido); ver saida_graficos.py
         """
-        if not os.path.exists(pasta_saida):
-            os.makedirs(pasta_saida)
-
-        print(f"\n💾 Salvando gráficos na pasta '{pasta_saida}'...")
+        self._exibir(f"\n💾 Salvando gráficos na pasta '{pasta_saida}'...")
 
         nomes_arquivos = [
-            "01_desempenho_por_estado.html",
-            "02_desempenho_socioeconomico.html",
-            "03_maiores_notas_redacao.html",
-            "04_comparacao_por_genero.html",
-            "05_desempenho_faixa_etaria.html"
+            "01_desempenho_por_estado",
+            "02_desempenho_socioeconomico",
+            "03_maiores_notas_redacao",
+            "04_comparacao_por_genero",
+            "05_desempenho_faixa_etaria"
         ]
 
-        for i, (grafico, nome) in enumerate(zip(graficos, nomes_arquivos)):
-            if grafico is not None:
-                caminho = os.path.join(pasta_saida, nome)
-                pyo.plot(grafico, filename=caminho, auto_open=False)
-                print(f"   ✅ {nome}")
+        figuras = [(nome, grafico) for grafico, nome in zip(graficos, nomes_arquivos) if grafico is not None]
+        try:
+            gravados = salvar_figuras(figuras, pasta_saida, formato, titulo='Análise dos Microdados do ENEM 2023')
+        except RuntimeError as e:
+            self._exibir(f"❌ {e}")
+            return None
+
+        for nome, tamanho in gravados:
+            self._exibir(f"   ✅ {nome} ({tamanho / 1024:,.0f} KB)")
 
-        print(f"\n🎉 Gráficos salvos! Abra os arquivos HTML no navegador.")
+        total = sum(tamanho for _, tamanho in gravados)
+        self._exibir(f"\n🎉 Gráficos salvos ({total / 1024:,.0f} KB gravados).")
 
-    def executar_analise_completa(self, amostra=None, salvar_graficos=True):
+        return gravados
+
+    def _executar_etapas(self, relatorio, amostra, modo, tamanho_bloco, amostragem, semente,
+                         salvar_graficos, pasta_graficos, formato_graficos, bloco_cache=None, extratos=(),
+                         manter_checkpoints=False):
         """
-        Executa todas as análises
+        Executa as etapas da análise completa, medindo cada uma no relatório
+        Interrompe na primeira etapa de carga que falhar
+        bloco_cache: se informado, cria antes o cache colunar lendo o CSV
+                     em blocos desse tamanho
+        extratos: extratos parciais aplicados no modo 'incremental'
+        manter_checkpoints: no modo 'retomavel', não apagar os checkpoints ao concluir
         """
-        print("🚀 INICIANDO ANÁLISE COMPLETA DOS DADOS DO ENEM 2023")
-        print("=" * 60)
+        if bloco_cache is not None:
+            with relatorio.etapa('criar_cache') as medicao:
+                medicao['sucesso'] = self.criar_cache(bloco_cache)
+            if not medicao['sucesso']:
+                return
 
         # Carregar e processar dados
-        if not self.carregar_dados(amostra):
-            return False
-
-        if not self.processar_dados():
-            return False
+        if modo == 'blocos':
+            with relatorio.etapa('processar_em_blocos') as medicao:
+                medicao['sucesso'] = self.processar_em_blocos(amostra, tamanho_bloco)
+                medicao['linhas_entrada'] = self.linhas_lidas
+                medicao['linhas_saida'] = self.total_registros
+            if not medicao['sucesso']:
+                return
+        elif modo == 'cubo':
+            with relatorio.etapa('carregar_cubo') as medicao:
+                medicao['sucesso'] = self.carregar_cubo(amostra, tamanho_bloco)
+                medicao['linhas_entrada'] = self.linhas_lidas
+                medicao['linhas_saida'] = self.total_registros
+            if not medicao['sucesso']:
+                return
+        elif modo == 'retomavel':
+            with relatorio.etapa('processar_retomavel') as medicao:
+                medicao['sucesso'] = self.processar_retomavel(tamanho_bloco, manter_checkpoints)
+                medicao['linhas_entrada'] = self.linhas_lidas
+                medicao['linhas_saida'] = self.total_registros
+            if not medicao['sucesso']:
+                return
+        elif modo == 'incremental':
+            for arquivo, parcial in [(self.arquivo_dados, False)] + [(extrato, True) for extrato in extratos]:
+                with relatorio.etapa('atualizar_incremental') as medicao:
+                    medicao['sucesso'] = self.atualizar_incremental(arquivo, parcial)
+                    medicao['linhas_entrada'] = self.linhas_lidas
+                    medicao['linhas_saida'] = self.total_registros
+                if not medicao['sucesso']:
+                    return
+        else:
+            with relatorio.etapa('carregar_dados') as medicao:
+                medicao['sucesso'] = self.carregar_dados(amostra, amostragem, semente, tamanho_bloco)
+                medicao['linhas_saida'] = self.linhas_lidas
+            if not medicao['sucesso']:
+                return
+
+            with relatorio.etapa('processar_dados') as medicao:
+                medicao['sucesso'] = self.processar_dados()
+                medicao['linhas_entrada'] = self.linhas_lidas
+                medicao['linhas_saida'] = self.total_registros
+            if not medicao['sucesso']:
+                return
 
         # Estatísticas gerais
-        self.estatisticas_gerais()
+        if 'estatisticas_gerais' in self.analises:
+            with relatorio.etapa('estatisticas_gerais') as medicao:
+                medicao['linhas_entrada'] = self.total_registros
+                self.estatisticas_gerais()
 
-        # Executar análises
+        # Executar análises habilitadas (None mantém a posição das desabilitadas)
+        # Sem salvar os gráficos, as figuras nem são criadas
         graficos = []
+        gerar_graficos = self.gerar_graficos
+        self.gerar_graficos = gerar_graficos and salvar_graficos
 
-        graficos.append(self.analise_1_desempenho_por_estado())
-        graficos.append(self.analise_2_desempenho_socioeconomico())
-        graficos.append(self.analise_3_maiores_notas_redacao())
-        graficos.append(self.analise_4_genero_areas())
-        graficos.append(self.analise_5_faixa_etaria())
+        try:
+            for analise in ANALISES[1:]:
+                if analise not in self.analises:
+                    graficos.append(None)
+                    continue
+
+                with relatorio.etapa(analise) as medicao:
+                    medicao['linhas_entrada'] = self.total_registros
+                    graficos.append(getattr(self, analise)())
+        finally:
+            self.gerar_graficos = gerar_graficos
 
         # Salvar gráficos
         if salvar_graficos:
-            self.salvar_graficos_html([g for g in graficos if g is not None])
+            with relatorio.etapa('salvar_graficos_html') as medicao:
+                medicao['linhas_entrada'] = sum(grafico is not None for grafico in graficos)
+                gravados = self.salvar_graficos_html(graficos, pasta_graficos, formato_graficos)
+                medicao['sucesso'] = gravados is not None
+                medicao['bytes_gravados'] = sum(tamanho for _, tamanho in gravados or [])
 
-        print("\n" + "=" * 60)
-        print("✅ ANÁLISE COMPLETA FINALIZADA!")
-        print("=" * 60)
+    def planejar_execucao(self, amostra=None, memoria_max=None, permitir_memoria=True):
+        """
+        Escolhe o modo de execução e o tamanho dos blocos que respeitam o
+        limite de memória (ver planejador.py)
+        memoria_max: limite em bytes (None = o informado no construtor)
+        permitir_memoria: False restringe a escolha aos modos em blocos
+        """
+        self.plano = planejar(
+            self.arquivo_dados,
+            colunas_necessarias(self.analises),
+            memoria_max or self.memoria_max,
+            amostra=amostra,
+            pasta_cache=self.pasta_cache,
+            n_processos=numero_processos(self.n_processos),
+            permitir_memoria=permitir_memoria
+        )
+        self._exibir(f"🧭 Plano de execução: {self.plano.descrever()}")
+        return self.plano
+
+    def executar_analise_completa(self, amostra=None, salvar_graficos=True, modo=None,
+                                  tamanho_bloco=500_000, metricas=None, formato_metricas='jsonl',
+                                  formato_graficos='compartilhado', amostragem='inicio', semente=None,
+                                  pasta_graficos="graficos_enem", memoria_max=None, extratos=(),
+                                  manter_checkpoints=False):
+        """
+        Executa todas as análises
+        modo: 'memoria' carrega todos os dados; 'blocos' processa o arquivo
+              em blocos mantendo apenas os agregados (memória limitada);
+              'cubo' responde pelo cubo de agregados salvo em disco;
+              'incremental' atualiza o cubo com as inscrições novas ou
+              alteradas desde a execução anterior (ver atualizar_incremental);
+              'retomavel' processa em blocos com checkpoints em disco e
+              quarentena das linhas malformadas (ver processar_retomavel);
+              'auto' escolhe pelo limite de memória (planejar_execucao)
+              None = 'auto' se houver limite de memória, senão 'memoria'
+        tamanho_bloco: linhas por bloco de leitura
+        metricas: arquivo para exportar as medições das etapas (None = não exporta)
+        formato_metricas: 'jsonl' (uma linha por etapa, acumulando execuções)
+                          ou 'prometheus' (textfile do node_exporter)
+        formato_graficos: formato do salvar_graficos_html
+        amostragem, semente: estratégia da amostra (ver carregar_dados);
+                             amostras aleatórias usam o modo 'memoria'
+        memoria_max: limite de memória em bytes (None = o do construtor);
+                     nos modos em blocos define o tamanho do bloco
+        extratos: arquivos com parte das inscrições (correções ou registros
+                  atrasados) aplicados depois do arquivo no modo 'incremental'
+        manter_checkpoints: no modo 'retomavel', não apagar os checkpoints ao concluir
+
+        Retorna um RelatorioExecucao com tempo, CPU, memória, bytes lidos e
+        linhas de cada etapa; ele avalia como falso se alguma etapa falhar
+        """
+        memoria_max = memoria_max or self.memoria_max
+        if modo is None:
+            modo = 'auto' if memoria_max else 'memoria'
 
-        return True
+        if amostra is not None and amostragem != 'inicio' and modo in ('blocos', 'cubo'):
+            self._exibir(f"⚠️ Amostragem {amostragem} usa o modo 'memoria' (a amostra já limita a memória)")
+            modo = 'memoria'
+
+        if modo in ('incremental', 'retomavel') and amostra is not None:
+            self._exibir(f"⚠️ O modo '{modo}' sempre usa o arquivo completo (amostra ignorada)")
+            amostra = None
+
+        bloco_cache = None
+        if memoria_max and modo not in ('memoria', 'incremental') and os.path.exists(self.arquivo_dados):
+            plano = self.planejar_execucao(amostra, memoria_max, permitir_memoria=(modo == 'auto'))
+            tamanho_bloco = plano.tamanho_bloco
+            # O modo retomável lê o CSV por posição em bytes, sem o cache colunar
+            if plano.criar_cache and modo != 'retomavel':
+                bloco_cache = plano.bloco_conversao
+            if modo == 'auto':
+                # 'disco' é o processamento em blocos lendo do cache colunar
+                modo = 'blocos' if plano.modo == 'disco' else plano.modo
+        elif modo == 'auto':
+            modo = 'memoria'
+
+        relatorio = RelatorioExecucao({'modo': modo})
+
+        self._exibir("🚀 INICIANDO ANÁLISE COMPLETA DOS DADOS DO ENEM 2023")
+        self._exibir("=" * 60)
+
+        try:
+            self._executar_etapas(
+                relatorio, amostra, modo, tamanho_bloco, amostragem, semente,
+                salvar_graficos, pasta_graficos, formato_graficos, bloco_cache, extratos,
+                manter_checkpoints
+            )
+        finally:
+            if metricas:
+                relatorio.salvar(metricas, formato_metricas)
+
+        if not relatorio:
+            return relatorio
+
+        self._exibir("\n⏱️ Medições por etapa:")
+        self._exibir(relatorio.resumo())
+
+        self._exibir("\n" + "=" * 60)
+        self._exibir("✅ ANÁLISE COMPLETA FINALIZADA!")
+        self._exibir("=" * 60)
+
+        return relatorio
 
 
-# Função principal
-def main():
+# Interface de linha de comando
+def menu_interativo(arquivo_dados="MICRODADOS_ENEM_2023.csv"):
     """
-    Função principal para executar a análise
+    Menu interativo original (opção --interativo)
     """
     print("📊 DASHBOARD ENEM 2023 - Análise dos Microdados")
     print("=" * 50)
 
     # Inicializar analisador
-    analyzer = ENEMAnalyzer("MICRODADOS_ENEM_2023.csv")
+    analyzer = ENEMAnalyzer(arquivo_dados)
 
     # Perguntar se quer usar amostra
     print("\n🔧 CONFIGURAÇÃO:")
@@ -548,8 +1557,135 @@ def main():
             amostra = None
 
     # Executar análise
-    analyzer.executar_analise_completa(amostra=amostra)
+    return analyzer.executar_analise_completa(amostra=amostra)
+
+
+def ler_tamanho_memoria(texto):
+    """
+    Converte '512M', '4G', '2.5GB' ou um número de bytes em bytes
+    """
+    unidades = {'K': 2**10, 'M': 2**20, 'G': 2**30, 'T': 2**40}
+    valor = texto.strip().upper().removesuffix('B')
+    try:
+        if valor and valor[-1] in unidades:
+            return int(float(valor[:-1]) * unidades[valor[-1]])
+        return int(float(valor))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"tamanho de memória inválido: {texto}")
+
+
+def resolver_analises(nomes):
+    """
+    Converte nomes ou prefixos (ex.: 'analise_1', 'estatisticas') nos
+    nomes completos das análises, na ordem de execução
+    """
+    escolhidas = set()
+    for nome in nomes:
+        candidatas = [analise for analise in ANALISES if analise == nome or analise.startswith(nome)]
+        if len(candidatas) != 1:
+            raise ValueError(f"Análise desconhecida ou ambígua: {nome} (opções: {', '.join(ANALISES)})")
+        escolhidas.add(candidatas[0])
+    return [analise for analise in ANALISES if analise in escolhidas]
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(
+        description='Análise dos microdados do ENEM 2023 (execução em lote, sem interação)'
+    )
+    parser.add_argument('arquivos', nargs='*', default=['MICRODADOS_ENEM_2023.csv'], metavar='arquivo',
+                        help='arquivo CSV de microdados (vários arquivos anuais = análise comparativa dos anos)')
+    parser.add_argument('--analises', nargs='+', metavar='ANALISE',
+                        help='análises a executar, por nome ou prefixo (padrão: todas)')
+    parser.add_argument('--processos', type=int, default=1,
+                        help='processos para a agregação (0 = todos os núcleos)')
+    parser.add_argument('--modo', choices=['auto', 'memoria', 'blocos', 'cubo', 'incremental', 'retomavel'],
+                        help="'memoria' (dados completos), 'blocos' (streaming), 'cubo' (agregados em disco), "
+                             "'incremental' (atualiza o cubo só com as inscrições alteradas), "
+                             "'retomavel' (streaming com checkpoints e quarentena de linhas malformadas) "
+                             "ou 'auto' (pelo limite de memória; padrão quando --memoria-max é informado)")
+    parser.add_argument('--extrato', action='append', default=[], metavar='ARQUIVO',
+                        help="extrato parcial (correções ou registros atrasados) aplicado no modo 'incremental'")
+    parser.add_argument('--manter-checkpoints', action='store_true',
+                        help="no modo 'retomavel', mantém os checkpoints dos blocos ao concluir")
+    parser.add_argument('--leituras', type=int,
+                        help='arquivos anuais lidos ao mesmo tempo (padrão: um por arquivo, até o número de núcleos)')
+    parser.add_argument('--cache', action='store_true',
+                        help='cria ou atualiza o cache colunar Parquet antes da análise')
+    parser.add_argument('--memoria-max', type=ler_tamanho_memoria, metavar='TAMANHO',
+                        help='limite de memória (ex.: 4G); escolhe o modo e o tamanho dos blocos')
+    parser.add_argument('--tamanho-bloco', type=int, default=500_000, help='linhas por bloco')
+    parser.add_argument('--amostra', type=int, help='número de registros da amostra')
+    parser.add_argument('--amostragem', choices=ESTRATEGIAS_AMOSTRAGEM, default='inicio',
+                        help="'inicio' (primeiras linhas), 'aleatoria' ou 'estratificada' por UF")
+    parser.add_argument('--semente', type=int, help='semente da amostragem')
+    parser.add_argument('--formato-graficos', choices=FORMATOS_GRAFICOS, default='compartilhado')
+    parser.add_argument('--pasta-graficos', default='graficos_enem')
+    parser.add_argument('--sem-graficos', action='store_true', help='não grava os gráficos')
+    parser.add_argument('--metricas', metavar='ARQUIVO', help='exporta as medições das etapas')
+    parser.add_argument('--formato-metricas', choices=['jsonl', 'prometheus'], default='jsonl')
+    parser.add_argument('--silencioso', action='store_true', help='não exibe mensagens de progresso')
+    parser.add_argument('--interativo', action='store_true', help='usa o menu interativo original')
+    return parser
+
+
+def main(argv=None):
+    """
+    Função principal para executar a análise
+    Retorna o código de saída (0 = sucesso)
+    """
+    parser = criar_parser()
+    args = parser.parse_args(argv)
 
+    if args.interativo:
+        return 0 if menu_interativo(args.arquivos[0]) else 1
 
-if _name_ == "_main_":
-    main()
+    try:
+        analises = resolver_analises(args.analises) if args.analises else None
+    except ValueError as e:
+        parser.error(str(e))
+
+    if len(args.arquivos) > 1:
+        if args.memoria_max or args.cache or args.modo in ('auto', 'cubo', 'incremental', 'retomavel'):
+            parser.error("--memoria-max, --cache e os modos 'auto'/'cubo'/'incremental'/'retomavel' "
+                         "valem para um único arquivo")
+
+        from multiplos_anos import ENEMAnalyzerAnos
+
+        try:
+            analyzer = ENEMAnalyzerAnos(args.arquivos, analises=analises, leituras_simultaneas=args.leituras,
+                                        n_processos=args.processos, verbose=not args.silencioso)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+    else:
+        analyzer = ENEMAnalyzer(args.arquivos[0], analises=analises, n_processos=args.processos,
+                                verbose=not args.silencioso, memoria_max=args.memoria_max)
+
+    if args.extrato and args.modo != 'incremental':
+        parser.error("--extrato requer --modo incremental")
+
+    if args.manter_checkpoints and args.modo != 'retomavel':
+        parser.error("--manter-checkpoints requer --modo retomavel")
+
+    if args.cache and not analyzer.criar_cache(args.tamanho_bloco):
+        return 1
+
+    relatorio = analyzer.executar_analise_completa(
+        amostra=args.amostra,
+        salvar_graficos=not args.sem_graficos,
+        modo=args.modo,
+        tamanho_bloco=args.tamanho_bloco,
+        metricas=args.metricas,
+        formato_metricas=args.formato_metricas,
+        formato_graficos=args.formato_graficos,
+        amostragem=args.amostragem,
+        semente=args.semente,
+        pasta_graficos=args.pasta_graficos,
+        extratos=args.extrato,
+        manter_checkpoints=args.manter_checkpoints,
+    )
+
+    return 0 if relatorio else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,507 @@
+"""
+Análise conjunta de várias edições do ENEM
+Cada arquivo anual é lido e processado em um processo próprio, ao mesmo
+tempo que os demais (o tempo total fica perto do arquivo mais lento, e não
+da soma). As diferenças de layout entre os anos são resolvidas no
+processamento de cada arquivo (colunas ausentes, idade exata ou só faixa
+etária) e cada linha recebe a coluna ANO; as análises comparam os anos a
+partir dos momentos agrupados por ANO.
+"""
+
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from agregacao import TabelaMomentos
+from esquema import COLUNAS_NOTAS
+from main import ENEMAnalyzer
+from preprocessamento import concatenar_blocos
+from quantis import HistogramaQuantis
+
+
+def ano_do_arquivo(arquivo):
+    """
+    Ano da edição de um arquivo de microdados: pelo nome
+    (ex.: MICRODADOS_ENEM_2021.csv) ou pela coluna NU_ANO da primeira linha
+    """
+    encontrado = re.search(r'(?<!\d)(?:19|20)\d{2}(?!\d)', os.path.basename(arquivo))
+    if encontrado:
+        return int(encontrado.group())
+
+    primeira = pd.read_csv(arquivo, sep=';', encoding='latin-1', nrows=1,
+                           usecols=lambda col: col == 'NU_ANO')
+    if 'NU_ANO' not in primeira.columns or primeira.empty:
+        raise ValueError(f"Não foi possível identificar o ano de {arquivo}")
+    return int(primeira['NU_ANO'].iloc[0])
+
+
+def _por_ano(agrupamentos, analises):
+    # A análise 1 compara as UFs de cada ano (sem a hierarquia de municípios)
+    if 'analise_1_desempenho_por_estado' in analises:
+        agrupamentos = list(agrupamentos) + [('SG_UF_ESC', 'REGIAO')]
+    return [('ANO',) + tuple(chaves) for chaves in dict.fromkeys(agrupamentos)]
+
+
+class AnalisadorAno(ENEMAnalyzer):
+    """
+    Analisador de um único arquivo anual: acrescenta a coluna ANO aos
+    dados processados e agrupa todos os momentos também por ela
+    """
+
+    def __init__(self, arquivo_dados, ano, analises=None, **kwargs):
+        super().__init__(arquivo_dados, analises, **kwargs)
+        self.ano = ano
+
+    def _processar(self, dados):
+        dados = super()._processar(dados)
+        dados['ANO'] = np.full(len(dados), self.ano, dtype=np.int16)
+        return dados
+
+    def _agrupamentos(self):
+        return _por_ano(super()._agrupamentos(), self.analises)
+
+    def _nova_geografia(self):
+        return None
+
+    def _com_questionario(self):
+        return False
+
+
+def _processar_ano(arquivo, ano, analises, modo, amostra, amostragem, semente, tamanho_bloco):
+    """
+    Carrega e processa um arquivo anual (executada em um processo do pool)
+    modo 'memoria' devolve os dados processados; 'blocos' devolve apenas
+    os momentos e o histograma de redação por UF
+    """
+    inicio = time.perf_counter()
+    analisador = AnalisadorAno(arquivo, ano, analises, verbose=False)
+
+    if modo == 'blocos':
+        sucesso = analisador.processar_em_blocos(amostra, tamanho_bloco)
+    else:
+        sucesso = (analisador.carregar_dados(amostra, amostragem, semente, tamanho_bloco)
+                   and analisador.processar_dados())
+
+    return {
+        'ano': ano,
+        'sucesso': sucesso,
+        'tempo_s': time.perf_counter() - inicio,
+        'lidos': analisador.linhas_lidas,
+        'total': analisador.total_registros,
+        'colunas': analisador.colunas,
+        'dados': analisador.dados,
+        'agregados': analisador.agregados if modo == 'blocos' else {},
+        'histogramas': analisador.histogramas if modo == 'blocos' else {},
+    }
+
+
+def _alinhar_colunas(partes):
+    """
+    Garante as mesmas colunas em todos os anos (as ausentes em um ano,
+    como NU_IDADE nos arquivos recentes, ficam nulas), na ordem do primeiro
+    """
+    colunas = list(dict.fromkeys(col for parte in partes for col in parte.columns))
+    modelos = {}
+    for parte in partes:
+        for col in parte.columns:
+            modelos.setdefault(col, parte[col].iloc[:0])
+
+    alinhadas = []
+    for parte in partes:
+        for col in colunas:
+            if col not in parte.columns:
+                # Reindexar a série vazia mantém o tipo (inteiros viram float)
+                parte[col] = modelos[col].reindex(pd.RangeIndex(len(parte))).set_axis(parte.index)
+        alinhadas.append(parte[colunas])
+    return alinhadas
+
+
+class ENEMAnalyzerAnos(ENEMAnalyzer):
+    """
+    Análise de várias edições em uma única execução
+    arquivos: arquivos de microdados, um por ano (o ano vem do nome ou de NU_ANO)
+    leituras_simultaneas: arquivos processados ao mesmo tempo
+                          (None = um processo por arquivo, até o número de núcleos)
+    n_processos: processos da agregação dos anos juntos (cada arquivo é
+                 lido e processado em um único processo)
+
+    Os métodos de análise têm os mesmos nomes dos de ENEMAnalyzer (e são
+    executados pelo mesmo executar_analise_completa), mas comparam os anos
+    """
+
+    def __init__(self, arquivos, analises=None, leituras_simultaneas=None, n_processos=1, verbose=True):
+        if not arquivos:
+            raise ValueError("Informe ao menos um arquivo de microdados")
+
+        super().__init__(arquivos[0], analises, n_processos=n_processos, verbose=verbose)
+
+        self.arquivos = {}
+        for arquivo in arquivos:
+            ano = ano_do_arquivo(arquivo)
+            if ano in self.arquivos:
+                raise ValueError(f"Dois arquivos do ano {ano}: {self.arquivos[ano]} e {arquivo}")
+            self.arquivos[ano] = arquivo
+        self.arquivos = dict(sorted(self.arquivos.items()))
+
+        if leituras_simultaneas is None or leituras_simultaneas <= 0:
+            leituras_simultaneas = min(len(self.arquivos), os.cpu_count() or 1)
+        self.leituras_simultaneas = leituras_simultaneas
+        self.histogramas_ano = {}
+
+    @property
+    def anos(self):
+        return list(self.arquivos)
+
+    def _agrupamentos(self):
+        return _por_ano(super()._agrupamentos(), self.analises)
+
+    def carregar_anos(self, amostra=None, modo='memoria', amostragem='inicio', semente=None,
+                      tamanho_bloco=500_000):
+        """
+        Lê e processa todos os arquivos anuais ao mesmo tempo
+        amostra: linhas por arquivo (None = todas)
+        modo: 'memoria' junta os dados processados de todos os anos em um
+              único DataFrame com a coluna ANO; 'blocos' mantém só os
+              agregados de cada ano (memória limitada)
+        """
+        faltando = [arquivo for arquivo in self.arquivos.values() if not os.path.exists(arquivo)]
+        if faltando:
+            self._exibir(f"❌ Arquivos não encontrados: {', '.join(faltando)}")
+            return False
+
+        self._exibir(f"📂 Lendo {len(self.arquivos)} anos ({', '.join(map(str, self.anos))}) "
+                     f"com {self.leituras_simultaneas} leituras simultâneas...")
+
+        metodos = multiprocessing.get_all_start_methods()
+        contexto = multiprocessing.get_context('fork' if 'fork' in metodos else None)
+        resultados = {}
+
+        try:
+            with ProcessPoolExecutor(self.leituras_simultaneas, mp_context=contexto) as executor:
+                futuros = [
+                    executor.submit(_processar_ano, arquivo, ano, self.analises, modo,
+                                    amostra, amostragem, semente, tamanho_bloco)
+                    for ano, arquivo in self.arquivos.items()
+                ]
+                for futuro in as_completed(futuros):
+                    resultado = futuro.result()
+                    resultados[resultado['ano']] = resultado
+                    situacao = '✅' if resultado['sucesso'] else '❌'
+                    self._exibir(f"   {situacao} {resultado['ano']}: {resultado['total']:,} registros válidos "
+                                 f"em {resultado['tempo_s']:.1f}s")
+        except Exception as e:
+            self._exibir(f"❌ Erro ao processar os anos: {e}")
+            return False
+
+        if not all(resultado['sucesso'] for resultado in resultados.values()):
+            return False
+
+        resultados = [resultados[ano] for ano in self.anos]
+        self.cubo = None
+        self.colunas = set().union(*(resultado['colunas'] for resultado in resultados))
+        self.linhas_lidas = sum(resultado['lidos'] for resultado in resultados)
+        self.total_registros = sum(resultado['total'] for resultado in resultados)
+        self.agregados = {}
+        self.histogramas = {}
+        self.maiores = None
+        self.indice = None
+
+        if modo == 'blocos':
+            self.dados = None
+            for chaves in self._agrupamentos():
+                partes = [resultado['agregados'][chaves] for resultado in resultados
+                          if chaves in resultado['agregados']]
+                if partes:
+                    self.agregados[chaves] = TabelaMomentos.combinar(partes)
+            self.histogramas_ano = {
+                resultado['ano']: resultado['histogramas']['NU_NOTA_REDACAO']
+                for resultado in resultados
+                if 'NU_NOTA_REDACAO' in resultado['histogramas']
+            }
+        else:
+            self.dados = concatenar_blocos(_alinhar_colunas([resultado.pop('dados') for resultado in resultados]))
+            self.histogramas_ano = {}
+
+        self.dados_processados = True
+        self._exibir(f"✅ {self.total_registros:,} registros válidos em {len(self.anos)} anos")
+        return True
+
+    def carregar_dados(self, amostra=None, amostragem='inicio', semente=None, tamanho_bloco=500_000):
+        """
+        Carrega e processa todos os anos (ver carregar_anos)
+        """
+        return self.carregar_anos(amostra, 'memoria', amostragem, semente, tamanho_bloco)
+
+    def processar_dados(self):
+        """
+        Os dados de cada ano já são processados durante a leitura
+        """
+        if self.dados is None:
+            self._exibir("❌ Dados não carregados. Execute carregar_dados() primeiro.")
+            return False
+        return True
+
+    def processar_em_blocos(self, amostra=None, tamanho_bloco=500_000):
+        return self.carregar_anos(amostra, 'blocos', tamanho_bloco=tamanho_bloco)
+
+    def carregar_cubo(self, amostra=None, tamanho_bloco=500_000):
+        self._exibir("❌ O cubo de agregados é por arquivo; use o modo 'memoria' ou 'blocos'")
+        return False
+
+    def _medias_por_ano(self, chaves=()):
+        """
+        Médias das notas por ano (e pelas chaves) em formato longo, com a
+        média geral das áreas e o número de participantes
+        """
+        momentos = self._momentos(('ANO',) + tuple(chaves))
+        colunas_existentes = [col for col in COLUNAS_NOTAS if col in momentos.n.columns]
+
+        tabela = momentos.media()[colunas_existentes].round(1)
+        tabela['MEDIA_GERAL'] = tabela[colunas_existentes].mean(axis=1).round(1)
+        tabela['PARTICIPANTES'] = momentos.participantes
+        tabela = tabela.reset_index()
+        tabela['Ano'] = tabela['ANO'].astype(str)
+        return tabela
+
+    def _histograma_ano(self, ano):
+        """
+        Histograma das notas de redação (por UF) de um ano
+        """
+        if ano not in self.histogramas_ano and self.dados is not None:
+            do_ano = self.dados['ANO'].to_numpy() == ano
+            self.histogramas_ano[ano] = HistogramaQuantis.para_coluna('NU_NOTA_REDACAO').adicionar(
+                self.dados['NU_NOTA_REDACAO'].to_numpy()[do_ano],
+                self.dados['SG_UF_ESC'][do_ano] if 'SG_UF_ESC' in self.dados.columns else None
+            )
+        return self.histogramas_ano.get(ano)
+
+    def estatisticas_gerais(self):
+        """
+        Participantes e médias das notas em cada ano
+        """
+        if not self.dados_processados:
+            self._exibir("❌ Execute processar_dados() primeiro")
+            return
+
+        self._exibir("\n" + "=" * 50)
+        self._exibir(f"📈 ESTATÍSTICAS GERAIS - ENEM {self.anos[0]}-{self.anos[-1]}")
+        self._exibir("=" * 50)
+
+        tabela = self._medias_por_ano().set_index('ANO')
+        colunas_existentes = [col for col in COLUNAS_NOTAS if col in tabela.columns]
+        self._exibir(f"👥 Total de participantes: {self.total_registros:,}")
+        self._exibir("\n📊 MÉDIAS DAS NOTAS POR ANO:")
+        self._exibir(tabela[colunas_existentes + ['PARTICIPANTES']].to_string())
+
+    def analise_1_desempenho_por_estado(self):
+        """
+        1. Média geral por estado em cada ano
+        """
+        self._exibir("\n" + "=" * 50)
+        self._exibir("📍 ANÁLISE 1: Desempenho por Estado ao Longo dos Anos")
+        self._exibir("=" * 50)
+
+        if 'SG_UF_ESC' not in self.colunas:
+            self._exibir("❌ Coluna de UF não encontrada")
+            return None
+
+        tabela = self._medias_por_ano(('SG_UF_ESC', 'REGIAO'))
+
+        self._exibir("🏆 MELHOR ESTADO EM CADA ANO:")
+        for ano, grupo in tabela.groupby('ANO'):
+            melhor = grupo.loc[grupo['MEDIA_GERAL'].idxmax()]
+            self._exibir(f"   {ano}: {melhor['SG_UF_ESC']} ({melhor['MEDIA_GERAL']:.1f})")
+
+        if not self.gerar_graficos:
+            return None
+        import plotly.express as px
+
+        fig = px.bar(
+            tabela,
+            x='SG_UF_ESC',
+            y='MEDIA_GERAL',
+            color='Ano',
+            barmode='group',
+            title='Desempenho Médio por Estado e Ano',
+            labels={'SG_UF_ESC': 'Estado', 'MEDIA_GERAL': 'Média Geral'},
+            height=600
+        )
+
+        fig.update_layout(xaxis_tickangle=-45)
+        return fig
+
+    def analise_2_desempenho_socioeconomico(self):
+        """
+        2. Média geral por nível socioeconômico em cada ano
+        """
+        self._exibir("\n" + "=" * 50)
+        self._exibir("💰 ANÁLISE 2: Desempenho por Nível Socioeconômico ao Longo dos Anos")
+        self._exibir("=" * 50)
+
+        if 'NIVEL_SOCIOECONOMICO' in self.colunas and len(self._momentos(('ANO', 'NIVEL_SOCIOECONOMICO'))) > 0:
+            coluna_analise = 'NIVEL_SOCIOECONOMICO'
+        elif 'DEPENDENCIA_ESCOLA' in self.colunas:
+            coluna_analise = 'DEPENDENCIA_ESCOLA'
+        else:
+            self._exibir("❌ Dados socioeconômicos não disponíveis")
+            return None
+
+        tabela = self._medias_por_ano((coluna_analise,))
+        self._exibir(f"\n📊 MÉDIA GERAL POR {coluna_analise} E ANO:")
+        self._exibir(tabela.pivot(index=coluna_analise, columns='ANO', values='MEDIA_GERAL').to_string())
+
+        if not self.gerar_graficos:
+            return None
+        import plotly.express as px
+
+        fig = px.line(
+            tabela,
+            x=coluna_analise,
+            y='MEDIA_GERAL',
+            color='Ano',
+            title='Desempenho por Nível Socioeconômico e Ano',
+            labels={'MEDIA_GERAL': 'Média Geral'},
+            height=500,
+            markers=True
+        )
+
+        fig.update_layout(xaxis_tickangle=-45)
+        return fig
+
+    def analise_3_maiores_notas_redacao(self):
+        """
+        3. Top 5% das notas de redação de cada ano, por estado
+        """
+        self._exibir("\n" + "=" * 50)
+        self._exibir("✍️ ANÁLISE 3: Maiores Notas de Redação ao Longo dos Anos")
+        self._exibir("=" * 50)
+
+        if 'NU_NOTA_REDACAO' not in self.colunas:
+            self._exibir("❌ Dados de redação não encontrados")
+            return None
+
+        linhas = []
+        for ano in self.anos:
+            histograma = self._histograma_ano(ano)
+            if histograma is None:
+                continue
+
+            percentil_95 = histograma.quantil(0.95)
+            self._exibir(f"   {ano}: top 5% a partir de {percentil_95:.0f} pontos "
+                         f"({histograma.contar_acima(percentil_95):,} redações)")
+
+            if 'SG_UF_ESC' in self.colunas:
+                resumo = histograma.resumo_acima(percentil_95)
+                resumo.index.name = 'SG_UF_ESC'
+                linhas.append(resumo.reset_index().assign(Ano=str(ano)))
+
+        if not linhas:
+            return None
+
+        tabela = pd.concat(linhas, ignore_index=True)
+        principais = tabela.groupby('SG_UF_ESC')['Quantidade'].sum().nlargest(10).index
+        tabela = tabela[tabela['SG_UF_ESC'].isin(principais)]
+
+        if not self.gerar_graficos:
+            return None
+        import plotly.express as px
+
+        fig = px.bar(
+            tabela,
+            x='SG_UF_ESC',
+            y='Quantidade',
+            color='Ano',
+            barmode='group',
+            hover_data=['Media_Top', 'Nota_Maxima'],
+            title='Redações no Top 5% por Estado e Ano',
+            labels={'SG_UF_ESC': 'Estado', 'Quantidade': 'Número de Redações no Top 5%'}
+        )
+
+        return fig
+
+    def analise_4_genero_areas(self):
+        """
+        4. Diferença entre as médias masculina e feminina em cada área e ano
+        """
+        self._exibir("\n" + "=" * 50)
+        self._exibir("👫 ANÁLISE 4: Diferença por Gênero ao Longo dos Anos")
+        self._exibir("=" * 50)
+
+        if 'SEXO' not in self.colunas:
+            self._exibir("❌ Dados de sexo não encontrados")
+            return None
+
+        areas_nomes = dict(zip(COLUNAS_NOTAS, ['Ciências Natureza', 'Ciências Humanas', 'Linguagens',
+                                               'Matemática', 'Redação']))
+        medias = self._medias_por_ano(('SEXO',)).set_index(['ANO', 'SEXO'])
+        colunas_existentes = [col for col in COLUNAS_NOTAS if col in medias.columns]
+
+        sexos = medias.index.get_level_values('SEXO')
+        if not {'Masculino', 'Feminino'} <= set(sexos):
+            self._exibir("❌ Os dois sexos não estão presentes nos dados")
+            return None
+
+        diferenca = (
+            medias.xs('Masculino', level='SEXO')[colunas_existentes]
+            - medias.xs('Feminino', level='SEXO')[colunas_existentes]
+        ).round(1).rename(columns=areas_nomes)
+
+        self._exibir("📊 DIFERENÇA (MASCULINO - FEMININO) POR ANO:")
+        self._exibir(diferenca.to_string())
+
+        if not self.gerar_graficos:
+            return None
+        import plotly.express as px
+
+        df_melted = diferenca.reset_index().melt(id_vars='ANO', var_name='Area', value_name='Diferenca')
+        fig = px.line(
+            df_melted,
+            x='ANO',
+            y='Diferenca',
+            color='Area',
+            markers=True,
+            title='Diferença de Desempenho por Gênero (Masculino - Feminino)',
+            labels={'ANO': 'Ano', 'Diferenca': 'Diferença de Média'},
+            height=500
+        )
+
+        fig.update_xaxes(dtick=1)
+        return fig
+
+    def analise_5_faixa_etaria(self):
+        """
+        5. Média geral por faixa etária em cada ano
+        """
+        self._exibir("\n" + "=" * 50)
+        self._exibir("📅 ANÁLISE 5: Desempenho por Faixa Etária ao Longo dos Anos")
+        self._exibir("=" * 50)
+
+        if 'FAIXA_ETARIA' not in self.colunas:
+            self._exibir("❌ Dados de faixa etária não processados")
+            return None
+
+        tabela = self._medias_por_ano(('FAIXA_ETARIA',))
+        self._exibir("📊 MÉDIA GERAL POR FAIXA ETÁRIA E ANO:")
+        self._exibir(tabela.pivot(index='FAIXA_ETARIA', columns='ANO', values='MEDIA_GERAL').to_string())
+
+        if not self.gerar_graficos:
+            return None
+        import plotly.express as px
+
+        fig = px.line(
+            tabela,
+            x='FAIXA_ETARIA',
+            y='MEDIA_GERAL',
+            color='Ano',
+            markers=True,
+            title='Desempenho por Faixa Etária e Ano',
+            labels={'FAIXA_ETARIA': 'Faixa Etária', 'MEDIA_GERAL': 'Média Geral'},
+            height=500
+        )
+
+        return fig
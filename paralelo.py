@@ -0,0 +1,138 @@
+"""
+Agregação paralela dos momentos por grupo
+Divide as linhas em fatias, calcula a tabela fina do plano de agregação
+de cada fatia em um pool de processos e combina os resultados
+(TabelaMomentos é combinável)
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+
+from agregacao import PlanoAgregacao, TabelaMomentos
+
+# DataFrame herdado pelos processos filhos via fork (sem cópia nem pickle)
+_dados_compartilhados = None
+
+
+def numero_processos(n_processos):
+    """
+    Normaliza o número de processos (None ou <= 0 = todos os núcleos)
+    """
+    if n_processos is None or n_processos <= 0:
+        return os.cpu_count() or 1
+    return n_processos
+
+
+def momentos_fatia(dados, agrupamentos, colunas):
+    """
+    Calcula a tabela fina (união das chaves dos agrupamentos) de um bloco
+    de linhas em uma única passagem
+    """
+    return PlanoAgregacao(agrupamentos).calcular(dados, colunas)
+
+
+def _momentos_intervalo(inicio, fim, agrupamentos, colunas):
+    return momentos_fatia(_dados_compartilhados.iloc[inicio:fim], agrupamentos, colunas)
+
+
+def _combinar(parciais, agrupamentos, resolver=True):
+    fina = TabelaMomentos.combinar(parciais)
+    return PlanoAgregacao(agrupamentos).resolver(fina) if resolver else fina
+
+
+def _colunas_usadas(dados, agrupamentos, colunas):
+    usadas = list(colunas) + [chave for chaves in agrupamentos for chave in chaves]
+    return [col for col in dict.fromkeys(usadas) if col in dados.columns]
+
+
+class AgregadorParalelo:
+    """
+    Recebe blocos de dados e calcula seus momentos em paralelo
+    Com n_processos=1 tudo é calculado no próprio processo
+    """
+
+    def __init__(self, agrupamentos, colunas, n_processos=1):
+        self.agrupamentos = list(agrupamentos)
+        self.colunas = list(colunas)
+        self.n_processos = numero_processos(n_processos)
+        self.parciais = []
+        self.pendentes = set()
+        self.executor = None
+        self.fina = None
+
+    def __enter__(self):
+        if self.n_processos > 1:
+            self.executor = ProcessPoolExecutor(self.n_processos)
+        return self
+
+    def __exit__(self, *exc):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+        return False
+
+    def enviar(self, dados):
+        """
+        Agenda o cálculo dos momentos de um bloco
+        Limita os blocos em andamento para manter a memória limitada
+        """
+        if self.executor is None:
+            self.parciais.append(momentos_fatia(dados, self.agrupamentos, self.colunas))
+            return
+
+        while len(self.pendentes) >= 2 * self.n_processos:
+            prontos, self.pendentes = wait(self.pendentes, return_when=FIRST_COMPLETED)
+            self.parciais.extend(futuro.result() for futuro in prontos)
+
+        dados = dados[_colunas_usadas(dados, self.agrupamentos, self.colunas)]
+        self.pendentes.add(self.executor.submit(momentos_fatia, dados, self.agrupamentos, self.colunas))
+
+    def resultado(self):
+        """
+        Aguarda os blocos pendentes e retorna os momentos combinados
+        por agrupamento (a tabela fina combinada fica em self.fina)
+        """
+        self.parciais.extend(futuro.result() for futuro in self.pendentes)
+        self.pendentes = set()
+        self.fina = TabelaMomentos.combinar(self.parciais)
+        self.parciais = [self.fina]
+        return PlanoAgregacao(self.agrupamentos).resolver(self.fina)
+
+
+def momentos_paralelos(dados, agrupamentos, colunas, n_processos=None, fatias_por_processo=2, resolver=True):
+    """
+    Calcula os momentos de vários agrupamentos em uma passagem, dividindo
+    as linhas de um DataFrame entre processos
+    Em sistemas com fork os processos leem o DataFrame por cópia sob
+    demanda; nos demais as fatias são enviadas por pickle
+    resolver: False retorna a tabela fina combinada (chaves nulas mantidas)
+    """
+    global _dados_compartilhados
+
+    n_processos = numero_processos(n_processos)
+    if n_processos == 1 or len(dados) == 0:
+        return _combinar([momentos_fatia(dados, agrupamentos, colunas)], agrupamentos, resolver)
+
+    limites = np.linspace(0, len(dados), n_processos * fatias_por_processo + 1).astype(int)
+    intervalos = [(inicio, fim) for inicio, fim in zip(limites[:-1], limites[1:]) if fim > inicio]
+
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        with AgregadorParalelo(agrupamentos, colunas, n_processos) as agregador:
+            for inicio, fim in intervalos:
+                agregador.enviar(dados.iloc[inicio:fim])
+            resolvidos = agregador.resultado()
+            return resolvidos if resolver else agregador.fina
+
+    _dados_compartilhados = dados[_colunas_usadas(dados, agrupamentos, colunas)]
+    try:
+        contexto = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(n_processos, mp_context=contexto) as executor:
+            futuros = [
+                executor.submit(_momentos_intervalo, inicio, fim, agrupamentos, colunas)
+                for inicio, fim in intervalos
+            ]
+            return _combinar([futuro.result() for futuro in futuros], agrupamentos, resolver)
+    finally:
+        _dados_compartilhados = None
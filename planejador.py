@@ -0,0 +1,155 @@
+"""
+Planejamento da execução a partir de um limite de memória
+Estima o custo por linha pelo esquema (tipos declarados) e pelo tamanho
+médio das linhas do arquivo, e escolhe o modo mais rápido que cabe no
+limite: dados em memória, leitura do CSV em blocos, ou particionamento
+em disco (cache colunar por UF) seguido de leitura em blocos
+"""
+
+import os
+
+from cache_colunar import cache_valido, pyarrow_disponivel
+from esquema import bytes_por_linha
+from instrumentacao import memoria_kb
+
+# Pico por byte de CSV de um bloco em leitura (tokenização e conversão de tipos)
+FATOR_LEITURA_CSV = 4
+
+# Pico por linha lida do cache Parquet, em múltiplos do tamanho tipado da linha
+FATOR_LEITURA_CACHE = 6
+
+# Bytes por linha das colunas derivadas pelo processar_dados
+BYTES_DERIVADAS = 24
+
+# Bytes por linha das cópias temporárias da agregação (notas em float64 e códigos)
+BYTES_AGREGACAO = 100
+
+# Memória fixa do gravador Parquet durante a conversão (um arquivo aberto
+# por UF, com buffers por coluna), independente do tamanho do bloco
+MEMORIA_CONVERSAO = 128 * 2**20
+
+# Reserva para histogramas, maiores notas e tabelas de agregados
+MEMORIA_ESTADO = 64 * 2**20
+
+# Limites do tamanho de bloco: abaixo do mínimo o custo fixo por bloco domina
+MIN_LINHAS_BLOCO = 20_000
+MAX_LINHAS_BLOCO = 1_000_000
+
+# Trecho do início do arquivo usado para medir o tamanho médio das linhas
+BYTES_AMOSTRA_LINHAS = 1 << 20
+
+
+class PlanoExecucao:
+    """
+    Modo escolhido ('memoria', 'blocos' ou 'disco'), linhas por bloco,
+    se o cache em disco precisa ser criado (e com que bloco de leitura do
+    CSV), e as estimativas usadas
+    """
+
+    def __init__(self, modo, tamanho_bloco, criar_cache, estimativas, motivo, bloco_conversao=None):
+        self.modo = modo
+        self.tamanho_bloco = tamanho_bloco
+        self.criar_cache = criar_cache
+        self.bloco_conversao = bloco_conversao
+        self.estimativas = estimativas
+        self.motivo = motivo
+
+    def descrever(self):
+        estimativas = self.estimativas
+        return (
+            f"modo '{self.modo}', blocos de {self.tamanho_bloco:,} linhas "
+            f"(~{estimativas['linhas']:,.0f} linhas, {estimativas['bytes_linha_csv']:.0f} B/linha no CSV, "
+            f"{estimativas['bytes_linha_dados']:.0f} B/linha em memória, "
+            f"{estimativas['disponivel'] / 2**20:,.0f} MB disponíveis): {self.motivo}"
+        )
+
+
+def bytes_por_linha_csv(arquivo):
+    """
+    Tamanho médio das linhas no início do arquivo (bytes)
+    """
+    with open(arquivo, 'rb') as f:
+        inicio = f.read(BYTES_AMOSTRA_LINHAS)
+    # A primeira linha é o cabeçalho
+    linhas = inicio.count(b'\n') - 1
+    if linhas <= 0:
+        return float(max(len(inicio), 1))
+    return (len(inicio) - inicio.index(b'\n') - 1) / linhas
+
+
+def _limitar(linhas):
+    return int(min(max(linhas, 0), MAX_LINHAS_BLOCO))
+
+
+def planejar(arquivo, colunas, memoria_max, amostra=None, pasta_cache=None, n_processos=1,
+             permitir_memoria=True, memoria_base=None):
+    """
+    Escolhe o modo de execução que respeita o limite de memória
+    arquivo: CSV de microdados
+    colunas: colunas lidas do arquivo
+    memoria_max: limite de memória do processo (bytes)
+    amostra: linhas a ler (None = arquivo todo)
+    pasta_cache: pasta do cache colunar (None = não usar cache)
+    n_processos: processos da agregação (cada um mantém blocos em andamento)
+    permitir_memoria: False restringe a escolha aos modos em blocos
+    memoria_base: memória já em uso (None = memória residente atual)
+
+    Preferência: memória (uma leitura, sem custo por bloco) > disco com
+    cache já existente (leitura colunar) > blocos do CSV > particionar em
+    disco quando os blocos do CSV ficariam pequenos demais
+    """
+    bytes_csv = bytes_por_linha_csv(arquivo)
+    linhas = os.path.getsize(arquivo) / bytes_csv
+    if amostra is not None:
+        linhas = min(linhas, amostra)
+
+    tipada = bytes_por_linha(colunas) + BYTES_DERIVADAS
+    if memoria_base is None:
+        memoria_base = (memoria_kb('VmRSS') or 0) * 1024
+    disponivel = memoria_max - memoria_base - MEMORIA_ESTADO
+
+    # Blocos em andamento no pool de processos (ver AgregadorParalelo)
+    em_andamento = 2 * n_processos if n_processos > 1 else 0
+    custo_bloco_csv = bytes_csv * FATOR_LEITURA_CSV + em_andamento * tipada + BYTES_AGREGACAO
+    custo_bloco_cache = tipada * FATOR_LEITURA_CACHE + em_andamento * tipada + BYTES_AGREGACAO
+
+    cache = pasta_cache is not None and cache_valido(arquivo, pasta_cache, colunas)
+    estimativas = {
+        'linhas': linhas,
+        'bytes_linha_csv': bytes_csv,
+        'bytes_linha_dados': tipada,
+        'memoria_base': memoria_base,
+        'disponivel': disponivel,
+        'memoria_dados': linhas * (tipada + BYTES_AGREGACAO),
+        'cache_valido': cache,
+    }
+
+    if disponivel <= 0:
+        return PlanoExecucao('blocos', MIN_LINHAS_BLOCO, False, estimativas,
+                             'limite abaixo da memória já em uso; blocos mínimos')
+
+    custo_leitura = custo_bloco_cache if cache else custo_bloco_csv
+    livre = disponivel - estimativas['memoria_dados']
+    if permitir_memoria and livre > 0:
+        bloco = _limitar(livre / custo_leitura)
+        if bloco >= min(MIN_LINHAS_BLOCO, linhas):
+            return PlanoExecucao('memoria', max(bloco, 1), False, estimativas,
+                                 'os dados processados cabem no limite')
+
+    if cache:
+        return PlanoExecucao('disco', max(_limitar(disponivel / custo_bloco_cache), 1_000), False, estimativas,
+                             'leitura em blocos do cache colunar já existente')
+
+    bloco_csv = _limitar(disponivel / custo_bloco_csv)
+    bloco_conversao = _limitar((disponivel - MEMORIA_CONVERSAO) / custo_bloco_csv)
+    if bloco_csv >= MIN_LINHAS_BLOCO or not pyarrow_disponivel() or pasta_cache is None:
+        return PlanoExecucao('blocos', max(bloco_csv, 1_000), False, estimativas,
+                             'os dados não cabem no limite; leitura do CSV em blocos')
+
+    if bloco_conversao < 1_000:
+        return PlanoExecucao('blocos', max(bloco_csv, 1_000), False, estimativas,
+                             'sem memória para particionar em disco; leitura do CSV em blocos pequenos')
+
+    return PlanoExecucao('disco', max(_limitar(disponivel / custo_bloco_cache), 1_000), True, estimativas,
+                         'blocos do CSV pequenos demais; particionando em disco uma vez',
+                         bloco_conversao=bloco_conversao)
@@ -0,0 +1,101 @@
+"""
+Rotinas vetorizadas usadas pelo processar_dados
+Rótulos são gerados como categóricos direto dos códigos (tabelas de
+consulta em NumPy) e o filtro de linhas é aplicado coluna a coluna
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def categorizar(serie, mapa):
+    """
+    Converte códigos (inteiros ou categóricos) em um Categorical de rótulos
+    serie: coluna de códigos
+    mapa: dicionário código -> rótulo; códigos ausentes viram nulos
+    A ordem das categorias segue a ordem dos rótulos no mapa
+    """
+    rotulos = list(dict.fromkeys(mapa.values()))
+    posicao = {rotulo: i for i, rotulo in enumerate(rotulos)}
+
+    if not isinstance(serie.dtype, pd.CategoricalDtype) and not pd.api.types.is_numeric_dtype(serie.dtype):
+        serie = serie.astype('category')
+
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # Traduzir só as categorias; o último item atende o código -1 (nulo)
+        tabela = np.array(
+            [posicao[mapa[c]] if c in mapa else -1 for c in serie.cat.categories] + [-1],
+            dtype=np.int16
+        )
+        codigos = tabela[serie.cat.codes.to_numpy()]
+    else:
+        inteiros = [codigo for codigo in mapa if isinstance(codigo, (int, np.integer))]
+        maior = max(inteiros)
+        tabela = np.full(maior + 2, -1, dtype=np.int16)
+        for codigo in inteiros:
+            tabela[codigo] = posicao[mapa[codigo]]
+
+        valores = serie.to_numpy(dtype='float64', na_value=np.nan)
+        validos = (valores >= 0) & (valores <= maior) & (valores == np.floor(valores))
+        indices = np.where(validos, valores, maior + 1).astype(np.int64)
+        codigos = tabela[indices]
+
+    return pd.Categorical.from_codes(codigos, categories=rotulos)
+
+
+def mascara_igual(dados, colunas, valor):
+    """
+    Máscara booleana única das linhas em que todas as colunas existentes
+    são iguais ao valor
+    """
+    mascara = np.ones(len(dados), dtype=bool)
+    for col in colunas:
+        if col in dados.columns:
+            mascara &= dados[col].to_numpy(dtype='float64', na_value=np.nan) == valor
+    return mascara
+
+
+def filtrar_linhas(dados, mascara):
+    """
+    Mantém apenas as linhas da máscara, copiando uma coluna por vez e
+    liberando a original logo em seguida (o DataFrame de entrada é esvaziado)
+    Assim o pico de memória fica próximo do tamanho dos dados, e não do dobro
+    """
+    if mascara.all():
+        return dados
+
+    indice = dados.index[mascara]
+    filtradas = {}
+    for col in list(dados.columns):
+        filtradas[col] = dados[col].array[mascara]
+        del dados[col]
+
+    return pd.DataFrame(filtradas, index=indice, copy=False)
+
+
+def concatenar_blocos(blocos):
+    """
+    Junta blocos lidos separadamente em um único DataFrame
+    Categóricas com categorias diferentes em cada bloco são unidas (o
+    pd.concat as converteria para object). Cada coluna dos blocos é
+    liberada assim que copiada, para não manter duas cópias dos dados
+    """
+    if len(blocos) == 1:
+        return blocos[0].reset_index(drop=True)
+
+    colunas = {}
+    for col in list(blocos[0].columns):
+        partes = [bloco.pop(col) for bloco in blocos]
+        mesmo_tipo = all(parte.dtype == partes[0].dtype for parte in partes)
+        if not mesmo_tipo and all(isinstance(parte.dtype, pd.CategoricalDtype) for parte in partes):
+            # Blocos sem nenhum valor na coluna têm categorias vazias, que
+            # podem vir com outro tipo e impediriam a união
+            tipos = [parte.cat.categories.dtype for parte in partes if len(parte.cat.categories)]
+            if tipos:
+                partes = [parte if len(parte.cat.categories) else parte.cat.set_categories(pd.Index([], dtype=tipos[0]))
+                          for parte in partes]
+            colunas[col] = pd.api.types.union_categoricals(partes, sort_categories=True)
+        else:
+            colunas[col] = pd.concat(partes, ignore_index=True)
+
+    return pd.DataFrame(colunas, copy=False)
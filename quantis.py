@@ -0,0 +1,218 @@
+"""
+Quantis e maiores valores combináveis, para uso em blocos ou em paralelo
+As notas do ENEM ficam numa grade discreta (redação em inteiros de 0 a
+1000, objetivas com uma casa decimal), então um histograma na grade dá
+quantis exatos com memória fixa. Só as colunas com grade configurada
+são aceitas; outras colunas contínuas precisariam de outro resumo
+"""
+
+import numpy as np
+import pandas as pd
+
+# Grade (início, fim, passo) de cada coluna de nota
+GRADE_NOTAS = {
+    'NU_NOTA_CN': (0.0, 1000.0, 0.1),
+    'NU_NOTA_CH': (0.0, 1000.0, 0.1),
+    'NU_NOTA_LC': (0.0, 1000.0, 0.1),
+    'NU_NOTA_MT': (0.0, 1000.0, 0.1),
+    'NU_NOTA_REDACAO': (0.0, 1000.0, 1.0),
+}
+
+
+class HistogramaQuantis:
+    """
+    Histograma combinável em uma grade fixa, opcionalmente por grupo
+    Não é um resumo para valores contínuos quaisquer: cada valor é
+    arredondado para o ponto mais próximo da grade. Os quantis só são
+    exatos para valores sobre a grade (as notas do ENEM, ver GRADE_NOTAS);
+    fora dela o erro é de até meio passo, e valores fora do intervalo
+    contam nos extremos. Por isso para_coluna só aceita as colunas com
+    grade configurada, e só se combinam histogramas da mesma grade
+    """
+
+    def __init__(self, inicio=0.0, fim=1000.0, passo=1.0):
+        self.inicio = inicio
+        self.passo = passo
+        self.n_faixas = int(round((fim - inicio) / passo)) + 1
+        self.contagens = {}
+
+    @classmethod
+    def para_coluna(cls, coluna):
+        """
+        Cria um histograma com a grade da coluna de nota
+        Colunas sem grade em GRADE_NOTAS são recusadas (ValueError)
+        """
+        if coluna not in GRADE_NOTAS:
+            raise ValueError(f"Coluna sem grade de quantis: {coluna} (configuradas: {', '.join(GRADE_NOTAS)})")
+        return cls(*GRADE_NOTAS[coluna])
+
+    def _conferir_grade(self, outro):
+        if (outro.inicio, outro.passo, outro.n_faixas) != (self.inicio, self.passo, self.n_faixas):
+            raise ValueError("Histogramas com grades diferentes não podem ser combinados")
+
+    def valores_grade(self):
+        return self.inicio + np.arange(self.n_faixas) * self.passo
+
+    def adicionar(self, valores, grupos=None):
+        """
+        Acrescenta valores (nulos ignorados)
+        grupos: rótulo de grupo de cada valor (nulo = sem grupo)
+        """
+        valores = np.asarray(valores, dtype='float64')
+        validos = ~np.isnan(valores)
+        indices = np.clip(np.rint((valores[validos] - self.inicio) / self.passo), 0, self.n_faixas - 1)
+        indices = indices.astype(np.int64)
+
+        if grupos is None:
+            self._somar(None, np.bincount(indices, minlength=self.n_faixas))
+            return self
+
+        codigos, rotulos = pd.factorize(pd.Series(grupos)[validos], use_na_sentinel=True)
+        # Código -1 (grupo nulo) vai para a última posição
+        codigos = np.where(codigos < 0, len(rotulos), codigos)
+        matriz = np.bincount(
+            codigos * self.n_faixas + indices,
+            minlength=(len(rotulos) + 1) * self.n_faixas
+        ).reshape(len(rotulos) + 1, self.n_faixas)
+
+        for i, rotulo in enumerate(list(rotulos) + [None]):
+            if matriz[i].any():
+                self._somar(rotulo, matriz[i])
+
+        return self
+
+    def _somar(self, grupo, contagens):
+        if grupo in self.contagens:
+            self.contagens[grupo] = self.contagens[grupo] + contagens
+        else:
+            self.contagens[grupo] = contagens.astype(np.int64)
+
+    def combinar(self, outro):
+        """
+        Soma as contagens de outro histograma com a mesma grade
+        """
+        self._conferir_grade(outro)
+        for grupo, contagens in outro.contagens.items():
+            self._somar(grupo, contagens)
+        return self
+
+    def subtrair(self, outro):
+        """
+        Remove as contagens de outro histograma com a mesma grade (valores
+        que saíram dos dados); grupos que ficam vazios são descartados
+        """
+        self._conferir_grade(outro)
+        for grupo, contagens in outro.contagens.items():
+            self._somar(grupo, -contagens)
+            if not self.contagens[grupo].any():
+                del self.contagens[grupo]
+        return self
+
+    def grupos(self):
+        return [grupo for grupo in self.contagens if grupo is not None]
+
+    def contagens_grupo(self, grupo=None):
+        """
+        Contagens de um grupo; None = todos os valores (inclusive sem grupo)
+        """
+        if grupo is None:
+            if not self.contagens:
+                return np.zeros(self.n_faixas, dtype=np.int64)
+            return np.sum(list(self.contagens.values()), axis=0)
+        return self.contagens.get(grupo, np.zeros(self.n_faixas, dtype=np.int64))
+
+    def total(self, grupo=None):
+        return int(self.contagens_grupo(grupo).sum())
+
+    def quantil(self, q, grupo=None):
+        """
+        Quantil com interpolação linear (mesma definição do pandas)
+        """
+        contagens = self.contagens_grupo(grupo)
+        total = contagens.sum()
+        if total == 0:
+            return np.nan
+
+        acumulado = np.cumsum(contagens)
+        posicao = (total - 1) * q
+        anterior = int(np.floor(posicao))
+        fracao = posicao - anterior
+
+        grade = self.valores_grade()
+        baixo = grade[np.searchsorted(acumulado, anterior, side='right')]
+        if fracao == 0:
+            return float(baixo)
+
+        alto = grade[np.searchsorted(acumulado, anterior + 1, side='right')]
+        return float(baixo + fracao * (alto - baixo))
+
+    def contar_acima(self, limiar, grupo=None):
+        """
+        Quantidade de valores >= limiar
+        """
+        return int(self.contagens_grupo(grupo)[self.valores_grade() >= limiar].sum())
+
+    def resumo_acima(self, limiar):
+        """
+        Por grupo, quantidade, média e máximo dos valores >= limiar
+        """
+        grade = self.valores_grade()
+        selecao = grade >= limiar
+        linhas = {}
+
+        for grupo in self.grupos():
+            contagens = self.contagens[grupo][selecao]
+            quantidade = contagens.sum()
+            if quantidade == 0:
+                continue
+            linhas[grupo] = {
+                'Quantidade': int(quantidade),
+                'Media_Top': float((contagens * grade[selecao]).sum() / quantidade),
+                'Nota_Maxima': float(grade[selecao][np.flatnonzero(contagens)[-1]])
+            }
+
+        return pd.DataFrame.from_dict(linhas, orient='index', columns=['Quantidade', 'Media_Top', 'Nota_Maxima'])
+
+
+class MaioresPorGrupo:
+    """
+    Mantém as k linhas de maior valor de uma coluna em cada grupo
+    Memória limitada a k linhas por grupo mais o bloco em processamento
+    """
+
+    def __init__(self, coluna, chave, k=3, colunas_extra=()):
+        self.coluna = coluna
+        self.chave = chave
+        self.k = k
+        self.colunas = list(dict.fromkeys([chave, coluna, *colunas_extra]))
+        self.atuais = None
+
+    def _selecionar(self, dados):
+        dados = dados[dados[self.coluna].notna()]
+        ordenados = dados.sort_values(self.coluna, ascending=False, kind='stable')
+        return ordenados.groupby(self.chave, observed=True, dropna=True, sort=False).head(self.k)
+
+    def adicionar(self, dados):
+        """
+        Considera as linhas de um bloco de dados
+        """
+        colunas = [col for col in self.colunas if col in dados.columns]
+        candidatos = self._selecionar(dados[colunas])
+        if self.atuais is not None:
+            candidatos = self._selecionar(pd.concat([self.atuais, candidatos], ignore_index=True))
+        self.atuais = candidatos.reset_index(drop=True)
+        return self
+
+    def combinar(self, outro):
+        if outro.atuais is not None:
+            self.adicionar(outro.atuais)
+        return self
+
+    def resultado(self):
+        """
+        DataFrame com as k maiores linhas de cada grupo, ordenado por grupo
+        e valor decrescente
+        """
+        if self.atuais is None:
+            return pd.DataFrame(columns=self.colunas)
+        return self.atuais.sort_values([self.chave, self.coluna], ascending=[True, False]).reset_index(drop=True)
@@ -0,0 +1,192 @@
+"""
+Desempenho por resposta em todos os itens do questionário socioeconômico
+Cada item (Q001 a Q025) é codificado uma única vez em códigos inteiros
+(-1 = sem resposta), e os momentos das notas por resposta de todos os
+itens saem de uma única passagem pelas linhas: em cada fatia, as
+respostas viram uma matriz indicadora (uma coluna por item e resposta)
+multiplicada pela matriz de contagens, notas e quadrados das notas.
+O resultado é uma TabelaMomentos com as chaves (ITEM, RESPOSTA),
+combinável entre blocos; os itens podem ser divididos entre processos.
+Mínimo e máximo não são calculados (ficam nulos).
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from agregacao import TabelaMomentos
+from esquema import COLUNAS_QUESTIONARIO
+from paralelo import numero_processos
+
+CHAVES_QUESTIONARIO = ('ITEM', 'RESPOSTA')
+
+# Linhas por fatia da matriz indicadora (fatias pequenas ficam no cache)
+LINHAS_POR_FATIA = 4096
+
+# Códigos e notas herdados pelos processos filhos via fork
+_questionario_compartilhado = None
+
+
+def codificar_itens(dados, itens):
+    """
+    Códigos das respostas de cada item, calculados uma única vez
+    Retorna (códigos: array itens x linhas em int16, -1 = sem resposta;
+    respostas: lista com as categorias de cada item)
+    """
+    codigos = np.empty((len(itens), len(dados)), dtype=np.int16)
+    respostas = []
+    for i, item in enumerate(itens):
+        serie = dados[item]
+        if not isinstance(serie.dtype, pd.CategoricalDtype):
+            serie = serie.astype('category')
+        codigos[i] = serie.cat.codes.to_numpy()
+        respostas.append(serie.cat.categories)
+    return codigos, respostas
+
+
+def _somar_itens(indices, compartilhados=None):
+    """
+    Contagens, somas e somas dos quadrados por resposta dos itens indicados
+    Retorna array (respostas dos itens, 1 + 3 x colunas): participantes,
+    notas válidas, somas e somas dos quadrados
+    """
+    codigos, tamanhos, valores, linhas_por_fatia = compartilhados or _questionario_compartilhado
+    codigos = codigos[list(indices)]
+    n_colunas = valores.shape[1]
+
+    # Cada item ocupa 1 + respostas linhas da matriz indicadora (a primeira
+    # recebe quem deixou o item em branco, código -1), então a posição de
+    # cada marca sai direto do código, sem desvios
+    larguras = tamanhos[list(indices)] + 1
+    deslocamentos = np.cumsum(larguras) - larguras
+    base = deslocamentos[:, None] * linhas_por_fatia + np.arange(linhas_por_fatia)
+    indicadora = np.zeros((int(larguras.sum()), linhas_por_fatia))
+    marcas = indicadora.reshape(-1)
+
+    fatia = np.empty((linhas_por_fatia, 1 + 3 * n_colunas))
+    fatia[:, 0] = 1.0
+    acumulado = np.zeros((len(indicadora), fatia.shape[1]))
+
+    for inicio in range(0, valores.shape[0], linhas_por_fatia):
+        notas = valores[inicio:inicio + linhas_por_fatia]
+        linhas = len(notas)
+        somas = fatia[:linhas, 1 + n_colunas:1 + 2 * n_colunas]
+        faltam = np.isnan(notas)
+        np.logical_not(faltam, out=fatia[:linhas, 1:1 + n_colunas], casting='unsafe')
+        np.copyto(somas, notas)
+        np.copyto(somas, 0.0, where=faltam)
+        np.multiply(somas, somas, out=fatia[:linhas, 1 + 2 * n_colunas:])
+
+        posicoes = codigos[:, inicio:inicio + linhas] + np.int64(1)
+        posicoes *= linhas_por_fatia
+        posicoes += base[:, :linhas]
+        posicoes = posicoes.ravel()
+        marcas[posicoes] = 1.0
+        acumulado += indicadora[:, :linhas] @ fatia[:linhas]
+        marcas[posicoes] = 0.0
+
+    # Descartar as linhas das respostas em branco
+    return np.delete(acumulado, deslocamentos, axis=0)
+
+
+def momentos_questionario(dados, colunas, itens=None, n_processos=1, linhas_por_fatia=LINHAS_POR_FATIA):
+    """
+    Momentos das colunas por resposta de cada item do questionário
+    colunas: colunas numéricas (nulos são ignorados)
+    itens: colunas do questionário (None = as de COLUNAS_QUESTIONARIO presentes)
+    n_processos: processos entre os quais os itens são divididos
+    Respostas em branco são descartadas
+    Retorna TabelaMomentos com as chaves (ITEM, RESPOSTA), ou None sem itens
+    """
+    global _questionario_compartilhado
+
+    itens = [item for item in (itens or COLUNAS_QUESTIONARIO) if item in dados.columns]
+    colunas = list(colunas)
+    if not itens:
+        return None
+
+    codigos, respostas = codificar_itens(dados, itens)
+    tamanhos = np.array([len(categorias) for categorias in respostas], dtype=np.int64)
+    valores = dados[colunas].to_numpy(dtype=np.float64, na_value=np.nan)
+    compartilhados = (codigos, tamanhos, valores, max(min(len(dados), linhas_por_fatia), 1))
+
+    # Itens divididos em grupos com números parecidos de respostas
+    n_processos = min(numero_processos(n_processos), len(itens))
+    grupos = [list(grupo) for grupo in np.array_split(np.arange(len(itens)), n_processos)]
+    if n_processos == 1:
+        partes = [_somar_itens(grupos[0], compartilhados)]
+    elif 'fork' in multiprocessing.get_all_start_methods():
+        _questionario_compartilhado = compartilhados
+        try:
+            contexto = multiprocessing.get_context('fork')
+            with ProcessPoolExecutor(n_processos, mp_context=contexto) as executor:
+                partes = list(executor.map(_somar_itens, grupos))
+        finally:
+            _questionario_compartilhado = None
+    else:
+        with ProcessPoolExecutor(n_processos) as executor:
+            partes = list(executor.map(_somar_itens, grupos, [compartilhados] * len(grupos)))
+
+    somas = np.concatenate(partes)
+    indice = pd.MultiIndex.from_arrays([
+        np.repeat(np.array(itens, dtype=object), tamanhos),
+        np.concatenate([np.asarray(categorias, dtype=object) for categorias in respostas]),
+    ], names=list(CHAVES_QUESTIONARIO))
+
+    # Respostas que não aparecem nos dados são descartadas
+    presentes = somas[:, 0] > 0
+    indice = indice[presentes]
+    somas = somas[presentes]
+
+    def tabela(inicio, tipo=np.float64):
+        return pd.DataFrame(somas[:, inicio:inicio + len(colunas)], index=indice, columns=colunas).astype(tipo)
+
+    nulos = pd.DataFrame(np.nan, index=indice, columns=colunas)
+    return TabelaMomentos(
+        CHAVES_QUESTIONARIO,
+        participantes=pd.Series(somas[:, 0].astype(np.int64), index=indice),
+        n=tabela(1, np.int64),
+        soma=tabela(1 + len(colunas)),
+        soma_q=tabela(1 + 2 * len(colunas)),
+        minimo=nulos,
+        maximo=nulos.copy()
+    )
+
+
+def tabela_questionario(momentos, itens=None):
+    """
+    Médias das notas, média geral e participantes por resposta de cada item
+    itens: item ou lista de itens (None = todos)
+    """
+    tabela = momentos.media().round(1)
+    tabela['MEDIA_GERAL'] = tabela.mean(axis=1).round(1)
+    tabela['PARTICIPANTES'] = momentos.participantes
+
+    if itens is not None:
+        itens = [itens] if isinstance(itens, str) else list(itens)
+        tabela = tabela[tabela.index.get_level_values('ITEM').isin(itens)]
+
+    return tabela
+
+
+def amplitude_itens(momentos, min_participantes=1):
+    """
+    Diferença entre a maior e a menor média geral das respostas de cada
+    item (respostas com pelo menos min_participantes), da maior para a menor
+    Retorna DataFrame com a amplitude e as respostas extremas de cada item
+    """
+    tabela = tabela_questionario(momentos)
+    tabela = tabela[tabela['PARTICIPANTES'] >= min_participantes].dropna(subset=['MEDIA_GERAL'])
+    grupos = tabela['MEDIA_GERAL'].groupby(level='ITEM', sort=False)
+    menores, maiores = grupos.min(), grupos.max()
+
+    resultado = pd.DataFrame({
+        'AMPLITUDE': (maiores - menores).round(1),
+        'RESPOSTA_MENOR': [resposta for _, resposta in grupos.idxmin()],
+        'MENOR_MEDIA': menores,
+        'RESPOSTA_MAIOR': [resposta for _, resposta in grupos.idxmax()],
+        'MAIOR_MEDIA': maiores,
+    })
+    return resultado.sort_values('AMPLITUDE', ascending=False)
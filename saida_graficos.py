@@ -0,0 +1,131 @@
+"""
+Gravação dos gráficos das análises
+Cada HTML gerado pelo pyo.plot embute o plotly.js inteiro (alguns MB); os
+formatos abaixo evitam repetir o bundle ou gravam só os dados:
+
+    'html'          um HTML independente por gráfico (bundle embutido em cada um)
+    'compartilhado' um HTML por gráfico referenciando plotly.min.js na pasta,
+                    gravado apenas uma vez
+    'relatorio'     um único HTML com todos os gráficos e o bundle uma vez
+    'json'          apenas as especificações das figuras (plotly JSON)
+    'png' / 'svg'   imagens estáticas (requer o pacote kaleido)
+"""
+
+import importlib.util
+import os
+
+import numpy as np
+
+FORMATOS_GRAFICOS = ('html', 'compartilhado', 'relatorio', 'json', 'png', 'svg')
+
+# Pontos por série acima dos quais a figura é reduzida antes de gravar
+MAX_PONTOS = 5000
+
+# Atributos de um trace com um valor por ponto
+_ATRIBUTOS_POR_PONTO = ('x', 'y', 'text', 'hovertext', 'customdata', 'ids')
+
+
+def kaleido_disponivel():
+    """
+    Indica se o kaleido (exportação de imagens estáticas) está instalado
+    """
+    return importlib.util.find_spec('kaleido') is not None
+
+
+def reduzir_figura(fig, max_pontos=MAX_PONTOS):
+    """
+    Reduz séries de dispersão/linha com mais de max_pontos pontos por
+    amostragem em passo fixo (mantém o primeiro e o último ponto)
+    Retorna a própria figura se nada precisar ser reduzido
+    """
+    grandes = [
+        i for i, trace in enumerate(fig.data)
+        if trace.type in ('scatter', 'scattergl') and trace.x is not None and len(trace.x) > max_pontos
+    ]
+    if not grandes:
+        return fig
+
+    fig = fig.__class__(fig)
+    for i in grandes:
+        trace = fig.data[i]
+        indices = np.unique(np.linspace(0, len(trace.x) - 1, max_pontos).astype(int))
+        atualizacao = {}
+        for atributo in _ATRIBUTOS_POR_PONTO:
+            valores = trace[atributo]
+            if valores is not None and not isinstance(valores, str) and len(valores) == len(trace.x):
+                atualizacao[atributo] = np.asarray(valores)[indices]
+
+        tamanho = trace.marker.size if trace.marker is not None else None
+        if tamanho is not None and not np.isscalar(tamanho) and len(tamanho) == len(trace.x):
+            atualizacao['marker.size'] = np.asarray(tamanho)[indices]
+
+        trace.update(atualizacao)
+
+    return fig
+
+
+def _relatorio_html(figuras, titulo):
+    partes = []
+    for i, (_, fig) in enumerate(figuras):
+        # Apenas o primeiro gráfico carrega o plotly.js
+        partes.append(fig.to_html(full_html=False, include_plotlyjs=(i == 0)))
+
+    return (
+        '<!DOCTYPE html>\n<html>\n<head><meta charset="utf-8" />'
+        f'<title>{titulo}</title></head>\n<body>\n'
+        f'<h1>{titulo}</h1>\n' + '\n'.join(partes) + '\n</body>\n</html>\n'
+    )
+
+
+def salvar_figuras(figuras, pasta_saida, formato='compartilhado', titulo='Relatório ENEM',
+                   max_pontos=MAX_PONTOS):
+    """
+    Grava as figuras no formato pedido
+    figuras: lista de (nome do arquivo sem extensão, figura)
+    Retorna a lista de (nome do arquivo, bytes gravados)
+    """
+    if formato not in FORMATOS_GRAFICOS:
+        raise ValueError(f"Formato de gráficos desconhecido: {formato}")
+
+    if formato in ('png', 'svg') and not kaleido_disponivel():
+        raise RuntimeError("Imagens estáticas requerem o pacote kaleido (pip install kaleido)")
+
+    os.makedirs(pasta_saida, exist_ok=True)
+    figuras = [(nome, reduzir_figura(fig, max_pontos)) for nome, fig in figuras]
+    gravados = []
+
+    if formato == 'relatorio':
+        nome = 'relatorio_enem.html'
+        conteudo = _relatorio_html(figuras, titulo).encode('utf-8')
+        # Uma única escrita por arquivo (mais rápido em sistemas de arquivos de rede)
+        with open(os.path.join(pasta_saida, nome), 'wb') as arquivo:
+            arquivo.write(conteudo)
+        return [(nome, len(conteudo))]
+
+    for nome, fig in figuras:
+        if formato == 'json':
+            nome_arquivo = nome + '.json'
+            conteudo = fig.to_json().encode('utf-8')
+        elif formato in ('png', 'svg'):
+            nome_arquivo = f'{nome}.{formato}'
+            conteudo = fig.to_image(format=formato)
+        else:
+            nome_arquivo = nome + '.html'
+            incluir = True if formato == 'html' else 'directory'
+            conteudo = fig.to_html(full_html=True, include_plotlyjs=incluir).encode('utf-8')
+
+        with open(os.path.join(pasta_saida, nome_arquivo), 'wb') as arquivo:
+            arquivo.write(conteudo)
+        gravados.append((nome_arquivo, len(conteudo)))
+
+    if formato == 'compartilhado' and figuras:
+        # Bundle gravado só na primeira vez (include_plotlyjs='directory')
+        bundle = os.path.join(pasta_saida, 'plotly.min.js')
+        if not os.path.exists(bundle):
+            from plotly.offline import get_plotlyjs
+            conteudo = get_plotlyjs().encode('utf-8')
+            with open(bundle, 'wb') as arquivo:
+                arquivo.write(conteudo)
+            gravados.append(('plotly.min.js', len(conteudo)))
+
+    return gravados
@@ -0,0 +1,384 @@
+"""
+Servidor HTTP das análises
+Mantém um ENEMAnalyzer com os dados já processados em memória e responde
+cada análise em JSON, sem reimportar bibliotecas nem reler o arquivo a
+cada pedido. As respostas ficam em um cache LRU por endpoint e parâmetros.
+As consultas filtradas usam os índices de consulta.py, que só leem os
+dados (sem cópia), e são atendidas em paralelo; as análises, que completam
+agregados sob demanda, são calculadas uma de cada vez.
+
+    GET /saude                              estado do servidor e do cache
+    GET /analises                           endpoints disponíveis
+    GET /estatisticas_gerais                totais, médias e distribuições
+    GET /analise_1_desempenho_por_estado    (e demais analise_*) figura plotly em JSON
+    GET /consulta?REGIAO=Nordeste&COR_RACA=Parda&por=SG_UF_ESC
+    GET /maiores?SG_UF_ESC=PE&k=10&coluna=NU_NOTA_REDACAO
+
+Filtros com vários valores repetem o parâmetro (SG_UF_ESC=PE&SG_UF_ESC=BA).
+"""
+
+import argparse
+import json
+import math
+import os
+import socket
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from esquema import ANALISES
+from main import ENEMAnalyzer, resolver_analises
+
+
+class ErroConsulta(Exception):
+    """
+    Pedido inválido (respondido com o código HTTP informado)
+    """
+
+    def __init__(self, mensagem, status=400):
+        super().__init__(mensagem)
+        self.status = status
+
+
+class CacheLRU:
+    """
+    Cache dos resultados com descarte do item usado há mais tempo
+    Pedidos simultâneos com a mesma chave podem calcular o valor mais de
+    uma vez, mas o cache nunca fica inconsistente
+    """
+
+    def __init__(self, tamanho_max=256):
+        self.tamanho_max = tamanho_max
+        self.itens = OrderedDict()
+        self.trava = threading.Lock()
+        self.acertos = 0
+        self.faltas = 0
+
+    def obter(self, chave, calcular):
+        """
+        Valor da chave, calculado por calcular() na primeira vez
+        """
+        with self.trava:
+            if chave in self.itens:
+                self.itens.move_to_end(chave)
+                self.acertos += 1
+                return self.itens[chave]
+            self.faltas += 1
+
+        valor = calcular()
+
+        with self.trava:
+            self.itens[chave] = valor
+            self.itens.move_to_end(chave)
+            while len(self.itens) > self.tamanho_max:
+                self.itens.popitem(last=False)
+
+        return valor
+
+    def estado(self):
+        with self.trava:
+            return {'itens': len(self.itens), 'tamanho_max': self.tamanho_max,
+                    'acertos': self.acertos, 'faltas': self.faltas}
+
+
+def _limpar(valor):
+    """
+    Converte tipos do NumPy/pandas em tipos do JSON (NaN vira null)
+    """
+    if isinstance(valor, dict):
+        return {str(chave): _limpar(item) for chave, item in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [_limpar(item) for item in valor]
+    if isinstance(valor, (np.integer, np.bool_)):
+        return valor.item()
+    if isinstance(valor, (float, np.floating)):
+        valor = float(valor)
+        return None if math.isnan(valor) else valor
+    if valor is pd.NA or valor is pd.NaT:
+        return None
+    return valor
+
+
+def _momentos_json(momentos):
+    """
+    Linhas de uma TabelaMomentos (um item por grupo)
+    """
+    medias = momentos.media()
+    desvios = momentos.desvio()
+    grupos = []
+    for grupo in momentos.participantes.index:
+        grupos.append({
+            'grupo': grupo if momentos.chaves else None,
+            'participantes': momentos.participantes[grupo],
+            'n': momentos.n.loc[grupo].to_dict(),
+            'media': medias.loc[grupo].round(2).to_dict(),
+            'desvio': desvios.loc[grupo].round(2).to_dict(),
+            'minimo': momentos.minimo.loc[grupo].to_dict(),
+            'maximo': momentos.maximo.loc[grupo].to_dict(),
+        })
+    return grupos
+
+
+class ServicoAnalises:
+    """
+    Respostas dos endpoints a partir de um ENEMAnalyzer já processado
+    """
+
+    def __init__(self, analisador, tamanho_cache=256):
+        self.analisador = analisador
+        self.cache = CacheLRU(tamanho_cache)
+        self.trava_analises = threading.Lock()
+        self.inicio = time.time()
+
+    def endpoints(self):
+        return ['saude', 'analises', 'consulta', 'maiores'] + list(self.analisador.analises)
+
+    def aquecer(self):
+        """
+        Calcula todas as análises e os índices de consulta antes de atender
+        pedidos (os agregados ficam prontos e o cache já começa preenchido)
+        """
+        for analise in self.analisador.analises:
+            self.responder('/' + analise, {})
+        if self.analisador.dados is not None:
+            self.analisador._indice_consulta()
+
+    def responder(self, caminho, parametros):
+        """
+        Corpo JSON (bytes) da resposta a um pedido
+        Erros de pedido geram ErroConsulta
+        """
+        nome = caminho.strip('/') or 'analises'
+
+        if nome == 'saude':
+            return self._json(self._saude())
+
+        chave = (nome, tuple(sorted((campo, tuple(valores)) for campo, valores in parametros.items())))
+        return self.cache.obter(chave, lambda: self._json(self._calcular(nome, parametros)))
+
+    def _json(self, resultado):
+        return json.dumps(_limpar(resultado), ensure_ascii=False).encode('utf-8')
+
+    def _saude(self):
+        return {
+            'arquivo': self.analisador.arquivo_dados,
+            'registros': self.analisador.total_registros,
+            'dados_em_memoria': self.analisador.dados is not None,
+            'ativo_ha_s': round(time.time() - self.inicio, 1),
+            'cache': self.cache.estado(),
+        }
+
+    def _calcular(self, nome, parametros):
+        if nome == 'analises':
+            return {'endpoints': self.endpoints()}
+        if nome == 'consulta':
+            return self._consulta(parametros)
+        if nome == 'maiores':
+            return self._maiores(parametros)
+        if nome not in self.analisador.analises:
+            raise ErroConsulta(f"Endpoint desconhecido: /{nome}", 404)
+
+        # As análises completam agregados e histogramas sob demanda
+        with self.trava_analises:
+            if nome == 'estatisticas_gerais':
+                return {'analise': nome, 'resultado': self.analisador.resumo_geral()}
+            figura = getattr(self.analisador, nome)()
+
+        if figura is None:
+            raise ErroConsulta(f"A análise {nome} não tem resultado para os dados carregados", 404)
+        return {'analise': nome, 'figura': json.loads(figura.to_json())}
+
+    def _indice(self):
+        if self.analisador.dados is None:
+            raise ErroConsulta("Consultas requerem o servidor no modo 'memoria'", 409)
+        with self.trava_analises:
+            return self.analisador._indice_consulta()
+
+    def _filtros(self, indice, parametros, reservados):
+        filtros = {}
+        for dimensao, valores in parametros.items():
+            if dimensao in reservados:
+                continue
+            if dimensao not in indice.codigos:
+                raise ErroConsulta(f"Dimensão não indexada: {dimensao} (opções: {', '.join(indice.dimensoes)})")
+            # Dimensões numéricas (ex.: ANO) chegam como texto na URL
+            if pd.api.types.is_numeric_dtype(indice.categorias[dimensao].dtype):
+                try:
+                    valores = [pd.to_numeric(valor) for valor in valores]
+                except ValueError:
+                    raise ErroConsulta(f"Valor numérico inválido em {dimensao}: {valores}")
+            filtros[dimensao] = valores
+        return filtros
+
+    def _consulta(self, parametros):
+        indice = self._indice()
+        por = parametros.get('por', [None])[0]
+        colunas = parametros.get('colunas')
+        filtros = self._filtros(indice, parametros, ('por', 'colunas'))
+        try:
+            momentos = indice.agregar(filtros, por, colunas)
+        except ValueError as e:
+            raise ErroConsulta(str(e))
+        return {'filtros': filtros, 'por': por, 'grupos': _momentos_json(momentos)}
+
+    def _maiores(self, parametros):
+        indice = self._indice()
+        coluna = parametros.get('coluna', ['NU_NOTA_REDACAO'])[0]
+        try:
+            k = int(parametros.get('k', ['10'])[0])
+        except ValueError:
+            raise ErroConsulta("k deve ser um número inteiro")
+
+        filtros = self._filtros(indice, parametros, ('coluna', 'k'))
+        try:
+            registros = indice.maiores(filtros, coluna, k)
+        except ValueError as e:
+            raise ErroConsulta(str(e))
+
+        colunas = [col for col in indice.dimensoes + list(indice.valores) if col in registros.columns]
+        registros = registros[colunas].astype(object).where(registros[colunas].notna(), None)
+        return {'filtros': filtros, 'coluna': coluna, 'k': k, 'registros': registros.to_dict(orient='records')}
+
+
+class ManipuladorAnalises(BaseHTTPRequestHandler):
+    """
+    Atende GET nos endpoints do ServicoAnalises (self.server.servico)
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        inicio = time.perf_counter()
+        url = urlsplit(self.path)
+        try:
+            corpo = self.server.servico.responder(url.path, parse_qs(url.query))
+            status = 200
+        except ErroConsulta as e:
+            corpo, status = json.dumps({'erro': str(e)}, ensure_ascii=False).encode('utf-8'), e.status
+        except Exception as e:
+            corpo, status = json.dumps({'erro': f"Erro interno: {e}"}, ensure_ascii=False).encode('utf-8'), 500
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.send_header('X-Tempo-ms', f"{(time.perf_counter() - inicio) * 1000:.2f}")
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, formato, *args):
+        if self.server.verbose:
+            print(f"🌐 {formato % args}")
+
+    def address_string(self):
+        # Em socket Unix o endereço do cliente é vazio
+        return self.client_address[0] if self.client_address else 'unix'
+
+
+class ServidorAnalises(ThreadingHTTPServer):
+    """
+    Servidor HTTP com uma thread por conexão
+    """
+
+    daemon_threads = True
+
+    def __init__(self, endereco, servico, verbose=True):
+        self.servico = servico
+        self.verbose = verbose
+        super().__init__(endereco, ManipuladorAnalises)
+
+
+class ServidorAnalisesUnix(ServidorAnalises):
+    """
+    Mesmo servidor em um socket Unix (sem porta TCP exposta)
+    """
+
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        socketserver.TCPServer.server_bind(self)
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+
+def preparar_analisador(arquivo, analises=None, modo='memoria', amostra=None, n_processos=1,
+                        tamanho_bloco=500_000, verbose=True):
+    """
+    Carrega e processa os dados uma única vez para o servidor
+    Retorna o ENEMAnalyzer pronto ou None se a carga falhar
+    """
+    analisador = ENEMAnalyzer(arquivo, analises=analises, n_processos=n_processos, verbose=verbose)
+
+    if modo == 'blocos':
+        sucesso = analisador.processar_em_blocos(amostra, tamanho_bloco)
+    elif modo == 'cubo':
+        sucesso = analisador.carregar_cubo(amostra, tamanho_bloco)
+    else:
+        sucesso = analisador.carregar_dados(amostra, tamanho_bloco=tamanho_bloco) and analisador.processar_dados()
+
+    if not sucesso:
+        return None
+
+    # As mensagens das análises não aparecem nas respostas
+    analisador.verbose = False
+    return analisador
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor HTTP das análises do ENEM (dados mantidos em memória)')
+    parser.add_argument('arquivo', nargs='?', default='MICRODADOS_ENEM_2023.csv', help='arquivo CSV de microdados')
+    parser.add_argument('--host', default='127.0.0.1', help='endereço de escuta')
+    parser.add_argument('--porta', type=int, default=8050, help='porta TCP')
+    parser.add_argument('--unix', metavar='CAMINHO', help='escuta em um socket Unix em vez de TCP')
+    parser.add_argument('--modo', choices=['memoria', 'blocos', 'cubo'], default='memoria',
+                        help="'memoria' permite consultas filtradas; 'blocos' e 'cubo' mantêm só agregados")
+    parser.add_argument('--analises', nargs='+', metavar='ANALISE', help='análises expostas (padrão: todas)')
+    parser.add_argument('--amostra', type=int, help='número de registros da amostra')
+    parser.add_argument('--processos', type=int, default=1, help='processos da agregação inicial')
+    parser.add_argument('--tamanho-bloco', type=int, default=500_000, help='linhas por bloco')
+    parser.add_argument('--cache-max', type=int, default=256, help='respostas mantidas no cache LRU')
+    parser.add_argument('--silencioso', action='store_true', help='não registra os pedidos')
+    args = parser.parse_args()
+
+    try:
+        analises = resolver_analises(args.analises) if args.analises else list(ANALISES)
+    except ValueError as e:
+        parser.error(str(e))
+
+    analisador = preparar_analisador(args.arquivo, analises, args.modo, args.amostra, args.processos,
+                                     args.tamanho_bloco, verbose=not args.silencioso)
+    if analisador is None:
+        raise SystemExit(1)
+
+    servico = ServicoAnalises(analisador, args.cache_max)
+    print("🔥 Calculando as análises antes de atender pedidos...")
+    inicio = time.perf_counter()
+    servico.aquecer()
+    print(f"✅ Pronto em {time.perf_counter() - inicio:.1f}s")
+
+    if args.unix:
+        servidor = ServidorAnalisesUnix(args.unix, servico, verbose=not args.silencioso)
+        print(f"🌐 Atendendo em unix:{args.unix}")
+    else:
+        servidor = ServidorAnalises((args.host, args.porta), servico, verbose=not args.silencioso)
+        print(f"🌐 Atendendo em http://{args.host}:{args.porta}/analises")
+
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Servidor encerrado")
+    finally:
+        servidor.server_close()
+        if args.unix and os.path.exists(args.unix):
+            os.remove(args.unix)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Testes dos momentos combináveis: partes combinadas dão o mesmo que o
+cálculo direto e as médias e desvios batem com o groupby do pandas
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agregacao import TabelaMomentos
+
+
+def dados_exemplo(n=2000, semente=1):
+    rng = np.random.default_rng(semente)
+    dados = pd.DataFrame({
+        'SEXO': pd.Categorical(rng.choice(['Feminino', 'Masculino'], n)),
+        'REGIAO': pd.Categorical(rng.choice(['Norte', 'Sul', 'Sudeste', None], n)),
+        'NU_NOTA_MT': rng.normal(520, 100, n).round(1),
+        'NU_NOTA_REDACAO': rng.integers(0, 51, n) * 20.0,
+    })
+    dados.loc[rng.random(n) < 0.2, 'NU_NOTA_MT'] = np.nan
+    return dados
+
+
+class TestTabelaMomentos(unittest.TestCase):
+
+    def setUp(self):
+        self.dados = dados_exemplo()
+        self.chaves = ('SEXO', 'REGIAO')
+        self.colunas = ['NU_NOTA_MT', 'NU_NOTA_REDACAO']
+
+    def assertTabelasIguais(self, obtida, esperada):
+        for atributo in ('participantes', 'n', 'soma', 'soma_q', 'minimo', 'maximo'):
+            a = getattr(obtida, atributo).sort_index()
+            b = getattr(esperada, atributo).sort_index()
+            self.assertTrue(a.index.equals(b.index), atributo)
+            np.testing.assert_allclose(a.to_numpy(dtype=float), b.to_numpy(dtype=float), rtol=1e-12,
+                                       err_msg=atributo)
+
+    def test_combinar_partes_igual_ao_total(self):
+        for dropna in (True, False):
+            partes = [
+                TabelaMomentos.calcular(parte, self.chaves, self.colunas, dropna=dropna)
+                for parte in (self.dados.iloc[:500], self.dados.iloc[500:1300], self.dados.iloc[1300:])
+            ]
+            total = TabelaMomentos.calcular(self.dados, self.chaves, self.colunas, dropna=dropna)
+            self.assertTabelasIguais(TabelaMomentos.combinar(partes), total)
+
+    def test_media_e_desvio_iguais_ao_pandas(self):
+        momentos = TabelaMomentos.calcular(self.dados, self.chaves, self.colunas)
+        agrupados = self.dados.groupby(list(self.chaves), observed=True)[self.colunas]
+        pd.testing.assert_frame_equal(momentos.media(), agrupados.mean(), check_names=False)
+        pd.testing.assert_frame_equal(momentos.desvio(), agrupados.std(), check_names=False)
+        pd.testing.assert_series_equal(momentos.participantes, agrupados.size(), check_names=False)
+
+    def test_agrupar_igual_ao_calculo_direto(self):
+        fina = TabelaMomentos.calcular(self.dados, self.chaves, self.colunas, dropna=False)
+        self.assertTabelasIguais(fina.agrupar(['SEXO']), TabelaMomentos.calcular(self.dados, ['SEXO'], self.colunas))
+        self.assertTabelasIguais(fina.agrupar([]), TabelaMomentos.calcular(self.dados, [], self.colunas))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+"""
+Testes do benchmark: cada arquivo de gráfico deve receber a figura da
+análise correspondente
+"""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark import executar_rodada
+from gerador_sintetico import gerar_microdados
+
+TITULOS_ESPERADOS = {
+    '01_desempenho_por_estado.json': 'Desempenho Médio por Estado e Região',
+    '02_desempenho_socioeconomico.json': 'Desempenho por',
+    '03_maiores_notas_redacao.json': 'Top 5% Notas de Redação por Estado',
+    '04_comparacao_por_genero.json': 'Comparação de Desempenho por Gênero',
+    '05_desempenho_faixa_etaria.json': 'Desempenho por Faixa Etária',
+}
+
+
+class TestExecutarRodada(unittest.TestCase):
+
+    def test_arquivos_recebem_a_figura_da_analise(self):
+        with tempfile.TemporaryDirectory() as pasta:
+            arquivo = gerar_microdados(os.path.join(pasta, 'microdados.csv'), 2000)
+            pasta_graficos = os.path.join(pasta, 'graficos')
+            medicoes = executar_rodada(arquivo, pasta_graficos, formato_graficos='json')
+
+            self.assertIn('estatisticas_gerais', [medicao['etapa'] for medicao in medicoes])
+            self.assertEqual(sorted(os.listdir(pasta_graficos)), sorted(TITULOS_ESPERADOS))
+            for nome, titulo in TITULOS_ESPERADOS.items():
+                with open(os.path.join(pasta_graficos, nome), encoding='utf-8') as entrada:
+                    figura = json.load(entrada)
+                self.assertTrue(figura['layout']['title']['text'].startswith(titulo), nome)
+
+
+if __name__ == '__main__':
+    unittest.main()
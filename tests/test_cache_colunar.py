@@ -0,0 +1,40 @@
+"""
+Testes do cache colunar: com o cache criado, a amostra das primeiras
+linhas continua a mesma da leitura do CSV
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache_colunar import pyarrow_disponivel
+from gerador_sintetico import gerar_microdados
+from main import ENEMAnalyzer
+
+
+@unittest.skipUnless(pyarrow_disponivel(), 'requer pyarrow')
+class TestAmostraComCache(unittest.TestCase):
+
+    def test_amostra_nao_depende_do_cache(self):
+        with tempfile.TemporaryDirectory() as pasta:
+            arquivo = gerar_microdados(os.path.join(pasta, 'microdados.csv'), 5000)
+            sem_cache = ENEMAnalyzer(arquivo, verbose=False)
+            self.assertTrue(sem_cache.carregar_dados(amostra=1000))
+
+            com_cache = ENEMAnalyzer(arquivo, verbose=False)
+            self.assertTrue(com_cache.criar_cache(tamanho_bloco=2000))
+            self.assertTrue(com_cache.carregar_dados(amostra=1000))
+
+            pd.testing.assert_frame_equal(com_cache.dados, sem_cache.dados)
+            self.assertTrue(com_cache.processar_em_blocos(amostra=1000, tamanho_bloco=300))
+            self.assertTrue(sem_cache.processar_dados())
+            self.assertEqual(com_cache.total_registros, sem_cache.total_registros)
+
+
+if __name__ == '__main__':
+    unittest.main()
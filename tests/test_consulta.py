@@ -0,0 +1,74 @@
+"""
+Testes das consultas indexadas, comparadas com filtros e groupby do pandas
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from consulta import IndiceConsulta
+
+
+class TestIndiceConsulta(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(11)
+        n = 4000
+        self.dados = pd.DataFrame({
+            'SEXO': pd.Categorical(rng.choice(['Feminino', 'Masculino'], n)),
+            'SG_UF_ESC': pd.Categorical(rng.choice(['SP', 'RJ', 'BA', 'PE', None], n)),
+            'TIPO_ESCOLA': rng.choice(['Pública', 'Privada', None], n),
+            'NU_NOTA_MT': rng.normal(520, 100, n).round(1),
+            'NU_NOTA_REDACAO': rng.integers(0, 51, n) * 20.0,
+        })
+        self.dados.loc[rng.random(n) < 0.15, 'NU_NOTA_MT'] = np.nan
+        self.indice = IndiceConsulta(self.dados)
+
+    def mascara(self, filtros):
+        mascara = np.ones(len(self.dados), dtype=bool)
+        for dimensao, valores in filtros.items():
+            valores = valores if isinstance(valores, list) else [valores]
+            mascara &= self.dados[dimensao].isin(valores).to_numpy()
+        return mascara
+
+    def test_linhas_e_contagem(self):
+        for filtros in ({'SEXO': 'Feminino'}, {'SG_UF_ESC': ['SP', 'PE'], 'TIPO_ESCOLA': 'Privada'},
+                        {'SEXO': 'Masculino', 'SG_UF_ESC': 'BA', 'TIPO_ESCOLA': ['Pública', 'Privada']}):
+            esperadas = np.flatnonzero(self.mascara(filtros))
+            np.testing.assert_array_equal(self.indice.linhas(filtros), esperadas)
+            self.assertEqual(self.indice.contar(filtros), len(esperadas))
+        self.assertEqual(self.indice.contar(), len(self.dados))
+
+    def test_agregar_igual_ao_groupby(self):
+        colunas = ['NU_NOTA_MT', 'NU_NOTA_REDACAO']
+        filtros = {'SEXO': 'Feminino', 'TIPO_ESCOLA': 'Pública'}
+        filtrados = self.dados[self.mascara(filtros)]
+
+        momentos = self.indice.agregar(filtros, por='SG_UF_ESC', colunas=colunas)
+        agrupados = filtrados.groupby('SG_UF_ESC', observed=True)[colunas]
+        for obtida, esperada in ((momentos.media(), agrupados.mean()), (momentos.maximo, agrupados.max())):
+            pd.testing.assert_frame_equal(obtida.set_axis(obtida.index.astype(object)),
+                                          esperada.set_axis(esperada.index.astype(object)), check_names=False)
+        np.testing.assert_array_equal(momentos.participantes.to_numpy(), agrupados.size().to_numpy())
+
+        total = self.indice.agregar(colunas=colunas)
+        np.testing.assert_allclose(total.media().iloc[0].to_numpy(), self.dados[colunas].mean().to_numpy())
+
+    def test_maiores(self):
+        filtros = {'SG_UF_ESC': 'RJ'}
+        maiores = self.indice.maiores(filtros, 'NU_NOTA_MT', k=7)
+        esperados = self.dados[self.mascara(filtros)]['NU_NOTA_MT'].nlargest(7)
+        np.testing.assert_array_equal(maiores['NU_NOTA_MT'].to_numpy(), esperados.to_numpy())
+
+    def test_valor_inexistente(self):
+        with self.assertRaises(ValueError):
+            self.indice.linhas({'SG_UF_ESC': 'XX'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+"""
+Testes das estatísticas inferenciais calculadas a partir dos momentos
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agregacao import TabelaMomentos
+from estatisticas import bootstrap_medias, comparar, intervalos, quantil_normal
+
+
+class TestEstatisticas(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(5)
+        n = 6000
+        self.dados = pd.DataFrame({
+            'SEXO': rng.choice(['Feminino', 'Masculino'], n),
+            'REGIAO': rng.choice(['Norte', 'Sul', 'Sudeste'], n),
+            'NU_NOTA_MT': rng.normal(520, 100, n),
+        })
+        self.dados.loc[self.dados['SEXO'] == 'Masculino', 'NU_NOTA_MT'] += 15
+        self.dados.loc[rng.random(n) < 0.1, 'NU_NOTA_MT'] = np.nan
+
+    def test_intervalos(self):
+        momentos = TabelaMomentos.calcular(self.dados, ['REGIAO'], ['NU_NOTA_MT'])
+        tabela = intervalos(momentos, 0.95)['NU_NOTA_MT']
+        agrupados = self.dados.groupby('REGIAO')['NU_NOTA_MT']
+        erro = agrupados.std() / np.sqrt(agrupados.count())
+
+        np.testing.assert_allclose(tabela['media'], agrupados.mean())
+        np.testing.assert_allclose(tabela['erro_padrao'], erro)
+        np.testing.assert_allclose(tabela['ic_inferior'], agrupados.mean() - quantil_normal(0.95) * erro)
+        self.assertAlmostEqual(quantil_normal(0.95), 1.959964, places=5)
+
+    def test_comparar(self):
+        momentos = TabelaMomentos.calcular(self.dados, ['REGIAO', 'SEXO'], ['NU_NOTA_MT'])
+        tabela = comparar(momentos, 'SEXO', 'Feminino')['NU_NOTA_MT']
+
+        for regiao, grupo in self.dados.groupby('REGIAO'):
+            a = grupo.loc[grupo['SEXO'] == 'Masculino', 'NU_NOTA_MT'].dropna()
+            b = grupo.loc[grupo['SEXO'] == 'Feminino', 'NU_NOTA_MT'].dropna()
+            combinado = np.sqrt(((len(a) - 1) * a.var() + (len(b) - 1) * b.var()) / (len(a) + len(b) - 2))
+            linha = tabela.loc[(regiao, 'Masculino')]
+            self.assertAlmostEqual(linha['diferenca'], a.mean() - b.mean(), places=8)
+            self.assertAlmostEqual(linha['erro_padrao'], np.sqrt(a.var() / len(a) + b.var() / len(b)), places=8)
+            self.assertAlmostEqual(linha['cohen_d'], (a.mean() - b.mean()) / combinado, places=8)
+
+        with self.assertRaises(ValueError):
+            comparar(momentos, 'SEXO', 'Outro')
+
+    def test_bootstrap_medias(self):
+        tabela = bootstrap_medias(self.dados, ['SEXO'], ['NU_NOTA_MT'], n_reamostras=400, semente=1,
+                                  memoria_lote=2**20)['NU_NOTA_MT']
+        agrupados = self.dados.groupby('SEXO')['NU_NOTA_MT']
+        analitico = agrupados.std() / np.sqrt(agrupados.count())
+
+        np.testing.assert_allclose(tabela['media'], agrupados.mean())
+        np.testing.assert_allclose(tabela['erro_padrao'], analitico, rtol=0.15)
+        self.assertTrue((tabela['ic_inferior'] < tabela['media']).all())
+        self.assertTrue((tabela['ic_superior'] > tabela['media']).all())
+
+        # Com semente, o resultado não depende do número de processos
+        outra = bootstrap_medias(self.dados, ['SEXO'], ['NU_NOTA_MT'], n_reamostras=400, semente=1,
+                                 n_processos=2, memoria_lote=2**20)['NU_NOTA_MT']
+        pd.testing.assert_frame_equal(outra, tabela)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+"""
+Testes da atualização incremental: o cubo atualizado por soma e subtração
+deve ser igual ao cubo construído do zero com a mesma versão do arquivo
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agregacao import TabelaMomentos
+from gerador_sintetico import gerar_microdados
+from esquema import ANALISES, colunas_necessarias
+from incremental import EstadoIncremental, particoes_arquivo
+from main import ENEMAnalyzer
+from tests.test_agregacao import dados_exemplo
+
+
+def gravar(caminho, linhas):
+    with open(caminho, 'wb') as f:
+        f.writelines(linhas)
+    return caminho
+
+
+def corrigir(linha, coluna, valor):
+    campos = linha.rstrip(b'\n').split(b';')
+    campos[coluna] = valor
+    return b';'.join(campos) + b'\n'
+
+
+class TestSubtrair(unittest.TestCase):
+
+    def test_subtrair_desfaz_combinar(self):
+        dados = dados_exemplo()
+        chaves, colunas = ('SEXO', 'REGIAO'), ['NU_NOTA_MT', 'NU_NOTA_REDACAO']
+        total = TabelaMomentos.calcular(dados, chaves, colunas, dropna=False)
+        restante = total.subtrair(TabelaMomentos.calcular(dados.iloc[1500:], chaves, colunas, dropna=False))
+        esperado = TabelaMomentos.calcular(dados.iloc[:1500], chaves, colunas, dropna=False)
+
+        for atributo in ('participantes', 'n', 'soma', 'soma_q'):
+            a, b = getattr(restante, atributo).sort_index(), getattr(esperado, atributo).sort_index()
+            self.assertTrue(a.index.equals(b.index), atributo)
+            np.testing.assert_allclose(a.to_numpy(dtype=float), b.to_numpy(dtype=float), atol=1e-6)
+
+
+class TestAtualizacaoIncremental(unittest.TestCase):
+
+    def setUp(self):
+        self.pasta = tempfile.TemporaryDirectory()
+        arquivo = gerar_microdados(os.path.join(self.pasta.name, 'v1.csv'), 6000)
+        with open(arquivo, 'rb') as f:
+            self.linhas = f.readlines()
+        self.colunas = self.linhas[0].rstrip(b'\n').split(b';')
+
+    def tearDown(self):
+        self.pasta.cleanup()
+
+    def caminho(self, nome):
+        return os.path.join(self.pasta.name, nome)
+
+    def aplicar(self, arquivo, parcial=False):
+        # Partições pequenas, para que as atualizações combinem partições
+        # lidas, guardadas e carregadas do estado
+        analisador = ENEMAnalyzer(arquivo, verbose=False)
+        estado = EstadoIncremental.carregar(self.caminho('estado')) or EstadoIncremental(self.caminho('estado'))
+        estado.atualizar(arquivo, analisador._ler_csv, analisador._processar, colunas_necessarias(ANALISES),
+                         parcial, linhas_por_particao=400)
+        estado.salvar()
+        return estado.cubo
+
+    def assertCuboIgual(self, obtido, arquivo):
+        referencia = ENEMAnalyzer(arquivo, verbose=False)
+        self.assertTrue(referencia.carregar_cubo())
+        esperado = referencia.cubo
+
+        for a, b in ((obtido.fina, esperado.fina), (obtido.geografia.fina, esperado.geografia.fina),
+                     (obtido.questionario, esperado.questionario)):
+            for atributo in ('participantes', 'n', 'soma', 'soma_q', 'minimo', 'maximo'):
+                x, y = getattr(a, atributo).sort_index(), getattr(b, atributo).sort_index()
+                self.assertTrue(x.index.equals(y.index), atributo)
+                np.testing.assert_allclose(x.to_numpy(dtype=float), y.to_numpy(dtype=float),
+                                           rtol=1e-9, atol=1e-6, equal_nan=True, err_msg=atributo)
+        for coluna, histograma in esperado.histogramas.items():
+            np.testing.assert_array_equal(obtido.histogramas[coluna].contagens_grupo(),
+                                          histograma.contagens_grupo())
+
+    def test_versoes_e_extrato_iguais_ao_cubo_do_zero(self):
+        redacao = self.colunas.index(b'NU_NOTA_REDACAO')
+        v1 = gravar(self.caminho('v1.csv'), self.linhas)
+        self.assertCuboIgual(self.aplicar(v1), v1)
+
+        # Nova versão: notas corrigidas, linhas removidas e uma inscrição nova
+        linhas = list(self.linhas)
+        for i in range(1, 6000, 250):
+            linhas[i] = corrigir(linhas[i], redacao, b'980.0')
+        nova = corrigir(linhas[10], 0, b'999999999999')
+        linhas = linhas[:3000] + linhas[3040:] + [nova]
+        v2 = gravar(self.caminho('v2.csv'), linhas)
+        self.assertCuboIgual(self.aplicar(v2), v2)
+
+        # Extrato com uma correção: igual à versão completa corrigida
+        linhas[5] = corrigir(linhas[5], redacao, b'0.0')
+        extrato = gravar(self.caminho('extrato.csv'), [linhas[0], linhas[5]])
+        self.assertCuboIgual(self.aplicar(extrato, parcial=True), gravar(self.caminho('v3.csv'), linhas))
+
+        # De volta à primeira versão
+        self.assertCuboIgual(self.aplicar(v1), v1)
+
+    def test_atualizar_incremental_do_analisador(self):
+        v1 = gravar(self.caminho('v1.csv'), self.linhas)
+        analisador = ENEMAnalyzer(self.caminho('dados.csv'), verbose=False)
+        self.assertTrue(analisador.atualizar_incremental(v1))
+        self.assertTrue(os.path.exists(os.path.join(analisador.pasta_incremental, 'estado.pkl')))
+
+        # O estado gravado é retomado por um analisador novo
+        outro = ENEMAnalyzer(self.caminho('dados.csv'), verbose=False)
+        self.assertTrue(outro.atualizar_incremental(v1))
+        self.assertEqual(outro.linhas_lidas, 0)
+        self.assertCuboIgual(outro.cubo, v1)
+
+    def test_remocao_muda_so_a_particao_dela(self):
+        v1 = gravar(self.caminho('v1.csv'), self.linhas)
+        v2 = gravar(self.caminho('v2.csv'), self.linhas[:3000] + self.linhas[3030:])
+        _, antes, _ = particoes_arquivo(v1, linhas_por_particao=300)
+        _, depois, _ = particoes_arquivo(v2, linhas_por_particao=300, tamanho_leitura=4096)
+
+        self.assertGreater(len(antes), 5)
+        self.assertLessEqual(len({p[2] for p in depois} - {p[2] for p in antes}), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""
+Testes da ingestão retomável: linhas malformadas vão para a quarentena e
+uma execução interrompida retoma só os blocos sem checkpoint
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from esquema import ANALISES, colunas_necessarias
+from gerador_sintetico import gerar_microdados
+from ingestao import IngestaoRetomavel
+from main import ENEMAnalyzer
+
+
+def corrigir(linha, coluna, valor):
+    campos = linha.rstrip(b'\n').split(b';')
+    campos[coluna] = valor
+    return b';'.join(campos) + b'\n'
+
+
+class TestIngestaoRetomavel(unittest.TestCase):
+
+    def setUp(self):
+        self.pasta = tempfile.TemporaryDirectory()
+        self.arquivo = gerar_microdados(os.path.join(self.pasta.name, 'dados.csv'), 3000)
+        with open(self.arquivo, 'rb') as f:
+            linhas = f.readlines()
+        colunas = linhas[0].rstrip(b'\n').split(b';')
+
+        # Uma linha com um campo a menos e uma com nota não numérica
+        self.curta = linhas[500].rstrip(b'\n').rsplit(b';', 1)[0] + b'\n'
+        self.texto = corrigir(linhas[2000], colunas.index(b'NU_NOTA_MT'), b'abc')
+        linhas[500], linhas[2000] = self.curta, self.texto
+        with open(self.arquivo, 'wb') as f:
+            f.writelines(linhas)
+
+        self.total = len(linhas) - 1
+        self.colunas = colunas_necessarias(ANALISES)
+        self.ler_csv = ENEMAnalyzer(self.arquivo)._ler_csv
+
+    def tearDown(self):
+        self.pasta.cleanup()
+
+    def ingestao(self):
+        return IngestaoRetomavel(self.arquivo, os.path.join(self.pasta.name, 'checkpoints'),
+                                 {'colunas': self.colunas}, bytes_por_bloco=40_000)
+
+    def executar(self):
+        ingestao = self.ingestao()
+        concluidos = ingestao.preparar()
+        processados = ingestao.executar(len, self.ler_csv, self.colunas)
+        return ingestao, concluidos, processados
+
+    def test_quarentena(self):
+        ingestao, _, processados = self.executar()
+        self.assertGreater(processados, 3)
+
+        linhas, validas = 0, 0
+        for lidas, resultado in ingestao.resultados():
+            linhas += lidas
+            validas += resultado
+        self.assertEqual(linhas, self.total)
+        self.assertEqual(validas, self.total - 2)
+
+        caminho = os.path.join(self.pasta.name, 'quarentena.csv')
+        motivos = ingestao.gravar_quarentena(caminho)
+        self.assertEqual(motivos, Counter({'número de campos': 1, 'valor inválido em NU_NOTA_MT': 1}))
+        with open(caminho, 'rb') as f:
+            self.assertEqual(f.readlines(), [ingestao.cabecalho, self.curta, self.texto])
+
+    def test_retomar_blocos_pendentes(self):
+        ingestao, _, processados = self.executar()
+        os.remove(ingestao._caminho(1))
+
+        _, concluidos, retomados = self.executar()
+        self.assertEqual(concluidos, processados - 1)
+        self.assertEqual(retomados, 1)
+
+    def test_nova_versao_descarta_checkpoints(self):
+        _, _, processados = self.executar()
+        instante = os.stat(self.arquivo).st_mtime + 60
+        os.utime(self.arquivo, (instante, instante))
+
+        _, concluidos, reprocessados = self.executar()
+        self.assertEqual(concluidos, 0)
+        self.assertEqual(reprocessados, processados)
+
+
+if __name__ == '__main__':
+    unittest.main()
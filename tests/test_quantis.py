@@ -0,0 +1,85 @@
+"""
+Testes dos quantis por histograma na grade das notas e dos maiores
+valores por grupo, comparados com o pandas
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quantis import HistogramaQuantis, MaioresPorGrupo
+
+QUANTIS = (0.0, 0.1, 0.25, 0.5, 0.9, 0.95, 0.999, 1.0)
+
+
+class TestHistogramaQuantis(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        n = 5000
+        self.dados = pd.DataFrame({
+            'SG_UF_ESC': rng.choice(['SP', 'RJ', 'BA', None], n),
+            'NU_NOTA_REDACAO': rng.integers(0, 51, n) * 20.0,
+            'NU_NOTA_MT': rng.normal(520, 100, n).clip(0, 1000).round(1),
+        })
+        self.dados.loc[rng.random(n) < 0.1, 'NU_NOTA_REDACAO'] = np.nan
+
+    def test_quantis_iguais_ao_pandas(self):
+        for coluna in ('NU_NOTA_REDACAO', 'NU_NOTA_MT'):
+            histograma = HistogramaQuantis.para_coluna(coluna).adicionar(self.dados[coluna])
+            for q in QUANTIS:
+                self.assertAlmostEqual(histograma.quantil(q), self.dados[coluna].quantile(q), places=6,
+                                       msg=f'{coluna} {q}')
+
+    def test_quantis_por_grupo_com_partes_combinadas(self):
+        coluna = 'NU_NOTA_REDACAO'
+        histograma = HistogramaQuantis.para_coluna(coluna)
+        for inicio in range(0, len(self.dados), 1200):
+            parte = self.dados.iloc[inicio:inicio + 1200]
+            histograma.combinar(HistogramaQuantis.para_coluna(coluna).adicionar(parte[coluna], parte['SG_UF_ESC']))
+
+        esperados = self.dados.groupby('SG_UF_ESC')[coluna]
+        for uf, serie in esperados:
+            for q in QUANTIS:
+                self.assertAlmostEqual(histograma.quantil(q, uf), serie.quantile(q), places=6, msg=f'{uf} {q}')
+        self.assertEqual(histograma.total(), self.dados[coluna].notna().sum())
+        self.assertEqual(histograma.contar_acima(900), (self.dados[coluna] >= 900).sum())
+
+    def test_subtrair_desfaz_combinar(self):
+        coluna = 'NU_NOTA_MT'
+        metade = self.dados.iloc[:2500]
+        histograma = HistogramaQuantis.para_coluna(coluna).adicionar(self.dados[coluna])
+        histograma.subtrair(HistogramaQuantis.para_coluna(coluna).adicionar(self.dados[coluna].iloc[2500:]))
+        self.assertAlmostEqual(histograma.quantil(0.5), metade[coluna].quantile(0.5), places=6)
+
+    def test_colunas_sem_grade_recusadas(self):
+        with self.assertRaises(ValueError):
+            HistogramaQuantis.para_coluna('NU_IDADE')
+        with self.assertRaises(ValueError):
+            HistogramaQuantis.para_coluna('NU_NOTA_MT').combinar(HistogramaQuantis.para_coluna('NU_NOTA_REDACAO'))
+
+
+class TestMaioresPorGrupo(unittest.TestCase):
+
+    def test_maiores_iguais_ao_pandas(self):
+        rng = np.random.default_rng(3)
+        dados = pd.DataFrame({
+            'SG_UF_ESC': rng.choice(['SP', 'RJ', 'BA'], 3000),
+            'NU_NOTA_REDACAO': rng.permutation(3000).astype(float),
+        })
+        maiores = MaioresPorGrupo('NU_NOTA_REDACAO', 'SG_UF_ESC', k=5)
+        for inicio in range(0, len(dados), 700):
+            maiores.adicionar(dados.iloc[inicio:inicio + 700])
+
+        esperado = (dados.sort_values('NU_NOTA_REDACAO', ascending=False).groupby('SG_UF_ESC').head(5)
+                    .sort_values(['SG_UF_ESC', 'NU_NOTA_REDACAO'], ascending=[True, False]).reset_index(drop=True))
+        pd.testing.assert_frame_equal(maiores.resultado(), esperado)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+"""
+Testes dos momentos por resposta do questionário: a passagem única pelas
+linhas dá o mesmo que um groupby do pandas por item
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from questionario import CHAVES_QUESTIONARIO, momentos_questionario
+from tests.test_agregacao import dados_exemplo
+
+
+def dados_questionario(n=2000, semente=3):
+    rng = np.random.default_rng(semente)
+    dados = dados_exemplo(n, semente)
+    for item, respostas in (('Q001', 'ABCDEFGH'), ('Q002', 'ABC'), ('Q006', 'ABCDEFGHIJKLMNOPQ')):
+        valores = rng.choice(list(respostas), n).astype(object)
+        valores[rng.random(n) < 0.1] = None
+        dados[item] = pd.Categorical(valores, categories=list(respostas))
+    return dados
+
+
+class TestMomentosQuestionario(unittest.TestCase):
+
+    def setUp(self):
+        self.dados = dados_questionario()
+        self.colunas = ['NU_NOTA_MT', 'NU_NOTA_REDACAO']
+        self.itens = ['Q001', 'Q002', 'Q006']
+
+    def esperado(self):
+        partes = []
+        for item in self.itens:
+            grupos = self.dados.groupby(item, observed=True)
+            parte = pd.concat({
+                'participantes': grupos.size(),
+                **{('n', col): grupos[col].count() for col in self.colunas},
+                **{('soma', col): grupos[col].sum() for col in self.colunas},
+                **{('soma_q', col): grupos[col].apply(lambda s: (s ** 2).sum()) for col in self.colunas},
+            }, axis=1)
+            parte.index = pd.MultiIndex.from_arrays([[item] * len(parte), parte.index.astype(object)],
+                                                    names=list(CHAVES_QUESTIONARIO))
+            partes.append(parte)
+        return pd.concat(partes)
+
+    def assertIgualGroupby(self, momentos):
+        esperado = self.esperado()
+        pd.testing.assert_series_equal(momentos.participantes.sort_index(),
+                                       esperado['participantes'].astype(np.int64),
+                                       check_names=False, check_index_type=False)
+        for atributo in ('n', 'soma', 'soma_q'):
+            obtido = getattr(momentos, atributo).sort_index()
+            for col in self.colunas:
+                np.testing.assert_allclose(obtido[col].to_numpy(dtype=float),
+                                           esperado[(atributo, col)].to_numpy(dtype=float), rtol=1e-12)
+
+    def test_igual_groupby(self):
+        self.assertIgualGroupby(momentos_questionario(self.dados, self.colunas, self.itens))
+
+    def test_fatias_pequenas(self):
+        self.assertIgualGroupby(momentos_questionario(self.dados, self.colunas, self.itens, linhas_por_fatia=97))
+
+    def test_respostas_em_branco_descartadas(self):
+        momentos = momentos_questionario(self.dados, self.colunas, self.itens)
+        self.assertFalse(momentos.participantes.index.get_level_values('RESPOSTA').isna().any())
+        total = momentos.participantes.groupby(level='ITEM').sum()
+        for item in self.itens:
+            self.assertEqual(total[item], self.dados[item].notna().sum())
+
+    def test_processos(self):
+        um = momentos_questionario(self.dados, self.colunas, self.itens, n_processos=1, linhas_por_fatia=256)
+        dois = momentos_questionario(self.dados, self.colunas, self.itens, n_processos=2, linhas_por_fatia=256)
+        for atributo in ('participantes', 'n', 'soma', 'soma_q'):
+            pd.testing.assert_frame_equal(pd.DataFrame(getattr(um, atributo)), pd.DataFrame(getattr(dois, atributo)))
+
+    def test_sem_itens(self):
+        self.assertIsNone(momentos_questionario(self.dados[self.colunas], self.colunas))
+
+
+if __name__ == '__main__':
+    unittest.main()